@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache daftar admin per chat untuk mengurangi panggilan get_chat_member.
+
+Daftar admin diisi sekali lewat get_chat_administrators dan disimpan dengan TTL.
+Daftar tersebut juga memuat status bot sendiri, sehingga izin bot (misalnya
+hak membatasi anggota) dapat diperiksa tanpa panggilan API tambahan. Cache
+dibatalkan otomatis saat ada update ChatMemberUpdated yang menyentuh admin.
+"""
+
+import logging
+import os
+from typing import Dict
+
+from telegram import Bot, ChatMember, Update
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import ContextTypes
+
+from cache_utils import TTLCache, SingleFlight
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+ADMIN_CACHE_TTL = float(os.environ.get('ADMIN_CACHE_TTL', '600'))
+ADMIN_STATUSES = (ChatMember.OWNER, ChatMember.ADMINISTRATOR)
+
+class AdminRoster:
+    """Daftar admin per chat dengan TTL dan pengisian yang digabung (single-flight)."""
+
+    def __init__(self, ttl: float = ADMIN_CACHE_TTL, max_chats: int = 10000):
+        self._cache = TTLCache(max_entries=max_chats, default_ttl=ttl)
+        self._flight = SingleFlight()
+
+    async def get_admins(self, bot: Bot, chat_id: int) -> Dict[int, ChatMember]:
+        """Mengembalikan peta user_id -> ChatMember untuk semua admin chat."""
+        roster = self._cache.get(chat_id)
+        if roster is not None:
+            return roster
+        return await self._flight.do(chat_id, lambda: self._load(bot, chat_id))
+
+    async def _load(self, bot: Bot, chat_id: int) -> Dict[int, ChatMember]:
+        try:
+            administrators = await bot.get_chat_administrators(chat_id)
+        except (BadRequest, Forbidden) as e:
+            logger.warning(f"Tidak dapat mengambil daftar admin untuk chat {chat_id}: {e}")
+            return {}
+        roster = {member.user.id: member for member in administrators}
+        self._cache.set(chat_id, roster)
+        return roster
+
+    async def is_admin(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        member = (await self.get_admins(bot, chat_id)).get(user_id)
+        return member is not None and member.status in ADMIN_STATUSES
+
+    async def bot_can_restrict(self, bot: Bot, chat_id: int) -> bool:
+        """True jika bot adalah admin dengan hak 'Restrict Members' di chat ini."""
+        member = (await self.get_admins(bot, chat_id)).get(bot.id)
+        return member is not None and member.status == ChatMember.ADMINISTRATOR \
+            and bool(getattr(member, 'can_restrict_members', False))
+
+    def invalidate(self, chat_id: int) -> None:
+        self._cache.pop(chat_id)
+
+    def stats(self) -> Dict[str, float]:
+        return {**self._cache.stats(), "coalesced": self._flight.coalesced}
+
+admin_roster = AdminRoster()
+
+async def track_admin_changes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler ChatMemberUpdated: membatalkan cache jika status admin seseorang (atau bot) berubah."""
+    change = update.chat_member or update.my_chat_member
+    if not change:
+        return
+    old, new = change.old_chat_member, change.new_chat_member
+    if old.status in ADMIN_STATUSES or new.status in ADMIN_STATUSES:
+        admin_roster.invalidate(change.chat.id)
+        logger.info(f"Cache admin untuk chat {change.chat.id} dibatalkan ({old.status} -> {new.status}).")
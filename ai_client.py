@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lapisan klien AI bersama untuk semua fitur yang memanggil model (moderasi,
+/tanya, /kisah). Semua panggilan melewati:
+
+- semaphore berprioritas (moderasi didahulukan daripada tanya-jawab),
+- token bucket untuk menjaga laju permintaan di bawah kuota,
+- retry dengan backoff ber-jitter untuk error sementara (429/5xx/timeout),
+- circuit breaker yang langsung menolak panggilan saat upstream bermasalah,
+  sehingga pesan tidak menunggu timeout satu per satu.
+
+`FakeModel` dapat dipakai sebagai pengganti model sungguhan untuk pengujian.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from metrics import Counter, Histogram
+from rate_limit import TokenBucket
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+# Prioritas: angka kecil dilayani lebih dulu
+PRIORITY_MODERATION = 0
+PRIORITY_QA = 1
+PRIORITY_BACKGROUND = 2
+
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', '4'))
+AI_RATE_PER_MINUTE = float(os.environ.get('AI_RATE_PER_MINUTE', '60'))
+AI_MAX_RETRIES = int(os.environ.get('AI_MAX_RETRIES', '3'))
+AI_TIMEOUT = float(os.environ.get('AI_TIMEOUT', '60'))
+AI_BREAKER_THRESHOLD = int(os.environ.get('AI_BREAKER_THRESHOLD', '5'))
+AI_BREAKER_RESET = float(os.environ.get('AI_BREAKER_RESET', '30'))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 20.0
+
+# Kode HTTP dari upstream yang layak dicoba ulang
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+AI_LATENCY = Histogram("bot_ai_request_duration_seconds", "Latensi panggilan model AI (per percobaan).", ["kind"])
+AI_REQUESTS = Counter("bot_ai_requests_total", "Hasil panggilan model AI.", ["kind", "outcome"])
+
+class CircuitOpenError(Exception):
+    """Dilempar saat circuit breaker terbuka dan panggilan ditolak tanpa menghubungi AI."""
+
+def _error_code(error: Exception) -> Optional[int]:
+    # Exception google.api_core menyimpan status HTTP di atribut `code`
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+def is_retryable(error: Exception) -> bool:
+    """True untuk error sementara: kuota habis (429), error server (5xx), atau timeout."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return _error_code(error) in RETRYABLE_CODES
+
+def _chunk_text(chunk: Any) -> str:
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""  # Potongan tanpa teks (misal: hanya metadata keamanan)
+
+class PrioritySemaphore:
+    """Semaphore yang membangunkan penunggu berdasarkan prioritas, lalu urutan datang."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int) -> None:
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slot sudah diberikan tepat sebelum dibatalkan: kembalikan ke penunggu lain
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+class CircuitBreaker:
+    """
+    Tertutup: semua panggilan diteruskan. Setelah `threshold` kegagalan berturut-turut
+    breaker terbuka dan menolak panggilan selama `reset_timeout` detik, lalu setengah
+    terbuka: satu panggilan percobaan menentukan apakah breaker tertutup kembali.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int = AI_BREAKER_THRESHOLD, reset_timeout: float = AI_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> Tuple[bool, bool]:
+        """(panggilan diizinkan, panggilan ini adalah percobaan setengah terbuka)."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False, False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False, False
+            self._probing = True
+            return True, True
+        return True, False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker AI tertutup kembali.")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker AI terbuka selama {self.reset_timeout:.0f} detik.")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """Panggilan percobaan selesai tanpa putusan (misal: error dari sisi permintaan)."""
+        self._probing = False
+
+class AIClient:
+    """Pembungkus model generatif dengan pembatasan, prioritas, retry, dan circuit breaker."""
+
+    def __init__(self, model: Any = None, max_concurrency: int = AI_MAX_CONCURRENCY,
+                 rate_per_minute: float = AI_RATE_PER_MINUTE, max_retries: int = AI_MAX_RETRIES,
+                 timeout: float = AI_TIMEOUT, breaker: Optional[CircuitBreaker] = None):
+        self.model = model
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = PrioritySemaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_minute / 60.0, capacity=max(1.0, max_concurrency))
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    @property
+    def available(self) -> bool:
+        return self.model is not None
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, priority: int):
+        allowed, probe = self.breaker.allow()
+        if not allowed:
+            self.rejected += 1
+            AI_REQUESTS.inc(kind="any", outcome="rejected")
+            raise CircuitOpenError("Layanan AI sedang tidak tersedia.")
+        await self._semaphore.acquire(priority)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            if probe:
+                self.breaker.release_probe()
+
+    async def _before_attempt(self, attempt: int, error: Optional[Exception]) -> None:
+        if attempt:
+            self.retries += 1
+            AI_REQUESTS.inc(kind="any", outcome="retry")
+            # Full jitter: sebar percobaan ulang agar tidak serentak menghantam upstream
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            if _error_code(error) == 429:
+                self._bucket.pause(delay)
+            logger.warning(f"Panggilan AI gagal ({error}); mencoba lagi dalam {delay:.1f} detik.")
+            await asyncio.sleep(delay)
+        await self._bucket.acquire()
+        self.calls += 1
+
+    def _record_error(self, kind: str, error: Exception) -> bool:
+        """Mencatat kegagalan satu percobaan; True jika error layak dicoba ulang."""
+        AI_REQUESTS.inc(kind=kind, outcome="timeout" if isinstance(error, asyncio.TimeoutError) else "error")
+        return is_retryable(error)
+
+    def _fail(self, retryable: bool) -> None:
+        """Panggilan (beserta semua percobaan ulangnya) gagal: dihitung satu kali oleh breaker."""
+        self.failures += 1
+        if retryable:
+            self.breaker.record_failure()
+
+    async def generate(self, prompt: str, priority: int = PRIORITY_QA) -> str:
+        """Menghasilkan jawaban lengkap. Exception terakhir diteruskan jika semua percobaan gagal."""
+        async with self._slot(priority):
+            error: Optional[Exception] = None
+            for attempt in range(self.max_retries + 1):
+                await self._before_attempt(attempt, error)
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(self.model.generate_content_async(prompt), self.timeout)
+                    text = _chunk_text(response)
+                    self.breaker.record_success()
+                    AI_REQUESTS.inc(kind="generate", outcome="ok")
+                    return text
+                except Exception as e:
+                    error = e
+                    retryable = self._record_error("generate", e)
+                    if not retryable or attempt == self.max_retries or self.breaker.state == CircuitBreaker.OPEN:
+                        self._fail(retryable)
+                        raise
+                finally:
+                    AI_LATENCY.observe(time.perf_counter() - start, kind="generate")
+
+    async def stream(self, prompt: str, priority: int = PRIORITY_QA) -> AsyncIterator[str]:
+        """
+        Menghasilkan potongan teks secara streaming. Percobaan ulang hanya dilakukan
+        sebelum potongan pertama diterima, agar teks tidak terulang. Batas waktu
+        berlaku untuk permintaan awal dan untuk setiap potongan berikutnya, sehingga
+        stream yang macet di tengah jalan dihitung sebagai kegagalan (timeout).
+        """
+        async with self._slot(priority):
+            error: Optional[Exception] = None
+            for attempt in range(self.max_retries + 1):
+                await self._before_attempt(attempt, error)
+                received = False
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt, stream=True), self.timeout)
+                    chunks = response.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                        except StopAsyncIteration:
+                            break
+                        text = _chunk_text(chunk)
+                        if text:
+                            received = True
+                            yield text
+                    self.breaker.record_success()
+                    AI_REQUESTS.inc(kind="stream", outcome="ok")
+                    return
+                except Exception as e:
+                    error = e
+                    retryable = self._record_error("stream", e)
+                    if received or not retryable or attempt == self.max_retries or self.breaker.state == CircuitBreaker.OPEN:
+                        self._fail(retryable)
+                        raise
+                finally:
+                    AI_LATENCY.observe(time.perf_counter() - start, kind="stream")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "in_flight": self.in_flight,
+            "waiting": self._semaphore.waiting,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+# --- Model Tiruan ---
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeModel:
+    """
+    Model lokal untuk pengujian dan benchmark: tanpa jaringan, dengan latensi dan
+    jawaban yang dapat diatur. `responder(prompt)` menentukan teks jawaban.
+    """
+
+    def __init__(self, responder: Optional[Callable[[str], str]] = None,
+                 latency: float = 0.05, chunk_size: int = 40):
+        self.responder = responder or (lambda prompt: "Ini adalah jawaban uji dari model tiruan.")
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        text = self.responder(prompt)
+        if not stream:
+            return FakeResponse(text)
+
+        async def chunks():
+            for i in range(0, len(text), self.chunk_size):
+                await asyncio.sleep(self.latency / 4)
+                yield FakeResponse(text[i:i + self.chunk_size])
+        return chunks()
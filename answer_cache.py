@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache jawaban semantik untuk /tanya dan /kisah.
+
+Pertanyaan dinormalisasi lalu diubah menjadi vektor n-gram karakter (hashing
+trick, dinormalisasi L2). Pertanyaan yang identik dicocokkan lewat kunci
+persis; pertanyaan yang hampir sama dicocokkan dengan cosine similarity
+(perkalian matriks NumPy) terhadap vektor tersimpan dari fitur yang sama.
+
+Kemiripan n-gram saja tidak cukup: "hukum riba" dan "hukum zina", "sholat
+subuh" dan "sholat isya", atau "boleh" dan "tidak boleh" nyaris identik
+secara karakter. Karena itu hasil semantik hanya dipakai jika himpunan kata
+isi (stem tanpa stopword, lihat `search_index.tokenize`) kedua pertanyaan
+sama persis; cosine hanya menyaring kandidat. Yang tertangkap adalah variasi
+urutan kata, tanda baca, imbuhan, dan ejaan. Entri memiliki TTL, jumlahnya
+dibatasi, dan disimpan ke disk agar tetap ada setelah restart.
+
+Dalam mode state bersama, jawaban juga disimpan ke state bersama dengan kunci
+persis, sehingga jawaban yang dibuat satu instance dapat dipakai instance lain.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from moderation_filters import normalize
+from search_index import tokenize
+from shared_state import SharedJsonStore, shared_state
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_FILE = os.environ.get('ANSWER_CACHE_FILE', "answer_cache")  # Tanpa ekstensi
+ANSWER_CACHE_TTL = float(os.environ.get('ANSWER_CACHE_TTL_DAYS', '30')) * 86400
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', '5000'))
+SIMILARITY_THRESHOLD = float(os.environ.get('ANSWER_CACHE_SIMILARITY', '0.92'))
+VECTOR_DIM = 1024
+NGRAM = 3
+SEMANTIC_CANDIDATES = 5
+
+# Tokoh yang kisahnya dibuat lebih dulu di latar belakang agar /kisah langsung terjawab.
+KNOWN_FIGURES = [
+    "Nabi Adam", "Nabi Idris", "Nabi Nuh", "Nabi Hud", "Nabi Shalih", "Nabi Ibrahim", "Nabi Luth",
+    "Nabi Ismail", "Nabi Ishaq", "Nabi Yaqub", "Nabi Yusuf", "Nabi Ayyub", "Nabi Syuaib", "Nabi Musa",
+    "Nabi Harun", "Nabi Dzulkifli", "Nabi Daud", "Nabi Sulaiman", "Nabi Ilyas", "Nabi Ilyasa",
+    "Nabi Yunus", "Nabi Zakaria", "Nabi Yahya", "Nabi Isa", "Nabi Muhammad",
+    "Abu Bakar As-Siddiq", "Umar bin Khattab", "Utsman bin Affan", "Ali bin Abi Thalib",
+]
+
+def embed(text: str) -> np.ndarray:
+    """Vektor n-gram karakter ter-hash (dimensi tetap) yang sudah dinormalisasi L2."""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for word in normalize(text).split():
+        padded = f"#{word}#"
+        grams = [padded[i:i + NGRAM] for i in range(max(1, len(padded) - NGRAM + 1))] + [padded]
+        for gram in grams:
+            digest = hashlib.blake2b(gram.encode('utf-8'), digest_size=4).digest()
+            value = int.from_bytes(digest, 'little')
+            vector[value % VECTOR_DIM] += 1.0 if value & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def content_terms(text: str) -> frozenset:
+    """Himpunan kata isi (stem tanpa stopword); harus sama agar hasil semantik dipakai."""
+    return frozenset(tokenize(text))
+
+class AnswerCache:
+    """Indeks jawaban per fitur ("tanya"/"kisah") dengan pencocokan persis dan semantik."""
+
+    def __init__(self, path: str = ANSWER_CACHE_FILE, max_entries: int = ANSWER_CACHE_SIZE,
+                 ttl: float = ANSWER_CACHE_TTL, threshold: float = SIMILARITY_THRESHOLD,
+                 shared: Optional[SharedJsonStore] = None):
+        self.path = path
+        self.shared = shared
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: List[Dict] = []            # feature, key, query, answer, created_at, last_used
+        # Matriks vektor dengan kapasitas cadangan (tumbuh dua kali lipat); baris aktif = len(_entries)
+        self._vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self._feature_ids = np.zeros(0, dtype=np.int16)
+        self._feature_codes: Dict[str, int] = {}
+        self._terms: List[frozenset] = []
+        self._by_key: Dict[tuple, int] = {}
+        self._dirty = False
+        self.hits = 0
+        self.semantic_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def _shared_key(key: tuple) -> str:
+        return f"{key[0]}:{hashlib.blake2b(key[1].encode('utf-8'), digest_size=16).hexdigest()}"
+
+    # --- Pencarian ---
+
+    async def lookup(self, feature: str, query: str) -> Optional[str]:
+        key = (feature, normalize(query))
+        now = time.time()
+        with self._lock:
+            index = self._by_key.get(key)
+            count = len(self._entries)
+            if index is None and count and feature in self._feature_codes:
+                # Hanya entri dari fitur yang sama yang ikut diperingkat
+                scores = self._vectors[:count] @ embed(query)
+                scores[self._feature_ids[:count] != self._feature_codes[feature]] = -1.0
+                wanted = content_terms(query)
+                top = np.argpartition(scores, -min(SEMANTIC_CANDIDATES, count))[-SEMANTIC_CANDIDATES:]
+                for candidate in top[np.argsort(scores[top])[::-1]]:
+                    if scores[candidate] < self.threshold:
+                        break
+                    if self._terms[candidate] == wanted:
+                        index = int(candidate)
+                        self.semantic_hits += 1
+                        break
+            if index is not None and now - self._entries[index]['created_at'] <= self.ttl:
+                self.hits += 1
+                self._entries[index]['last_used'] = now
+                return self._entries[index]['answer']
+
+        # Jawaban yang dibuat instance lain (hanya pencocokan persis)
+        stored = await self.shared.get_async(self._shared_key(key)) if self.shared is not None else None
+        if stored:
+            self.store(feature, query, stored['answer'], share=False)
+            with self._lock:
+                self.shared_hits += 1
+            return stored['answer']
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def contains(self, feature: str, query: str) -> bool:
+        with self._lock:
+            index = self._by_key.get((feature, normalize(query)))
+            return index is not None and time.time() - self._entries[index]['created_at'] <= self.ttl
+
+    # --- Penyimpanan ---
+
+    def store(self, feature: str, query: str, answer: str, share: bool = True) -> None:
+        key = (feature, normalize(query))
+        now = time.time()
+        entry = {"feature": feature, "key": key[1], "query": query, "answer": answer,
+                 "created_at": now, "last_used": now}
+        with self._lock:
+            index = self._by_key.get(key)
+            if index is not None:
+                self._entries[index] = entry
+            else:
+                self._append(entry, embed(query))
+            self._dirty = True
+            if len(self._entries) > self.max_entries:
+                self._compact(now)
+        if share and self.shared is not None:
+            self.shared.set_nowait(self._shared_key(key), {"answer": answer}, ttl=self.ttl)
+
+    def _feature_code(self, feature: str) -> int:
+        return self._feature_codes.setdefault(feature, len(self._feature_codes))
+
+    def _append(self, entry: Dict, vector: np.ndarray) -> None:
+        index = len(self._entries)
+        if index == len(self._vectors):
+            # Tumbuh geometris: penyalinan matriks teramortisasi O(1) per entri
+            capacity = max(64, 2 * len(self._vectors))
+            vectors = np.zeros((capacity, VECTOR_DIM), dtype=np.float32)
+            vectors[:index] = self._vectors[:index]
+            feature_ids = np.zeros(capacity, dtype=np.int16)
+            feature_ids[:index] = self._feature_ids[:index]
+            self._vectors, self._feature_ids = vectors, feature_ids
+        self._vectors[index] = vector
+        self._feature_ids[index] = self._feature_code(entry['feature'])
+        self._entries.append(entry)
+        self._terms.append(content_terms(entry['query']))
+        self._by_key[(entry['feature'], entry['key'])] = index
+
+    def _reindex(self, entries: List[Dict], vectors: np.ndarray) -> None:
+        """Membangun ulang matriks dan indeks dari daftar entri beserta vektornya."""
+        self._entries, self._terms, self._by_key = [], [], {}
+        self._vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self._feature_ids = np.zeros(0, dtype=np.int16)
+        for entry, vector in zip(entries, vectors):
+            self._append(entry, vector)
+
+    def _compact(self, now: float) -> None:
+        """Membuang entri kedaluwarsa lalu entri yang paling lama tidak dipakai (LRU)."""
+        alive = [i for i, e in enumerate(self._entries) if now - e['created_at'] <= self.ttl]
+        alive.sort(key=lambda i: self._entries[i]['last_used'], reverse=True)
+        keep = sorted(alive[:int(self.max_entries * 0.9)])
+        self._reindex([self._entries[i] for i in keep], self._vectors[keep])
+
+    def _load(self) -> None:
+        try:
+            with open(self.path + ".json", 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            vectors = np.load(self.path + ".npy")
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            logger.error(f"Cache jawaban di {self.path} rusak dan diabaikan: {e}")
+            return
+        if len(entries) != len(vectors):
+            logger.error("Jumlah entri dan vektor cache jawaban tidak cocok; cache diabaikan.")
+            return
+        self._reindex(entries, vectors.astype(np.float32))
+        self._compact(time.time())
+        logger.info(f"{len(self._entries)} jawaban dimuat dari cache jawaban.")
+
+    def save(self) -> None:
+        """Menyimpan cache ke disk (atomik) jika ada perubahan."""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = json.dumps(self._entries, ensure_ascii=False)
+            vectors = self._vectors[:len(self._entries)].copy()
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_json = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(entries)
+        fd, tmp_npy = tempfile.mkstemp(suffix=".npy", dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, vectors)
+        os.replace(tmp_npy, self.path + ".npy")
+        os.replace(tmp_json, self.path + ".json")
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits,
+                "semantic_hits": self.semantic_hits, "shared_hits": self.shared_hits, "misses": self.misses}
+
+answer_cache = AnswerCache(shared=SharedJsonStore(shared_state, "answer:") if shared_state is not None else None)
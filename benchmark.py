@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark dan uji beban bot dengan Telegram dan API eksternal tiruan.
+
+Application yang sebenarnya (main.build_application, lengkap dengan semua
+handler dan ChatLaneUpdateProcessor) dijalankan terhadap:
+- server Bot API tiruan (lewat BOT_API_BASE_URL),
+- server equran.id, api.hadith.gading.dev, dan API doa tiruan (lewat
+  http_client.set_transport),
+- model AI tiruan (GEMINI_FAKE=1),
+masing-masing dengan latensi yang dapat diatur. Server tiruan berjalan di
+thread dan event loop sendiri agar tidak ikut membebani event loop bot.
+
+Aliran update sintetis dimasukkan langsung ke update_queue (seperti pada mode
+webhook). Hasil yang dilaporkan: update/detik, p50/p99 per handler, lag event
+loop, serta jumlah dan rata-rata operasi db_handler dan HTTP. Setiap hasil
+ditambahkan ke benchmarks/results.jsonl agar dapat dibandingkan antarversi.
+
+Contoh:
+    python benchmark.py --scenario chatter --updates 5000
+    python benchmark.py --scenario mixed --bot-latency 0.05 --compare
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+
+from webserver import Request, Response, WebServer
+
+# Inisialisasi logger
+logger = logging.getLogger("benchmark")
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_FILE = os.path.join(REPO_DIR, "benchmarks", "results.jsonl")
+BOT_TOKEN = "123456:BENCHMARK"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Bot Benchmark", "username": "benchmark_bot",
+            "can_join_groups": True, "can_read_all_group_messages": True, "supports_inline_queries": False}
+# Ambang kenaikan (relatif) yang ditandai sebagai regresi saat membandingkan hasil
+REGRESSION_THRESHOLD = 0.10
+LAG_SAMPLE_INTERVAL = 0.01
+
+WORDS = (
+    "sabar syukur shalat puasa zakat sedekah ilmu amal iman taqwa ikhlas doa rezeki keluarga "
+    "sahabat hari ini kita semua jangan lupa insyaallah alhamdulillah kajian malam jumat "
+    "masjid pengajian belajar quran hadits nabi rasul akhirat dunia hati tenang berkah"
+).split()
+SPAM_TEXTS = ("Promo investasi cepat kaya klik https://spam.example.com sekarang!",
+              "DAPATKAN SALDO GRATIS!!! hubungi wa.me/000000")
+QUESTIONS = ("Apa hukum shalat jamak saat safar?", "Bagaimana cara bertaubat yang benar?",
+             "Apa keutamaan sedekah di hari jumat?", "Bagaimana adab menuntut ilmu?")
+FIGURES = ("Nabi Yusuf", "Nabi Musa", "Umar bin Khattab", "Abu Bakar As-Siddiq")
+HADITH_BOOKS = ("bukhari", "muslim", "tirmidzi", "abu-daud")
+
+SCENARIO_WEIGHTS = {
+    "chatter": {"chatter": 1.0},
+    "commands": {"commands": 1.0},
+    "joins": {"joins": 1.0},
+    "mixed": {"chatter": 0.8, "commands": 0.15, "joins": 0.05},
+}
+
+# --- Data Tiruan ---
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def _ayat_count(surah: int) -> int:
+    return 5 + surah % 25
+
+def _fake_surah(surah: int) -> Dict[str, Any]:
+    rng = random.Random(surah)
+    return {"nomor": surah, "namaLatin": f"Surah-{surah}", "jumlahAyat": _ayat_count(surah), "ayat": [
+        {"nomorAyat": n, "teksArab": "بِسْمِ اللّٰهِ الرَّحْمٰنِ الرَّحِيْمِ", "teksIndonesia": _sentence(rng, 18)}
+        for n in range(1, _ayat_count(surah) + 1)
+    ]}
+
+def _fake_tafsir(surah: int) -> Dict[str, Any]:
+    rng = random.Random(-surah)
+    return {"nomor": surah, "tafsir": [{"ayat": n, "teks": _sentence(rng, 60)}
+                                       for n in range(1, _ayat_count(surah) + 1)]}
+
+def _fake_hadith(book: str, number: int) -> Dict[str, Any]:
+    rng = random.Random(f"{book}:{number}")
+    return {"number": number, "arab": "إِنَّمَا الأَعْمَالُ بِالنِّيَّاتِ", "id": _sentence(rng, 30)}
+
+FAKE_DOA = [{"id": i, "doa": f"Doa {WORDS[i % len(WORDS)]} {i}", "ayat": "اَللّٰهُمَّ",
+             "latin": "Allahumma", "artinya": "Ya Allah."} for i in range(1, 41)]
+HADITH_BOOK_SIZE = 5000
+
+# --- Server Tiruan ---
+
+class FakeServices(WebServer):
+    """
+    Server HTTP tiruan untuk Bot API dan API eksternal, dengan dispatch
+    berdasarkan awalan path. Berjalan di thread dengan event loop sendiri.
+    """
+
+    def __init__(self, bot_latency: float, upstream_latency: float):
+        super().__init__("127.0.0.1", 0)
+        self.bot_latency = bot_latency
+        self.upstream_latency = upstream_latency
+        self.calls: Dict[str, int] = defaultdict(int)
+        self._message_id = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start_in_thread(self) -> None:
+        started = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-services", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_thread(self) -> None:
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    async def _dispatch(self, request: Request) -> Response:
+        try:
+            if request.path.startswith(f"/bot{BOT_TOKEN}/"):
+                await asyncio.sleep(self.bot_latency)
+                return self._bot_api(request.path.rsplit("/", 1)[1], self._params(request))
+            await asyncio.sleep(self.upstream_latency)
+            if request.path.startswith("/equran/"):
+                return self._equran(request.path[len("/equran"):])
+            if request.path.startswith("/hadith/"):
+                return self._hadith(request.path[len("/hadith"):], request.query)
+            if request.path.startswith("/doa/"):
+                self.calls["doa"] += 1
+                return Response.json(FAKE_DOA)
+        except (ValueError, KeyError) as e:
+            return Response.text(f"Permintaan tidak valid: {e}", 400)
+        return Response.text("Tidak ditemukan.", 404)
+
+    @staticmethod
+    def _params(request: Request) -> Dict[str, Any]:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            return request.json()
+        params = {}
+        for key, values in parse_qs(request.body.decode('utf-8')).items():
+            try:
+                params[key] = json.loads(values[0])
+            except ValueError:
+                params[key] = values[0]
+        return params
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {"message_id": params.get("message_id", self._message_id), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private", "title": "Grup"},
+                "from": BOT_USER, "text": params.get("text", "")}
+
+    def _bot_api(self, method: str, params: Dict[str, Any]) -> Response:
+        self.calls[f"bot.{method}"] += 1
+        if method == "getMe":
+            result: Any = BOT_USER
+        elif method in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            result = self._message(params)
+        elif method == "getChatAdministrators":
+            result = [{"status": "creator", "is_anonymous": False,
+                       "user": {"id": 1, "is_bot": False, "first_name": "Admin"}}]
+        elif method == "getChatMember":
+            result = {"status": "member", "user": {"id": int(params.get("user_id", 0)), "is_bot": False,
+                                                   "first_name": "Anggota"}}
+        elif method == "getChatMemberCount":
+            result = 250
+        elif method == "getUpdates":
+            result = []
+        else:
+            result = True
+        return Response.json({"ok": True, "result": result})
+
+    def _equran(self, path: str) -> Response:
+        self.calls["equran"] += 1
+        parts = path.strip("/").split("/")   # api/v2/<surat|tafsir>/<n>
+        if len(parts) == 4 and parts[3].isdigit() and 1 <= int(parts[3]) <= 114:
+            surah = int(parts[3])
+            data = _fake_surah(surah) if parts[2] == "surat" else _fake_tafsir(surah)
+            return Response.json({"code": 200, "message": "OK", "data": data})
+        return Response.json({"code": 404, "message": "Not found"}, 404)
+
+    def _hadith(self, path: str, query: Dict[str, list]) -> Response:
+        self.calls["hadith"] += 1
+        parts = path.strip("/").split("/")   # books[/<kitab>[/<nomor>]]
+        if parts == ["books"]:
+            return Response.json({"data": [{"id": b, "name": b.title(), "available": HADITH_BOOK_SIZE}
+                                           for b in HADITH_BOOKS]})
+        book = parts[1]
+        if book not in HADITH_BOOKS:
+            return Response.json({"message": "Not found"}, 404)
+        meta = {"id": book, "name": book.title(), "available": HADITH_BOOK_SIZE}
+        if len(parts) == 3:
+            number = int(parts[2])
+            if not 1 <= number <= HADITH_BOOK_SIZE:
+                return Response.json({"message": "Not found"}, 404)
+            return Response.json({"data": {**meta, "contents": _fake_hadith(book, number)}})
+        start, end = (int(n) for n in query.get("range", ["1-50"])[0].split("-"))
+        hadiths = [_fake_hadith(book, n) for n in range(start, min(end, HADITH_BOOK_SIZE) + 1)]
+        return Response.json({"data": {**meta, "hadiths": hadiths}})
+
+class RedirectTransport(httpx.AsyncBaseTransport):
+    """Transport httpx yang mengalihkan host API eksternal ke server tiruan."""
+
+    def __init__(self, base_url: str, routes: Dict[str, str]):
+        self._target = httpx.URL(base_url)
+        self._routes = routes   # host asli -> awalan path di server tiruan
+        self._inner = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=64))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        prefix = self._routes.get(request.url.host)
+        if prefix is not None:
+            request.url = request.url.copy_with(scheme=self._target.scheme, host=self._target.host,
+                                                port=self._target.port, path=prefix + request.url.path)
+        return await self._inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+UPSTREAM_ROUTES = {
+    "equran.id": "/equran",
+    "api.hadith.gading.dev": "/hadith",
+    "doa-doa-api-ahmadramadhan.fly.dev": "/doa",
+}
+
+# --- Aliran Update Sintetis ---
+
+class UpdateStream:
+    """Pembuat update JSON sintetis yang deterministik (berdasarkan seed)."""
+
+    def __init__(self, chats: int, users: int, seed: int):
+        self.rng = random.Random(seed)
+        self.chats = [-1001000000000 - i for i in range(chats)]
+        self.users = users
+        self._update_id = 0
+        self._next_member = 10_000_000
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"Pengguna{user_id}"}
+
+    def _message(self, chat_id: int, user_id: int, **fields: Any) -> Dict[str, Any]:
+        self._update_id += 1
+        message = {"message_id": self._update_id, "date": int(time.time()),
+                   "chat": {"id": chat_id, "type": "supergroup", "title": f"Grup {abs(chat_id) % 1000}"},
+                   "from": self._user(user_id), **fields}
+        return {"update_id": self._update_id, "message": message}
+
+    def chatter(self) -> Dict[str, Any]:
+        rng = self.rng
+        if rng.random() < 0.03:
+            text = rng.choice(SPAM_TEXTS)
+        elif rng.random() < 0.2:
+            text = rng.choice(("Assalamualaikum", "Waalaikumsalam", "Aamiin", "Masya Allah", "Jazakallah khair"))
+        else:
+            text = _sentence(rng, rng.randint(4, 30))
+        return self._message(rng.choice(self.chats), rng.randint(1, self.users), text=text)
+
+    def command(self) -> Dict[str, Any]:
+        rng = self.rng
+        surah = rng.randint(1, 114)
+        text = rng.choice((
+            f"/ayat {surah}:{rng.randint(1, _ayat_count(surah))}",
+            f"/tafsir {surah}:{rng.randint(1, _ayat_count(surah))}",
+            f"/hadits {rng.choice(HADITH_BOOKS)} {rng.randint(1, 600)}",
+            "/doa", "/mutiarakata", "/id", "/rules", "/help",
+            f"/cari {rng.choice(WORDS)}",
+            f"/tanya {rng.choice(QUESTIONS)}",
+            f"/kisah {rng.choice(FIGURES)}",
+        ))
+        command = text.split()[0]
+        return self._message(rng.choice(self.chats), rng.randint(1, self.users), text=text,
+                             entities=[{"type": "bot_command", "offset": 0, "length": len(command)}])
+
+    def join(self) -> Dict[str, Any]:
+        members = []
+        for _ in range(self.rng.randint(1, 5)):
+            self._next_member += 1
+            members.append(self._user(self._next_member))
+        # Gelombang join cenderung terpusat di sedikit grup
+        chat_id = self.chats[min(len(self.chats) - 1, int(self.rng.expovariate(1.0)))]
+        return self._message(chat_id, members[0]["id"], new_chat_members=members)
+
+    def generate(self, scenario: str, count: int) -> Iterator[Dict[str, Any]]:
+        weights = SCENARIO_WEIGHTS[scenario]
+        kinds, probabilities = list(weights), list(weights.values())
+        makers = {"chatter": self.chatter, "commands": self.command, "joins": self.join}
+        for _ in range(count):
+            yield makers[self.rng.choices(kinds, probabilities)[0]]()
+
+# --- Pengukuran ---
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {"count": len(values), "p50_ms": round(_percentile(values, 0.5) * 1000, 3),
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(max(values, default=0.0) * 1000, 3)}
+
+class LoopLagMonitor:
+    """Mengukur keterlambatan bangun task periodik sebagai lag event loop."""
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+def _histogram_totals(histogram: Any) -> Dict[str, Tuple[int, float]]:
+    return {",".join(key) or "all": value for key, value in histogram.totals().items()}
+
+def _histogram_delta(before: Dict[str, Tuple[int, float]], after: Dict[str, Tuple[int, float]]) -> Dict[str, Dict[str, float]]:
+    delta = {}
+    for key, (count, total) in after.items():
+        count -= before.get(key, (0, 0.0))[0]
+        total -= before.get(key, (0, 0.0))[1]
+        if count:
+            delta[key] = {"count": count, "mean_ms": round(total / count * 1000, 4)}
+    return delta
+
+# --- Menjalankan Benchmark ---
+
+def _configure_environment(args: argparse.Namespace, services: FakeServices) -> None:
+    """Environment variable untuk modul bot; harus diatur sebelum main diimpor."""
+    os.environ.update({
+        "BOT_TOKEN": BOT_TOKEN,
+        "BOT_MODE": "webhook",
+        "WEBHOOK_URL": "http://127.0.0.1",
+        "WEBHOOK_SECRET": "benchmark",
+        "BOT_API_BASE_URL": services.base_url,
+        "GEMINI_FAKE": "1",
+        "GEMINI_FAKE_LATENCY": str(args.gemini_latency),
+        "DB_BACKEND": args.db_backend,
+    })
+    # Batas kuota AI dinaikkan agar yang terukur adalah bot, bukan pembatas kuota tiruan
+    os.environ.setdefault("AI_RATE_PER_MINUTE", "100000")
+    os.environ.pop("SHARED_STATE_URL", None)
+    os.environ.pop("CLUSTER_WORKERS", None)
+
+async def _wait_until(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+async def run_benchmark(args: argparse.Namespace, services: FakeServices) -> Dict[str, Any]:
+    import main
+    import db_handler
+    import http_client
+    import metrics
+    from ai_features import moderation_batcher
+    from quran_features import quran_store
+    from search_features import update_search_index
+    from update_processor import UPDATES_PROCESSED
+
+    http_client.set_transport(RedirectTransport(services.base_url, UPSTREAM_ROUTES))
+    application = main.build_application()
+    # Tugas terjadwal dimatikan agar yang terukur hanya pemrosesan update
+    for job in application.job_queue.jobs():
+        job.schedule_removal()
+
+    handler_samples: Dict[str, List[float]] = defaultdict(list)
+    handler_errors: Dict[str, int] = defaultdict(int)
+
+    def observe(label: str, duration: float, failed: bool) -> None:
+        handler_samples[label].append(duration)
+        if failed:
+            handler_errors[label] += 1
+
+    await application.initialize()
+    await application.start()
+    await main.post_init(application)
+    try:
+        if not args.cold:
+            # Korpus lokal dan indeks pencarian disiapkan sebelum pengukuran
+            await quran_store.sync_all(concurrency=16)
+            await update_search_index(None)
+
+        stream = UpdateStream(args.chats, args.users, args.seed)
+        payloads = list(stream.generate(args.scenario, args.updates))
+        processed_before = UPDATES_PROCESSED.value()
+        db_before = _histogram_totals(db_handler.DB_LATENCY)
+        http_before = _histogram_totals(http_client.HTTP_LATENCY)
+        calls_before = dict(services.calls)
+
+        metrics.add_handler_observer(observe)
+        monitor = LoopLagMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        interval = 1.0 / args.rate if args.rate else 0.0
+        for index, payload in enumerate(payloads):
+            await application.update_queue.put(main.Update.de_json(payload, application.bot))
+            if interval:
+                # Jadwal absolut agar keterlambatan pengiriman tidak menumpuk
+                delay = started + (index + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        completed = await _wait_until(lambda: UPDATES_PROCESSED.value() - processed_before >= len(payloads),
+                                      args.timeout)
+        elapsed = time.perf_counter() - started
+        await _wait_until(lambda: moderation_batcher.pending_count() == 0, 10)
+        await monitor.stop()
+        metrics.remove_handler_observer(observe)
+        processed = int(UPDATES_PROCESSED.value() - processed_before)
+        if not completed:
+            logger.error(f"Batas waktu habis: hanya {processed}/{len(payloads)} update selesai diproses.")
+
+        return {
+            "updates": len(payloads),
+            "processed": processed,
+            "elapsed_s": round(elapsed, 3),
+            "updates_per_s": round(processed / elapsed, 1) if elapsed else 0.0,
+            "loop_lag": _summary(monitor.samples),
+            "handlers": {label: {**_summary(samples), "errors": handler_errors.get(label, 0)}
+                         for label, samples in sorted(handler_samples.items())},
+            "db": _histogram_delta(db_before, _histogram_totals(db_handler.DB_LATENCY)),
+            "http": _histogram_delta(http_before, _histogram_totals(http_client.HTTP_LATENCY)),
+            "fake_calls": {name: count - calls_before.get(name, 0) for name, count in sorted(services.calls.items())
+                           if count - calls_before.get(name, 0)},
+        }
+    finally:
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        await main.post_shutdown(application)
+
+# --- Laporan dan Perbandingan ---
+
+def _git_revision() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, timeout=10)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return result.stdout.strip() + ("-dirty" if dirty else "") if result.returncode == 0 else "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+def print_report(record: Dict[str, Any]) -> None:
+    result = record["result"]
+    print(f"\nSkenario {record['scenario']} @ {record['revision']} ({record['label'] or '-'})")
+    print(f"  {result['processed']}/{result['updates']} update dalam {result['elapsed_s']} detik "
+          f"= {result['updates_per_s']} update/detik")
+    lag = result["loop_lag"]
+    print(f"  Lag event loop: p50 {lag['p50_ms']} ms | p99 {lag['p99_ms']} ms | maks {lag['max_ms']} ms")
+    print(f"\n  {'Handler':<28}{'jumlah':>8}{'p50 ms':>10}{'p99 ms':>10}{'maks ms':>10}{'error':>7}")
+    for label, stats in result["handlers"].items():
+        print(f"  {label:<28}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p99_ms']:>10}"
+              f"{stats['max_ms']:>10}{stats['errors']:>7}")
+    for title, section in (("Operasi db_handler", result["db"]), ("HTTP per host", result["http"])):
+        if section:
+            print(f"\n  {title:<28}{'jumlah':>8}{'rata2 ms':>10}")
+            for key, stats in section.items():
+                print(f"  {key:<28}{stats['count']:>8}{stats['mean_ms']:>10}")
+    if result["fake_calls"]:
+        print("\n  Panggilan ke server tiruan: " + ", ".join(f"{k}={v}" for k, v in result["fake_calls"].items()))
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def save_result(path: str, record: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def _comparable(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    keys = ("scenario", "updates", "chats", "users", "rate", "bot_latency", "upstream_latency",
+            "gemini_latency", "db_backend", "cold")
+    return all(a["params"].get(k) == b["params"].get(k) for k in keys)
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = REGRESSION_THRESHOLD) -> int:
+    """Mencetak perbandingan dengan hasil sebelumnya; mengembalikan jumlah regresi."""
+    print(f"\nPerbandingan dengan {baseline['revision']} ({baseline['timestamp']}):")
+    rows: List[Tuple[str, float, float, bool]] = [
+        ("update/detik", baseline["result"]["updates_per_s"], current["result"]["updates_per_s"], False),
+        ("lag loop p99 ms", baseline["result"]["loop_lag"]["p99_ms"], current["result"]["loop_lag"]["p99_ms"], True),
+    ]
+    for label, stats in current["result"]["handlers"].items():
+        old = baseline["result"]["handlers"].get(label)
+        if old:
+            rows.append((f"{label} p50 ms", old["p50_ms"], stats["p50_ms"], True))
+            rows.append((f"{label} p99 ms", old["p99_ms"], stats["p99_ms"], True))
+    for operation, stats in current["result"]["db"].items():
+        old = baseline["result"]["db"].get(operation)
+        if old:
+            rows.append((f"db {operation} ms", old["mean_ms"], stats["mean_ms"], True))
+    regressions = 0
+    for name, old, new, lower_is_better in rows:
+        change = (new - old) / old if old else 0.0
+        worse = change > threshold if lower_is_better else change < -threshold
+        regressions += worse
+        print(f"  {name:<30}{old:>12}{new:>12}{change:>+9.1%}{'  <-- regresi' if worse else ''}")
+    print(f"\n{regressions} metrik memburuk lebih dari {threshold:.0%}.")
+    return regressions
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark handler bot dengan Telegram dan API tiruan.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIO_WEIGHTS), default="mixed")
+    parser.add_argument("--updates", type=int, default=2000, help="jumlah update sintetis")
+    parser.add_argument("--chats", type=int, default=50, help="jumlah grup")
+    parser.add_argument("--users", type=int, default=500, help="jumlah pengguna")
+    parser.add_argument("--rate", type=float, default=0.0, help="update/detik (0 = secepat mungkin)")
+    parser.add_argument("--bot-latency", type=float, default=0.02, help="latensi Bot API tiruan (detik)")
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="latensi API eksternal tiruan (detik)")
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="latensi model AI tiruan (detik)")
+    parser.add_argument("--db-backend", choices=("sqlite", "json"), default="sqlite")
+    parser.add_argument("--cold", action="store_true", help="tanpa menyiapkan korpus lokal dan indeks pencarian")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300.0, help="batas waktu menunggu semua update")
+    parser.add_argument("--label", default="", help="catatan bebas untuk hasil ini")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_FILE, help="file JSONL hasil benchmark")
+    parser.add_argument("--compare", action="store_true", help="bandingkan dengan hasil sebanding terakhir")
+    parser.add_argument("--no-save", action="store_true", help="jangan simpan hasil")
+    parser.add_argument("--verbose", action="store_true", help="tampilkan log bot")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    output = os.path.abspath(args.output)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                        level=logging.INFO if args.verbose else logging.WARNING)
+
+    services = FakeServices(args.bot_latency, args.upstream_latency)
+    services.start_in_thread()
+    _configure_environment(args, services)
+    # File database/cache bot dibuat di direktori sementara agar data asli tidak tersentuh
+    workdir = tempfile.mkdtemp(prefix="bot-benchmark-")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    try:
+        result = asyncio.run(run_benchmark(args, services))
+    finally:
+        services.stop_thread()
+        if not args.verbose:
+            logging.disable(logging.CRITICAL)   # Log penutupan modul bot tidak perlu ditampilkan
+
+    record = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "label": args.label,
+        "scenario": args.scenario,
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "no_save", "verbose", "label")},
+        "python": sys.version.split()[0],
+        "result": result,
+    }
+    print_report(record)
+    regressions = 0
+    if args.compare:
+        previous = [r for r in load_results(output) if _comparable(r, record)]
+        if previous:
+            regressions = compare(previous[-1], record)
+        else:
+            print("\nBelum ada hasil sebanding untuk dibandingkan.")
+    if not args.no_save:
+        save_result(output, record)
+        print(f"\nHasil disimpan ke {output}.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
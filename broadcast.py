@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Mesin broadcast untuk mengirim satu pesan ke banyak grup.
+
+- Token bucket global menjaga laju di bawah batas Telegram (~30 pesan/detik).
+- Semaphore membatasi jumlah pengiriman yang berjalan bersamaan.
+- RetryAfter ditangani dengan menahan seluruh bucket lalu mencoba ulang.
+- Progres tiap chat dicatat di SQLite, sehingga broadcast yang terputus
+  (misalnya karena bot crash) dilanjutkan saat startup tanpa mengirim ganda.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from rate_limit import TokenBucket, retry_after_seconds
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+BROADCAST_DB_FILE = os.environ.get('BROADCAST_DB_FILE', "broadcast.sqlite3")
+BROADCAST_RATE = float(os.environ.get('BROADCAST_RATE', '25'))        # Pesan per detik (global)
+BROADCAST_CONCURRENCY = int(os.environ.get('BROADCAST_CONCURRENCY', '10'))
+MAX_ATTEMPTS = 3
+# Broadcast yang lebih tua dari ini tidak dilanjutkan lagi saat startup.
+RESUME_MAX_AGE = 6 * 3600
+
+# Status pengiriman per chat
+PENDING, SENT, FAILED = "pending", "sent", "failed"
+
+class Broadcaster:
+    """Pengirim fan-out dengan pelacakan progres yang tahan crash."""
+
+    def __init__(self, path: str = BROADCAST_DB_FILE, rate: float = BROADCAST_RATE,
+                 concurrency: int = BROADCAST_CONCURRENCY):
+        self.bucket = TokenBucket(rate, capacity=rate)
+        self.concurrency = concurrency
+        # Dipanggil dengan chat_id jika bot diblokir/dikeluarkan dari grup
+        self.on_unreachable: Optional[Callable[[int], None]] = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS broadcast_runs (
+                run_id     TEXT PRIMARY KEY,
+                text       TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                finished   INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS broadcast_targets (
+                run_id  TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                status  TEXT NOT NULL,
+                PRIMARY KEY (run_id, chat_id)
+            ) WITHOUT ROWID;
+        """)
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def broadcast(self, bot: Bot, run_id: str, text: str, chat_ids: Iterable[int]) -> Dict[str, int]:
+        """Memulai broadcast baru. Pesan dirender sekali oleh pemanggil dan dikirim ke semua chat."""
+        targets = list(dict.fromkeys(chat_ids))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO broadcast_runs (run_id, text, created_at) VALUES (?, ?, ?)",
+                (run_id, text, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO broadcast_targets (run_id, chat_id, status) VALUES (?, ?, ?)",
+                [(run_id, chat_id, PENDING) for chat_id in targets],
+            )
+            self._conn.execute("COMMIT")
+        return await self._run(bot, run_id, text)
+
+    async def resume_pending(self, bot: Bot) -> None:
+        """Melanjutkan broadcast yang belum selesai (dipanggil saat startup)."""
+        runs = self._execute("SELECT run_id, text, created_at FROM broadcast_runs WHERE finished = 0")
+        for run_id, text, created_at in runs:
+            if time.time() - created_at > RESUME_MAX_AGE:
+                logger.info(f"Broadcast {run_id} terlalu lama, tidak dilanjutkan.")
+                self._finish(run_id)
+                continue
+            logger.info(f"Melanjutkan broadcast {run_id} yang terputus.")
+            await self._run(bot, run_id, text)
+
+    async def _run(self, bot: Bot, run_id: str, text: str) -> Dict[str, int]:
+        pending = [row[0] for row in self._execute(
+            "SELECT chat_id FROM broadcast_targets WHERE run_id = ? AND status = ?", (run_id, PENDING)
+        )]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def _worker(chat_id: int) -> None:
+            async with semaphore:
+                status = await self._send_one(bot, chat_id, text)
+            self._execute(
+                "UPDATE broadcast_targets SET status = ? WHERE run_id = ? AND chat_id = ?", (status, run_id, chat_id)
+            )
+
+        await asyncio.gather(*(_worker(chat_id) for chat_id in pending))
+        self._finish(run_id)
+        summary = {status: count for status, count in self._execute(
+            "SELECT status, COUNT(*) FROM broadcast_targets WHERE run_id = ? GROUP BY status", (run_id,)
+        )}
+        logger.info(f"Broadcast {run_id} selesai dalam {time.monotonic() - started:.1f} detik: {summary}")
+        return summary
+
+    async def _send_one(self, bot: Bot, chat_id: int, text: str) -> str:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text)
+                return SENT
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                logger.warning(f"RetryAfter {delay} detik saat broadcast ke {chat_id} (percobaan {attempt}).")
+                self.bucket.pause(delay)
+            except Forbidden as e:
+                logger.info(f"Bot tidak dapat mengirim ke chat {chat_id}: {e}")
+                if self.on_unreachable is not None:
+                    await asyncio.to_thread(self.on_unreachable, chat_id)
+                return FAILED
+            except BadRequest as e:
+                logger.warning(f"Broadcast ke chat {chat_id} ditolak: {e}")
+                return FAILED
+            except TelegramError as e:
+                logger.warning(f"Error jaringan saat broadcast ke {chat_id} (percobaan {attempt}): {e}")
+                await asyncio.sleep(2 ** attempt)
+        return FAILED
+
+    def _finish(self, run_id: str) -> None:
+        self._execute("UPDATE broadcast_runs SET finished = 1 WHERE run_id = ?", (run_id,))
+        # Hapus detail target broadcast lama agar tabel tidak terus membesar
+        cutoff = time.time() - 7 * 86400
+        self._execute(
+            "DELETE FROM broadcast_targets WHERE run_id IN "
+            "(SELECT run_id FROM broadcast_runs WHERE finished = 1 AND created_at < ?)", (cutoff,)
+        )
+        self._execute("DELETE FROM broadcast_runs WHERE finished = 1 AND created_at < ?", (cutoff,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+broadcaster = Broadcaster()
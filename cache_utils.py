@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+Utilitas cache bersama: cache LRU dengan TTL per entri dan batas memori,
+serta penggabungan permintaan (single-flight) untuk fungsi asinkron.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+def estimate_size(value: Any) -> int:
+    """Perkiraan kasar ukuran sebuah nilai (byte) berdasarkan serialisasi JSON-nya."""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+class TTLCache:
+    """
+    Cache LRU dengan TTL per entri.
+
+    Entri dikeluarkan jika sudah kedaluwarsa, jika jumlah entri melebihi
+    `max_entries`, atau jika total ukuran perkiraan melebihi `max_bytes`.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 300.0,
+                 max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = estimate_size,
+                 on_remove: Optional[Callable[[Hashable, Any], None]] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._on_remove = on_remove  # Dipanggil setiap kali entri keluar (kedaluwarsa/eviction/pop)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if key in self._data:
+            self._remove(key)
+        size = self._sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return  # Terlalu besar untuk di-cache
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at, size)
+        self._bytes += size
+        while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        self._remove(key)
+        return entry[0]
+
+    def clear(self) -> None:
+        for key in list(self._data):
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        value, _, size = self._data.pop(key)
+        self._bytes -= size
+        if self._on_remove is not None:
+            self._on_remove(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+class SingleFlight:
+    """
+    Menggabungkan pemanggilan asinkron yang bersamaan untuk kunci yang sama:
+    hanya pemanggil pertama yang menjalankan fungsi, sisanya menunggu hasil yang sama.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await func()
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Hindari peringatan "exception was never retrieved" jika tidak ada penunggu lain
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
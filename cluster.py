@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+Koordinasi beberapa instance bot (mode cluster).
+
+- Partisi update: setiap update webhook dipetakan ke satu worker berdasarkan
+  chat_id dengan rendezvous hashing, sehingga update satu chat selalu
+  diproses berurutan oleh instance yang sama (cache lokal, antrean per chat,
+  dan state percakapan tetap konsisten). Update milik worker lain diteruskan
+  lewat POST ke endpoint internal; jika worker tujuan tidak dapat dihubungi,
+  update diproses di instance penerima.
+- Lease pemimpin: tugas terjadwal yang tidak boleh berjalan ganda (ayat
+  harian, pemanasan cache) hanya dijalankan instance yang memegang lease.
+- `SharedStatePersistence`: menyimpan state ConversationHandler di state bersama.
+
+Konfigurasi:
+    CLUSTER_WORKERS   URL dasar semua worker, dipisah koma (misal http://10.0.0.1:8080,...)
+    CLUSTER_SELF_URL  URL dasar instance ini (harus ada di CLUSTER_WORKERS)
+    CLUSTER_SECRET    secret untuk endpoint internal (default: WEBHOOK_SECRET)
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from telegram.ext import BasePersistence, ContextTypes, PersistenceInput
+
+import http_client
+from metrics import Counter
+from shared_state import SharedState, SharedStateError, shared_state
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+CLUSTER_WORKERS = [url.strip().rstrip('/') for url in os.environ.get('CLUSTER_WORKERS', '').split(',') if url.strip()]
+CLUSTER_SELF_URL = os.environ.get('CLUSTER_SELF_URL', '').rstrip('/')
+CLUSTER_SECRET = os.environ.get('CLUSTER_SECRET') or os.environ.get('WEBHOOK_SECRET', '')
+INTERNAL_UPDATE_PATH = "/internal/update"
+SECRET_HEADER = "x-cluster-secret"
+FORWARD_TIMEOUT = 5.0
+LEADER_LEASE_TTL = 30.0
+LEADER_RENEW_INTERVAL = 10.0
+
+UPDATES_ROUTED = Counter("bot_cluster_updates_total", "Update webhook per tujuan partisi.", ["route"])
+
+# --- Partisi Update ---
+
+def update_chat_id(payload: Dict[str, Any]) -> Optional[int]:
+    """
+    chat_id dari JSON update mentah (tanpa membangun objek Update).
+    Update tanpa chat (inline query, dll.) dipartisi berdasarkan id pengirimnya.
+    """
+    for field, value in payload.items():
+        if field == "update_id" or not isinstance(value, dict):
+            continue
+        for container in (value, value.get("message")):
+            if isinstance(container, dict) and isinstance(container.get("chat"), dict):
+                return container["chat"].get("id")
+        for user_field in ("from", "user"):
+            if isinstance(value.get(user_field), dict):
+                return value[user_field].get("id")
+    return None
+
+def _weight(worker: str, chat_id: int) -> int:
+    digest = hashlib.blake2b(f"{worker}|{chat_id}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+def owner_of(chat_id: int, workers: List[str]) -> str:
+    """Worker pemilik sebuah chat (rendezvous hashing: skor tertinggi menang).
+
+    Saat worker ditambah atau dikurangi, hanya chat milik worker tersebut yang
+    berpindah; chat lain tetap di worker yang sama.
+    """
+    return max(workers, key=lambda worker: _weight(worker, chat_id))
+
+class UpdateRouter:
+    """Menentukan apakah sebuah update diproses lokal atau diteruskan ke worker lain."""
+
+    def __init__(self, workers: List[str] = CLUSTER_WORKERS, self_url: str = CLUSTER_SELF_URL,
+                 secret: str = CLUSTER_SECRET):
+        self.workers = sorted(set(workers))
+        self.self_url = self_url
+        self.secret = secret
+        self.enabled = len(self.workers) > 1 and self_url in self.workers
+        if len(self.workers) > 1 and not self.enabled:
+            logger.error(f"CLUSTER_SELF_URL ({self_url or 'kosong'}) tidak ada di CLUSTER_WORKERS; "
+                         "partisi update dinonaktifkan.")
+
+    def route(self, payload: Dict[str, Any]) -> Optional[str]:
+        """URL worker tujuan, atau None jika update diproses di instance ini."""
+        if not self.enabled:
+            return None
+        chat_id = update_chat_id(payload)
+        if chat_id is None:
+            return None
+        owner = owner_of(chat_id, self.workers)
+        return None if owner == self.self_url else owner
+
+    async def forward(self, worker: str, payload: Dict[str, Any]) -> bool:
+        """Meneruskan update ke worker pemiliknya. False jika gagal (update diproses lokal)."""
+        try:
+            await http_client.post(worker + INTERNAL_UPDATE_PATH, timeout=FORWARD_TIMEOUT, json=payload,
+                                   headers={SECRET_HEADER: self.secret})
+        except httpx.HTTPError as e:
+            logger.warning(f"Gagal meneruskan update {payload.get('update_id')} ke {worker}, diproses lokal: {e}")
+            UPDATES_ROUTED.inc(route="fallback")
+            return False
+        UPDATES_ROUTED.inc(route="forwarded")
+        return True
+
+update_router = UpdateRouter()
+
+# --- Lease Pemimpin ---
+
+class LeaderLease:
+    """
+    Lease pemimpin ber-TTL di state bersama (SET NX + perpanjangan berkala).
+    Tanpa state bersama, instance ini selalu dianggap pemimpin.
+    """
+
+    def __init__(self, state: Optional[SharedState], key: str = "cluster:leader",
+                 ttl: float = LEADER_LEASE_TTL, holder: Optional[str] = None):
+        self.state = state
+        self.key = key
+        self.ttl = ttl
+        self.holder = holder or f"{CLUSTER_SELF_URL or 'local'}#{uuid.uuid4().hex[:8]}"
+        self.is_leader = state is None
+
+    def renew(self) -> bool:
+        """Mengambil atau memperpanjang lease (dijalankan di thread terpisah)."""
+        if self.state is None:
+            return True
+        was_leader = self.is_leader
+        try:
+            if self.state.set(self.key, self.holder, ttl=self.ttl, nx=True):
+                self.is_leader = True
+            elif self.state.get(self.key) == self.holder:
+                self.is_leader = self.state.expire(self.key, self.ttl)
+            else:
+                self.is_leader = False
+        except SharedStateError as e:
+            # Tanpa akses ke state bersama, lebih aman berhenti menjalankan tugas pemimpin
+            logger.error(f"Gagal memperbarui lease pemimpin: {e}")
+            self.is_leader = False
+        if self.is_leader != was_leader:
+            logger.info(f"Instance {self.holder} {'menjadi' if self.is_leader else 'bukan lagi'} pemimpin cluster.")
+        return self.is_leader
+
+    def release(self) -> None:
+        if self.state is not None and self.is_leader:
+            try:
+                if self.state.get(self.key) == self.holder:
+                    self.state.delete(self.key)
+            except SharedStateError:
+                pass
+            self.is_leader = False
+
+leader_lease = LeaderLease(shared_state)
+
+async def renew_leader_lease(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tugas terjadwal untuk memperpanjang lease pemimpin."""
+    await asyncio.to_thread(leader_lease.renew)
+
+def leader_only(job: Callable[[ContextTypes.DEFAULT_TYPE], Awaitable[None]]) -> Callable[[ContextTypes.DEFAULT_TYPE], Awaitable[None]]:
+    """Membungkus tugas terjadwal agar hanya dijalankan oleh pemimpin cluster."""
+    @functools.wraps(job)
+    async def wrapper(context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not leader_lease.is_leader:
+            logger.debug(f"Tugas {job.__name__} dilewati: instance ini bukan pemimpin.")
+            return
+        await job(context)
+    return wrapper
+
+# --- Persistensi State Percakapan ---
+
+class SharedStatePersistence(BasePersistence):
+    """
+    Persistensi PTB yang hanya menyimpan state ConversationHandler, sebagai hash
+    `conversation:<nama>` (kunci percakapan JSON -> state JSON). Data bot/chat/user
+    tidak disimpan karena bot tidak memakainya.
+    """
+
+    def __init__(self, state: SharedState, update_interval: float = 5):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=False,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        self.state = state
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        raw = await asyncio.to_thread(self.state.hgetall, f"conversation:{name}")
+        return {tuple(json.loads(key)): json.loads(value) for key, value in raw.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        field = json.dumps(list(key))
+        if new_state is None:
+            await asyncio.to_thread(self.state.hdel, f"conversation:{name}", field)
+        else:
+            await asyncio.to_thread(self.state.hset, f"conversation:{name}", {field: json.dumps(new_state)})
+
+    # Data lain tidak dipersistenkan
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_callback_data(self) -> Optional[Tuple[List[Tuple[str, float, Dict[str, Any]]], Dict[str, str]]]:
+        return None
+
+    async def update_bot_data(self, data: Any) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        pass
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
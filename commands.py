@@ -5,20 +5,30 @@ Modul ini berisi semua fungsi dasar yang dipanggil oleh pengguna melalui perinta
 Termasuk fitur /id untuk melihat informasi ID.
 """
 
+import asyncio
+import html
 import logging
-import requests 
 import random
 import json
+import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
-from telegram.error import BadRequest
 
 # Mengimpor model AI dan handler database
-from ai_features import gemini_model
+from ai_features import ai_client, get_moderation_stats, answer_with_cache, tanya_prompt, kisah_prompt
 import db_handler
+from admin_cache import admin_roster
+from ai_client import CircuitOpenError
+from answer_cache import answer_cache
+from doa_catalog import doa_catalog
+from join_guard import join_aggregator, ANTIRAID_SETTING
+from loop_monitor import is_operator
+from hadith_store import hadith_store, resolve_book, KNOWN_BOOKS
+from reminders import reminder_scheduler, MAX_REMINDERS_PER_USER
+from shared_state import SharedStateError
 # Impor fungsi dari quran_features untuk tes
-from quran_features import send_daily_verse
+from quran_features import build_daily_verse_message, quran_store, get_api_cache_stats, DAILY_VERSE_SETTING
 
 # Inisialisasi logger
 logger = logging.getLogger(__name__)
@@ -53,9 +63,7 @@ async def is_user_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> b
     if not update.effective_chat or not update.effective_user: return False
     if update.effective_chat.type == 'private': return True
     try:
-        member = await context.bot.get_chat_member(update.effective_chat.id, update.effective_user.id)
-        return member.status in ['creator', 'administrator']
-    except BadRequest: return False
+        return await admin_roster.is_admin(context.bot, update.effective_chat.id, update.effective_user.id)
     except Exception as e:
         logger.error(f"Error saat memeriksa status admin: {e}")
         return False
@@ -65,15 +73,14 @@ async def check_admin_and_bot_permissions(update: Update, context: ContextTypes.
     if not await is_user_admin(update, context):
         await update.message.reply_text("Perintah ini hanya untuk admin grup.")
         return False
-    bot_member = await context.bot.get_chat_member(update.effective_chat.id, context.bot.id)
-    if not bot_member.status == 'administrator' or not bot_member.can_restrict_members:
+    if not await admin_roster.bot_can_restrict(context.bot, update.effective_chat.id):
         await update.message.reply_text("Saya tidak memiliki izin untuk melakukan ini. Jadikan saya admin dengan hak 'Restrict Members'.")
         return False
     return True
 
 # --- Fungsi Peringatan Terpusat ---
 async def issue_warning(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_to_warn, warned_by: str, reason: str = None):
-    total_warnings = db_handler.add_user_warning(chat_id, user_to_warn.id)
+    total_warnings = await asyncio.to_thread(db_handler.add_user_warning, chat_id, user_to_warn.id)
     warn_limit = db_handler.get_group_setting(chat_id, 'warn_limit', 3)
     warning_message = f"⚠️ Pengguna {user_to_warn.mention_html()} telah diberi peringatan oleh {warned_by}.\n"
     if reason:
@@ -85,7 +92,7 @@ async def issue_warning(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_t
             await context.bot.ban_chat_member(chat_id, user_to_warn.id)
             await context.bot.unban_chat_member(chat_id, user_to_warn.id)
             await context.bot.send_message(chat_id, f"🚫 {user_to_warn.mention_html()} telah dikeluarkan karena mencapai batas {warn_limit} peringatan.")
-            db_handler.clear_user_warnings(chat_id, user_to_warn.id)
+            await asyncio.to_thread(db_handler.clear_user_warnings, chat_id, user_to_warn.id)
         except Exception as e:
             logger.error(f"Gagal mengeluarkan pengguna {user_to_warn.id}: {e}")
             await context.bot.send_message(chat_id, f"Gagal mengeluarkan {user_to_warn.mention_html()}. Periksa izin saya.")
@@ -145,15 +152,24 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "/warn - Memberi peringatan (balas pesan)\n"
         "/kick - Mengeluarkan anggota (balas pesan)\n"
         "/testayat - Tes kirim ayat harian\n\n"
+        "<b>Admin Bot:</b>\n"
+        "/syncquran - Sinkronkan data Al-Qur'an lokal\n"
+        "/cache - Statistik cache\n"
+        "/modstats - Statistik moderasi\n\n"
         "<b>Fitur Islami & Lainnya:</b>\n"
-        "/doa - Menampilkan doa harian acak\n"
+        "/doa <code>[judul]</code> - Doa harian acak atau berdasarkan judul\n"
         "/mutiarakata - Mutiara kata dari para ulama\n"
         "/tanya <code>[pertanyaan]</code> - Tanya jawab Islami\n"
         "/kisah <code>[nama]</code> - Kisah Nabi/Sahabat\n"
         "/ayat <code>[surah:ayat]</code> - Mengirim ayat Al-Qur'an\n"
         "/tafsir <code>[surah:ayat]</code> - Menampilkan tafsir ayat\n"
         "/hadits <code>[riwayat] [nomor]</code> - Mencari hadits\n"
-        "/ingatkan <code>[waktu] [pesan]</code> - Mengatur pengingat"
+        "/cari <code>[kata kunci]</code> - Cari di Al-Qur'an & hadits\n"
+        "/cariayat <code>[kata kunci]</code> - Cari di terjemahan & tafsir\n"
+        "/carihadits <code>[kata kunci]</code> - Cari di hadits\n"
+        "/ingatkan <code>[waktu] [pesan]</code> - Mengatur pengingat\n"
+        "/daftaringat - Daftar pengingat Anda\n"
+        "/batalingat <code>[nomor]</code> - Membatalkan pengingat"
     )
     await update.message.reply_text(help_text, parse_mode=ParseMode.HTML)
 # --- PERUBAHAN SELESAI ---
@@ -196,21 +212,34 @@ async def statistic(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Error saat mengambil statistik grup: {e}")
         await update.message.reply_text("Maaf, terjadi kesalahan saat mengambil data statistik.")
 
+async def refresh_doa_catalog(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tugas terjadwal: memperbarui katalog doa jika sudah kedaluwarsa (dicek setiap jam)."""
+    await doa_catalog.refresh()
+
+def _format_doa(doa: dict) -> str:
+    return (f"🤲 <b>{html.escape(doa['doa'])}</b>\n\n<b dir='rtl'>{doa['ayat']}</b>\n\n<i>{html.escape(doa['latin'])}</i>\n\n"
+            f"<b>Artinya:</b>\n\"{html.escape(doa['artinya'])}\"")
+
 async def doa_harian_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message: return
-    processing_message = await update.message.reply_text("🤲 Sedang mencari doa harian...")
-    try:
-        url = "https://doa-doa-api-ahmadramadhan.fly.dev/api"
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        doa = random.choice(response.json())
-        doa_text = (f"🤲 <b>{doa['doa']}</b>\n\n<b dir='rtl'>{doa['ayat']}</b>\n\n<i>{doa['latin']}</i>\n\n<b>Artinya:</b>\n\"{doa['artinya']}\"")
-        await update.message.reply_text(doa_text, parse_mode=ParseMode.HTML)
-    except (requests.exceptions.RequestException, ValueError) as e:
-        logger.error(f"Error saat menghubungi API Doa Harian: {e}")
+    # Katalog doa ada di memori (dan disk); jaringan hanya dipakai jika keduanya masih kosong
+    if not await doa_catalog.ensure_loaded():
         await update.message.reply_text("Maaf, terjadi kesalahan saat mencari doa harian.")
-    finally:
-        await context.bot.delete_message(chat_id=update.message.chat.id, message_id=processing_message.message_id)
+        return
+    if not context.args:
+        await update.message.reply_text(_format_doa(doa_catalog.random()), parse_mode=ParseMode.HTML)
+        return
+
+    query = " ".join(context.args)
+    matches = doa_catalog.search(query)
+    if not matches:
+        await update.message.reply_text(f"Doa dengan judul \"{html.escape(query)}\" tidak ditemukan. Coba kata kunci lain, misal: /doa makan")
+        return
+    message = _format_doa(matches[0])
+    if len(matches) > 1:
+        others = "\n".join(f"• <code>/doa {html.escape(doa['doa'])}</code>" for doa in matches[1:])
+        message += f"\n\n<b>Doa lain yang mirip:</b>\n{others}"
+    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
 
 async def mutiarakata_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message: return
@@ -220,7 +249,7 @@ async def mutiarakata_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def tanya_ai_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message: return
-    if not gemini_model:
+    if not ai_client.available:
         await update.message.reply_text("Maaf, fitur AI saat ini tidak tersedia.")
         return
     if not context.args:
@@ -228,19 +257,18 @@ async def tanya_ai_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return
     question = " ".join(context.args)
     processing_message = await update.message.reply_text("🤔 Sedang memproses pertanyaan Anda...")
-    prompt = f'Anda adalah seorang asisten AI cendekiawan Muslim. Jawab pertanyaan berikut dengan sopan, jelas, dan berdasarkan Al-Qur\'an dan Hadits shahih. Pertanyaan: "{question}"'
     try:
-        response = await gemini_model.generate_content_async(prompt)
-        await update.message.reply_text(response.text.strip())
+        # Placeholder diedit bertahap menjadi jawaban (atau langsung dari cache jawaban)
+        await answer_with_cache("tanya", question, tanya_prompt(question), processing_message)
+    except CircuitOpenError:
+        await processing_message.edit_text("Maaf, layanan AI sedang sibuk. Silakan coba lagi beberapa saat lagi.")
     except Exception as e:
         logger.error(f"Error saat menggunakan fitur /tanya: {e}")
-        await update.message.reply_text("Maaf, terjadi kesalahan saat berkomunikasi dengan AI.")
-    finally:
-        await context.bot.delete_message(chat_id=update.message.chat.id, message_id=processing_message.message_id)
+        await processing_message.edit_text("Maaf, terjadi kesalahan saat berkomunikasi dengan AI.")
 
 async def kisah_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message: return
-    if not gemini_model:
+    if not ai_client.available:
         await update.message.reply_text("Maaf, fitur AI saat ini tidak tersedia.")
         return
     if not context.args:
@@ -248,15 +276,14 @@ async def kisah_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
     tokoh = " ".join(context.args)
     processing_message = await update.message.reply_text(f"📜 Sedang membuka lembaran kisah {tokoh.title()}...")
-    prompt = f'Anda adalah seorang pencerita (hakawati) yang ahli dalam sejarah Islam. Ceritakan kisah dari tokoh berikut: "{tokoh}". Fokus pada hikmah yang bisa diambil.'
     try:
-        response = await gemini_model.generate_content_async(prompt)
-        await update.message.reply_text(response.text.strip())
+        # Placeholder diedit bertahap menjadi kisah (atau langsung dari cache jawaban)
+        await answer_with_cache("kisah", tokoh, kisah_prompt(tokoh), processing_message)
+    except CircuitOpenError:
+        await processing_message.edit_text("Maaf, layanan AI sedang sibuk. Silakan coba lagi beberapa saat lagi.")
     except Exception as e:
         logger.error(f"Error saat menggunakan fitur /kisah: {e}")
-        await update.message.reply_text("Maaf, terjadi kesalahan saat berkomunikasi dengan AI.")
-    finally:
-        await context.bot.delete_message(chat_id=update.message.chat.id, message_id=processing_message.message_id)
+        await processing_message.edit_text("Maaf, terjadi kesalahan saat berkomunikasi dengan AI.")
 
 async def hadith_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or len(context.args) != 2:
@@ -267,24 +294,29 @@ async def hadith_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("Nomor hadits harus berupa angka.")
         return
     nomor = int(nomor_str)
-    processing_message = await update.message.reply_text(f"🔍 Sedang mencari Hadits {riwayat.capitalize()} No. {nomor}...")
+    book = resolve_book(riwayat)
+    if book is None:
+        daftar = ", ".join(KNOWN_BOOKS)
+        await update.message.reply_text(f"Riwayat <b>{html.escape(riwayat)}</b> tidak dikenal. Pilihan: {daftar}.", parse_mode=ParseMode.HTML)
+        return
+
+    # Hadits yang sudah tersimpan lokal langsung dikirim tanpa pesan "sedang mencari"
+    result = hadith_store.get_local(book, nomor)
+    processing_message = None
+    if result is None:
+        processing_message = await update.message.reply_text(f"🔍 Sedang mencari Hadits {riwayat.capitalize()} No. {nomor}...")
+        result = await hadith_store.get(book, nomor)
     try:
-        url = f"https://api.hadith.gading.dev/books/{riwayat}/{nomor}"
-        response = requests.get(url, timeout=20)
-        response.raise_for_status()
-        data = response.json()['data']
-        hadith = data['contents']
-        message = (f"📜 <b>Hadits {data['name']} No. {hadith['number']}</b>\n\n<b dir='rtl'>{hadith['arab']}</b>\n\n<i>Artinya: \"{hadith['id']}\"</i>")
-        await update.message.reply_text(message, parse_mode=ParseMode.HTML)
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
+        if isinstance(result, dict):
+            message = (f"📜 <b>Hadits {result['book_name']} No. {result['number']}</b>\n\n<b dir='rtl'>{result['arabic']}</b>\n\n<i>Artinya: \"{result['translation']}\"</i>")
+            await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+        elif result == "not_found":
             await update.message.reply_text(f"Maaf, Hadits {riwayat.capitalize()} nomor {nomor} tidak ditemukan.")
         else:
             await update.message.reply_text("Maaf, terjadi kesalahan pada server Hadits.")
-    except requests.exceptions.RequestException as e:
-        await update.message.reply_text("Maaf, terjadi kesalahan koneksi saat mencari hadits.")
     finally:
-        await context.bot.delete_message(chat_id=update.message.chat.id, message_id=processing_message.message_id)
+        if processing_message is not None:
+            await context.bot.delete_message(chat_id=update.message.chat.id, message_id=processing_message.message_id)
 
 def _parse_reminder_time(time_str: str) -> int:
     try:
@@ -298,35 +330,68 @@ def _parse_reminder_time(time_str: str) -> int:
     except (ValueError, IndexError):
         return 0
 
-async def _reminder_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job = context.job
-    if not job or not job.chat_id or not job.data: return
-    await context.bot.send_message(chat_id=job.chat_id, text=f"⏰ <b>Pengingat:</b>\n\n<i>{job.data}</i>")
+REMINDER_UNAVAILABLE = "⚠️ Penyimpanan pengingat sedang tidak dapat dihubungi. Silakan coba lagi nanti."
 
 async def set_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or len(context.args) < 2:
         await update.message.reply_text("Format salah. Gunakan: /ingatkan <code>[waktu] [pesan]</code>", parse_mode=ParseMode.HTML)
         return
-    if not context.job_queue:
-        await update.message.reply_text("Maaf, fitur pengingat tidak tersedia.")
-        return
     delay = _parse_reminder_time(context.args[0])
     if delay <= 0:
         await update.message.reply_text("Format waktu tidak valid.")
         return
+    chat_id, user_id = update.message.chat.id, update.effective_user.id
     reminder_text = " ".join(context.args[1:])
-    context.job_queue.run_once(_reminder_callback, delay, chat_id=update.message.chat.id, data=reminder_text)
-    await update.message.reply_text(f"✅ Pengingat untuk '<i>{reminder_text}</i>' telah diatur.")
+    try:
+        if await reminder_scheduler.count_for(chat_id, user_id) >= MAX_REMINDERS_PER_USER:
+            await update.message.reply_text(f"Anda sudah memiliki {MAX_REMINDERS_PER_USER} pengingat aktif. Batalkan salah satu dengan /batalingat.")
+            return
+        reminder_id = await reminder_scheduler.add(chat_id, user_id, delay, reminder_text)
+    except SharedStateError as e:
+        logger.error(f"Gagal menyimpan pengingat di chat {chat_id}: {e}")
+        await update.message.reply_text(REMINDER_UNAVAILABLE)
+        return
+    await update.message.reply_text(f"✅ Pengingat #{reminder_id} untuk '<i>{html.escape(reminder_text)}</i>' telah diatur.")
+
+async def list_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not update.message: return
+    try:
+        reminders = await reminder_scheduler.list_for(update.message.chat.id, update.effective_user.id)
+    except SharedStateError as e:
+        logger.error(f"Gagal membaca pengingat di chat {update.message.chat.id}: {e}")
+        await update.message.reply_text(REMINDER_UNAVAILABLE)
+        return
+    if not reminders:
+        await update.message.reply_text("Anda tidak memiliki pengingat aktif di chat ini.")
+        return
+    wib = datetime.timezone(datetime.timedelta(hours=7))
+    lines = [
+        f"#{r['id']} — {datetime.datetime.fromtimestamp(r['due_at'], wib):%d/%m %H:%M} WIB — <i>{html.escape(r['text'])}</i>"
+        for r in reminders
+    ]
+    await update.message.reply_text("⏰ <b>Pengingat Anda</b>\n\n" + "\n".join(lines) + "\n\nBatalkan dengan /batalingat <code>[nomor]</code>", parse_mode=ParseMode.HTML)
+
+async def cancel_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not update.message: return
+    if len(context.args) != 1 or not context.args[0].lstrip('#').isdigit():
+        await update.message.reply_text("Format salah. Gunakan: /batalingat <code>[nomor]</code>", parse_mode=ParseMode.HTML)
+        return
+    reminder_id = int(context.args[0].lstrip('#'))
+    try:
+        cancelled = await reminder_scheduler.cancel(update.message.chat.id, update.effective_user.id, reminder_id)
+    except SharedStateError as e:
+        logger.error(f"Gagal membatalkan pengingat {reminder_id}: {e}")
+        await update.message.reply_text(REMINDER_UNAVAILABLE)
+        return
+    if cancelled:
+        await update.message.reply_text(f"✅ Pengingat #{reminder_id} dibatalkan.")
+    else:
+        await update.message.reply_text(f"Pengingat #{reminder_id} tidak ditemukan.")
 
 async def greet_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or not update.message.new_chat_members: return
-    chat_id = update.message.chat_id
-    if not db_handler.get_group_setting(chat_id, 'welcome_enabled', True): return
-    welcome_template = db_handler.get_group_setting(chat_id, 'welcome_message', db_handler.get_default_welcome_message())
-    for member in update.message.new_chat_members:
-        if member.is_bot: continue
-        message_to_send = welcome_template.format(user_mention=member.mention_html(), chat_title=update.message.chat.title)
-        await update.message.reply_text(message_to_send)
+    # Sapaan dikirim gabungan setelah jeda singkat; lonjakan anggota ditangani mode anti-raid
+    join_aggregator.add(update.message, context)
 
 async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not await check_admin_and_bot_permissions(update, context): return
@@ -350,7 +415,7 @@ async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await context.bot.ban_chat_member(chat_id, user_to_kick.id)
         await context.bot.unban_chat_member(chat_id, user_to_kick.id)
         await update.effective_chat.send_message(f"🚫 {user_to_kick.mention_html()} dikeluarkan oleh {admin_name}.")
-        db_handler.clear_user_warnings(chat_id, user_to_kick.id)
+        await asyncio.to_thread(db_handler.clear_user_warnings, chat_id, user_to_kick.id)
     except Exception as e:
         await update.effective_chat.send_message(f"Gagal mengeluarkan {user_to_kick.mention_html()}.")
 
@@ -361,32 +426,112 @@ async def test_ayat_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("Perintah ini hanya untuk admin.")
         return
 
-    await update.message.reply_text("⚙️ Menjalankan tes pengiriman ayat harian... Pesan akan dikirim ke grup target jika semua konfigurasi benar.")
+    await update.message.reply_text("⚙️ Menjalankan tes pengiriman ayat harian... Pesan akan dikirim ke chat ini.")
     try:
-        # Memanggil fungsi secara langsung
-        await send_daily_verse(context)
-        await update.message.reply_text("✅ Tes selesai. Silakan periksa grup target.")
+        # Render pesan yang sama dengan broadcast, tetapi hanya dikirim ke chat ini
+        message = await build_daily_verse_message()
+        if message is None:
+            await update.message.reply_text("❌ Gagal mengambil ayat harian. Coba lagi nanti.")
+            return
+        await update.effective_chat.send_message(message, parse_mode=ParseMode.HTML)
+        await update.message.reply_text("✅ Tes selesai.")
         logger.info(f"Admin '{update.effective_user.full_name}' berhasil memicu pengiriman ayat tes manual.")
     except Exception as e:
         logger.error(f"Error saat menjalankan /testayat oleh admin '{update.effective_user.full_name}': {e}")
         await update.message.reply_text(f"❌ Terjadi kesalahan saat menjalankan tes: {e}")
 
+async def sync_quran_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """(Admin Bot) Mengunduh/memperbarui seluruh korpus Al-Qur'an lokal."""
+    if not is_operator(update):
+        await update.message.reply_text("Perintah ini hanya untuk admin bot.")
+        return
 
-async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    if not update.message or not await is_user_admin(update, context):
-        await update.message.reply_text("Perintah ini hanya untuk admin.")
-        return ConversationHandler.END
-    chat_id = update.effective_chat.id
+    force = bool(context.args) and context.args[0].lower() == 'paksa'
+    await update.message.reply_text(f"⚙️ Sinkronisasi korpus Al-Qur'an dimulai ({quran_store.surah_count()}/114 surah tersedia)...")
+    summary = await quran_store.sync_all(force=force)
+    await update.message.reply_text(
+        f"✅ Sinkronisasi selesai.\n"
+        f"Diperbarui: {summary['updated']}, dilewati: {summary['skipped']}, gagal: {summary['failed']}.\n"
+        f"Total surah tersedia: {quran_store.surah_count()}/114."
+    )
+
+async def cache_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """(Admin Bot) Menampilkan statistik cache untuk keperluan tuning."""
+    if not is_operator(update):
+        await update.message.reply_text("Perintah ini hanya untuk admin bot.")
+        return
+
+    stats = get_api_cache_stats()
+    message = (
+        "📊 <b>Statistik Cache API Al-Qur'an</b>\n\n"
+        f"Entri: {stats['entries']} ({stats['bytes'] // 1024} KB)\n"
+        f"Hit: {stats['hits']} | Miss: {stats['misses']} | Rasio: {stats['hit_ratio']:.1%}\n"
+        f"Eviction: {stats['evictions']} | Digabung: {stats['coalesced']}"
+    )
+    answers = answer_cache.stats()
+    message += (
+        "\n\n💬 <b>Cache Jawaban AI</b>\n\n"
+        f"Entri: {answers['entries']}\n"
+        f"Hit: {answers['hits']} (mirip: {answers['semantic_hits']}) | Miss: {answers['misses']}"
+    )
+    hadith = hadith_store.stats()
+    message += (
+        "\n\n📜 <b>Korpus Hadits Lokal</b>\n\n"
+        f"Tersimpan: {hadith['stored']} hadits ({hadith['blocks']} blok)\n"
+        f"Dari disk: {hadith['hits']} | Diambil dari API: {hadith['fetches']}"
+    )
+    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+
+async def moderation_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """(Admin Bot) Menampilkan jumlah keputusan moderasi per tier."""
+    if not is_operator(update):
+        await update.message.reply_text("Perintah ini hanya untuk admin bot.")
+        return
+
+    stats = get_moderation_stats()
+    lines = [f"{name}: <b>{count}</b>" for name, count in stats.items()] or ["Belum ada data."]
+    await update.message.reply_text("🛡️ <b>Statistik Moderasi</b>\n\n" + "\n".join(lines), parse_mode=ParseMode.HTML)
+
+# Tombol toggle di menu /settings: callback_data -> (kunci pengaturan, nilai default)
+SETTING_TOGGLES = {
+    'toggle_welcome': ('welcome_enabled', True),
+    'toggle_moderation': ('ai_moderation_enabled', True),
+    'toggle_daily_verse': (DAILY_VERSE_SETTING, False),
+    'toggle_antiraid': (ANTIRAID_SETTING, False),
+}
+
+SETTING_UNAVAILABLE = "⚠️ Pengaturan gagal disimpan karena penyimpanan sedang tidak dapat dihubungi. Silakan coba lagi nanti."
+
+async def _save_setting(chat_id: int, key: str, value) -> bool:
+    """Menyimpan pengaturan di thread terpisah; False jika penyimpanan bersama tidak dapat dihubungi."""
+    try:
+        await asyncio.to_thread(db_handler.set_group_setting, chat_id, key, value)
+        return True
+    except SharedStateError as e:
+        logger.error(f"Gagal menyimpan pengaturan {key} untuk grup {chat_id}: {e}")
+        return False
+
+def _settings_keyboard(chat_id: int) -> InlineKeyboardMarkup:
     welcome_status = "✅ Aktif" if db_handler.get_group_setting(chat_id, 'welcome_enabled', True) else "❌ Nonaktif"
     moderation_status = "✅ Aktif" if db_handler.get_group_setting(chat_id, 'ai_moderation_enabled', True) else "❌ Nonaktif"
+    daily_verse_status = "✅ Aktif" if db_handler.get_group_setting(chat_id, DAILY_VERSE_SETTING, False) else "❌ Nonaktif"
+    antiraid_status = "✅ Aktif" if db_handler.get_group_setting(chat_id, ANTIRAID_SETTING, False) else "❌ Nonaktif"
     keyboard = [
         [InlineKeyboardButton("Ubah Pesan Selamat Datang", callback_data='set_welcome_msg')],
         [InlineKeyboardButton("Ubah Peraturan Grup", callback_data='set_rules')],
         [InlineKeyboardButton(f"Sapaan Anggota: {welcome_status}", callback_data='toggle_welcome')],
         [InlineKeyboardButton(f"Moderasi AI: {moderation_status}", callback_data='toggle_moderation')],
+        [InlineKeyboardButton(f"Ayat Harian: {daily_verse_status}", callback_data='toggle_daily_verse')],
+        [InlineKeyboardButton(f"Anti-Raid: {antiraid_status}", callback_data='toggle_antiraid')],
         [InlineKeyboardButton("Tutup", callback_data='close_settings')],
     ]
-    await update.message.reply_text("⚙️ *Pengaturan Bot*", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
+    return InlineKeyboardMarkup(keyboard)
+
+async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    if not update.message or not await is_user_admin(update, context):
+        await update.message.reply_text("Perintah ini hanya untuk admin.")
+        return ConversationHandler.END
+    await update.message.reply_text("⚙️ *Pengaturan Bot*", reply_markup=_settings_keyboard(update.effective_chat.id), parse_mode="Markdown")
     return SELECTING_ACTION
 
 async def settings_button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -403,11 +548,14 @@ async def settings_button_callback(update: Update, context: ContextTypes.DEFAULT
     elif action == 'set_rules':
         await query.edit_message_text("Kirim peraturan baru. Gunakan format HTML. Ketik /batal untuk batal.")
         return AWAITING_RULES
-    elif action == 'toggle_welcome' or action == 'toggle_moderation':
-        key = 'welcome_enabled' if action == 'toggle_welcome' else 'ai_moderation_enabled'
-        current_status = db_handler.get_group_setting(chat_id, key, True)
-        db_handler.set_group_setting(chat_id, key, not current_status)
-        await settings_command(update.callback_query, context) # Refresh menu
+    elif action in SETTING_TOGGLES:
+        key, default = SETTING_TOGGLES[action]
+        current_status = db_handler.get_group_setting(chat_id, key, default)
+        if not await _save_setting(chat_id, key, not current_status):
+            await query.edit_message_text(SETTING_UNAVAILABLE)
+            return ConversationHandler.END
+        # Refresh menu di pesan yang sama (admin sudah diverifikasi di atas)
+        await query.edit_message_reply_markup(reply_markup=_settings_keyboard(chat_id))
         return SELECTING_ACTION
     elif action == 'close_settings':
         await query.edit_message_text("Menu pengaturan ditutup.")
@@ -416,14 +564,18 @@ async def settings_button_callback(update: Update, context: ContextTypes.DEFAULT
 
 async def save_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if not update.message or not update.message.text: return AWAITING_WELCOME_MESSAGE
-    db_handler.set_group_setting(update.effective_chat.id, 'welcome_message', update.message.text_html)
+    if not await _save_setting(update.effective_chat.id, 'welcome_message', update.message.text_html):
+        await update.message.reply_text(SETTING_UNAVAILABLE)
+        return AWAITING_WELCOME_MESSAGE
     await update.message.reply_text("✅ Pesan selamat datang diperbarui.")
     await settings_command(update, context)
     return ConversationHandler.END
 
 async def save_rules(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if not update.message or not update.message.text: return AWAITING_RULES
-    db_handler.set_group_setting(update.effective_chat.id, 'rules_text', update.message.text_html)
+    if not await _save_setting(update.effective_chat.id, 'rules_text', update.message.text_html):
+        await update.message.reply_text(SETTING_UNAVAILABLE)
+        return AWAITING_RULES
     await update.message.reply_text("✅ Peraturan diperbarui.")
     await settings_command(update, context)
     return ConversationHandler.END
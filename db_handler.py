@@ -2,17 +2,49 @@
 
 """
 Modul untuk menangani database pengaturan grup.
-Menggunakan file JSON sederhana sebagai penyimpanan.
+
+Penyimpanan bersifat pluggable melalui `StorageBackend`:
+- `SQLiteBackend` (default): tabel `group_settings` dan `user_warnings` dalam mode WAL.
+  Setiap perubahan hanya menyentuh satu baris, sehingga biayanya konstan
+  berapa pun jumlah grupnya.
+- `JsonBackend`: file JSON tunggal yang dimuat ke memori dan disimpan secara
+  write-behind (debounce) dengan penulisan atomik.
+- `SharedStateBackend`: hash per grup di state bersama (lihat shared_state.py),
+  untuk menjalankan beberapa instance bot yang berbagi data yang sama.
+
+Backend dipilih lewat environment variable DB_BACKEND ("sqlite", "json", atau "shared").
+Saat SQLite pertama kali dipakai, isi db_settings.json lama dimigrasikan otomatis.
 """
 
+import asyncio
+import atexit
 import json
 import logging
-from typing import Dict, Any
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from metrics import Histogram
+from shared_state import SharedState, SharedStateError, shared_state
 
 # Inisialisasi logger
 logger = logging.getLogger(__name__)
 
 DB_FILE = "db_settings.json"
+SQLITE_FILE = os.environ.get('DB_SQLITE_FILE', "db_settings.sqlite3")
+DB_BACKEND = os.environ.get('DB_BACKEND', 'sqlite').lower()
+# Jeda (detik) sebelum perubahan yang tertunda ditulis ke disk (khusus JsonBackend).
+FLUSH_INTERVAL = float(os.environ.get('DB_FLUSH_INTERVAL', '2.0'))
+# Umur cache lokal pengaturan grup (detik, khusus SharedStateBackend).
+SHARED_CACHE_TTL = float(os.environ.get('DB_SHARED_CACHE_TTL', '5.0'))
+
+DB_LATENCY = Histogram("bot_db_operation_duration_seconds", "Durasi operasi baca/tulis db_handler.", ["operation"],
+                       buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+
+_write_lock = threading.Lock()   # Menjamin hanya satu penulisan file JSON dalam satu waktu
 
 def load_settings() -> Dict[str, Any]:
     """Memuat semua pengaturan dari file JSON."""
@@ -27,65 +59,456 @@ def load_settings() -> Dict[str, Any]:
         return {}
 
 def save_settings(settings: Dict[str, Any]) -> None:
-    """Menyimpan semua pengaturan ke file JSON."""
+    """
+    Menyimpan semua pengaturan ke file JSON secara atomik.
+    Data ditulis ke file sementara di direktori yang sama lalu di-rename,
+    sehingga file tidak pernah tertinggal dalam keadaan setengah tertulis.
+    """
+    _write_atomic(json.dumps(settings, ensure_ascii=False))
+
+def _write_atomic(payload: str) -> None:
+    directory = os.path.dirname(os.path.abspath(DB_FILE))
+    with _write_lock:
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".db_settings.", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, DB_FILE)
+        except Exception as e:
+            logger.error(f"Gagal menyimpan pengaturan ke {DB_FILE}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+# --- Antarmuka Backend ---
+
+class StorageBackend:
+    """Antarmuka penyimpanan yang dipakai oleh fungsi-fungsi publik modul ini."""
+
+    def get_setting(self, chat_id: int, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set_setting(self, chat_id: int, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def add_warning(self, chat_id: int, user_id: int) -> int:
+        raise NotImplementedError
+
+    def get_warnings(self, chat_id: int, user_id: int) -> int:
+        raise NotImplementedError
+
+    def clear_warnings(self, chat_id: int, user_id: int) -> bool:
+        """Menghapus peringatan; mengembalikan True jika ada yang dihapus."""
+        raise NotImplementedError
+
+    def find_chats(self, key: str, value: Any) -> List[int]:
+        """Mengembalikan semua chat_id yang pengaturan `key`-nya bernilai `value`."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Menulis perubahan yang tertunda (jika ada) ke media penyimpanan."""
+
+    def close(self) -> None:
+        self.flush()
+
+class JsonBackend(StorageBackend):
+    """
+    Seluruh pengaturan dimuat sekali ke memori. Penulisan ditandai "kotor" dan
+    disimpan ke disk oleh timer (write-behind), sehingga beberapa perubahan
+    beruntun cukup ditulis satu kali.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()   # Melindungi _settings, _dirty, dan _flush_timer
+        self._settings = load_settings()
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        logger.info(f"Pengaturan untuk {len(self._settings)} grup dimuat ke memori.")
+
+    def _mark_dirty(self) -> None:
+        """Menandai data berubah dan menjadwalkan penyimpanan (debounce)."""
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            # Serialisasi di dalam lock agar snapshot konsisten; penulisan file di luar lock
+            payload = json.dumps(self._settings, ensure_ascii=False)
+            self._dirty = False
+        _write_atomic(payload)
+
+    def get_setting(self, chat_id: int, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._settings.get(str(chat_id), {}).get(key, default)
+
+    def set_setting(self, chat_id: int, key: str, value: Any) -> None:
+        with self._lock:
+            self._settings.setdefault(str(chat_id), {})[key] = value
+            self._mark_dirty()
+
+    def add_warning(self, chat_id: int, user_id: int) -> int:
+        with self._lock:
+            warnings = self._settings.setdefault(str(chat_id), {}).setdefault('warnings', {})
+            new_warnings = warnings.get(str(user_id), 0) + 1
+            warnings[str(user_id)] = new_warnings
+            self._mark_dirty()
+            return new_warnings
+
+    def get_warnings(self, chat_id: int, user_id: int) -> int:
+        with self._lock:
+            return self._settings.get(str(chat_id), {}).get('warnings', {}).get(str(user_id), 0)
+
+    def clear_warnings(self, chat_id: int, user_id: int) -> bool:
+        with self._lock:
+            warnings = self._settings.get(str(chat_id), {}).get('warnings', {})
+            if str(user_id) not in warnings:
+                return False
+            del warnings[str(user_id)]
+            self._mark_dirty()
+            return True
+
+    def find_chats(self, key: str, value: Any) -> List[int]:
+        with self._lock:
+            return [int(chat_id) for chat_id, group in self._settings.items() if group.get(key) == value]
+
+class SQLiteBackend(StorageBackend):
+    """
+    Backend SQLite dalam mode WAL. Nilai pengaturan disimpan sebagai JSON per
+    baris (chat_id, key) dan di-cache di memori (write-through), sehingga
+    pembacaan tidak menyentuh disk. Penambahan peringatan dilakukan dengan
+    satu UPSERT atomik.
+    """
+
+    def __init__(self, path: str = SQLITE_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS group_settings (
+                chat_id TEXT NOT NULL,
+                key     TEXT NOT NULL,
+                value   TEXT NOT NULL,
+                PRIMARY KEY (chat_id, key)
+            );
+            CREATE TABLE IF NOT EXISTS user_warnings (
+                chat_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                count   INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (chat_id, user_id)
+            );
+        """)
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        for chat_id, key, value in self._conn.execute("SELECT chat_id, key, value FROM group_settings"):
+            self._cache.setdefault(chat_id, {})[key] = json.loads(value)
+        logger.info(f"Database SQLite {path} dibuka ({len(self._cache)} grup).")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM group_settings) + (SELECT COUNT(*) FROM user_warnings)"
+            ).fetchone()
+            return row[0] == 0
+
+    def get_setting(self, chat_id: int, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._cache.get(str(chat_id), {}).get(key, default)
+
+    def set_setting(self, chat_id: int, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO group_settings (chat_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (chat_id, key) DO UPDATE SET value = excluded.value",
+                (str(chat_id), key, json.dumps(value, ensure_ascii=False)),
+            )
+            self._cache.setdefault(str(chat_id), {})[key] = value
+
+    def add_warning(self, chat_id: int, user_id: int) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "INSERT INTO user_warnings (chat_id, user_id, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (chat_id, user_id) DO UPDATE SET count = count + 1 "
+                "RETURNING count",
+                (str(chat_id), str(user_id)),
+            ).fetchone()
+            return row[0]
+
+    def get_warnings(self, chat_id: int, user_id: int) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT count FROM user_warnings WHERE chat_id = ? AND user_id = ?",
+                (str(chat_id), str(user_id)),
+            ).fetchone()
+            return row[0] if row else 0
+
+    def clear_warnings(self, chat_id: int, user_id: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM user_warnings WHERE chat_id = ? AND user_id = ?",
+                (str(chat_id), str(user_id)),
+            )
+            return cursor.rowcount > 0
+
+    def find_chats(self, key: str, value: Any) -> List[int]:
+        # Cache memori sudah memuat semua pengaturan, tidak perlu query ke disk
+        with self._lock:
+            return [int(chat_id) for chat_id, group in self._cache.items() if group.get(key) == value]
+
+    def import_settings(self, settings: Dict[str, Any]) -> None:
+        """Mengimpor dokumen JSON lama dalam satu transaksi."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for chat_id, group in settings.items():
+                    for key, value in group.items():
+                        if key == 'warnings':
+                            self._conn.executemany(
+                                "INSERT OR REPLACE INTO user_warnings (chat_id, user_id, count) VALUES (?, ?, ?)",
+                                [(chat_id, user_id, count) for user_id, count in value.items()],
+                            )
+                            continue
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO group_settings (chat_id, key, value) VALUES (?, ?, ?)",
+                            (chat_id, key, json.dumps(value, ensure_ascii=False)),
+                        )
+                        self._cache.setdefault(chat_id, {})[key] = value
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class SharedStateBackend(StorageBackend):
+    """
+    Backend di atas state bersama. Pengaturan satu grup disimpan sebagai hash
+    `settings:<chat_id>` (nilai berupa JSON), disertai indeks set
+    `settings:idx:<key>:<nilai>` untuk `find_chats`; nilai dan indeksnya
+    diperbarui dalam satu operasi atomik. Peringatan memakai INCR
+    atomik sehingga aman ditambah dari beberapa instance sekaligus.
+
+    Pembacaan di-cache lokal selama `cache_ttl` detik. Karena update satu chat
+    selalu diproses oleh instance yang sama (lihat cluster.py), cache ini
+    hampir selalu sudah mutakhir; penulisan dari instance ini langsung
+    memperbaruinya. Cache diisi di thread terpisah sebelum handler berjalan
+    (`prefetch_group_settings`), sehingga handler tidak menunggu jaringan.
+
+    Jika state bersama tidak dapat dihubungi, pembacaan memakai cache lama
+    (atau nilai default), `find_chats` mengembalikan daftar kosong, dan
+    peringatan dihitung sementara di memori lokal. Penulisan pengaturan tidak
+    dipalsukan: SharedStateError diteruskan agar pengguna diberi tahu.
+    """
+
+    def __init__(self, state: SharedState, cache_ttl: float = SHARED_CACHE_TTL):
+        self.state = state
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._local_warnings: Dict[str, int] = {}
+        logger.info("Pengaturan grup disimpan di state bersama.")
+
+    @staticmethod
+    def _encode(value: Any) -> str:
+        # Nilai di hash dan akhiran kunci indeks memakai serialisasi yang sama
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+    @staticmethod
+    def _index_prefix(key: str) -> str:
+        return f"settings:idx:{key}:"
+
+    def is_fresh(self, chat_id: int) -> bool:
+        with self._lock:
+            cached = self._cache.get(str(chat_id))
+        return cached is not None and time.monotonic() - cached[0] < self.cache_ttl
+
+    def _group(self, chat_id: int) -> Dict[str, Any]:
+        chat = str(chat_id)
+        with self._lock:
+            cached = self._cache.get(chat)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        try:
+            group = {key: json.loads(value) for key, value in self.state.hgetall(f"settings:{chat}").items()}
+        except SharedStateError as e:
+            logger.warning(f"Pengaturan grup {chat} tidak dapat dibaca dari state bersama, memakai cache/default: {e}")
+            return cached[1] if cached is not None else {}
+        with self._lock:
+            self._cache[chat] = (time.monotonic(), group)
+        return group
+
+    def refresh(self, chat_id: int) -> None:
+        """Memuat pengaturan grup ke cache lokal jika sudah kedaluwarsa (dijalankan di thread)."""
+        self._group(chat_id)
+
+    def get_setting(self, chat_id: int, key: str, default: Any = None) -> Any:
+        return self._group(chat_id).get(key, default)
+
+    def set_setting(self, chat_id: int, key: str, value: Any) -> None:
+        """Menulis nilai dan indeksnya secara atomik. SharedStateError diteruskan ke pemanggil."""
+        chat = str(chat_id)
+        self.state.hset_indexed(f"settings:{chat}", key, self._encode(value), self._index_prefix(key), chat)
+        with self._lock:
+            cached = self._cache.get(chat)
+            if cached is not None:
+                cached[1][key] = value
+
+    def add_warning(self, chat_id: int, user_id: int) -> int:
+        key = f"warnings:{chat_id}:{user_id}"
+        try:
+            return self.state.incr(key)
+        except SharedStateError as e:
+            logger.error(f"Peringatan {key} dihitung lokal karena state bersama tidak dapat dihubungi: {e}")
+            with self._lock:
+                self._local_warnings[key] = self._local_warnings.get(key, 0) + 1
+                return self._local_warnings[key]
+
+    def get_warnings(self, chat_id: int, user_id: int) -> int:
+        key = f"warnings:{chat_id}:{user_id}"
+        try:
+            return int(self.state.get(key) or 0)
+        except SharedStateError as e:
+            logger.warning(f"Peringatan {key} tidak dapat dibaca dari state bersama: {e}")
+            with self._lock:
+                return self._local_warnings.get(key, 0)
+
+    def clear_warnings(self, chat_id: int, user_id: int) -> bool:
+        key = f"warnings:{chat_id}:{user_id}"
+        with self._lock:
+            cleared_local = self._local_warnings.pop(key, None) is not None
+        try:
+            return self.state.delete(key) > 0 or cleared_local
+        except SharedStateError as e:
+            logger.error(f"Peringatan {key} tidak dapat dihapus dari state bersama: {e}")
+            return cleared_local
+
+    def find_chats(self, key: str, value: Any) -> List[int]:
+        try:
+            members = self.state.smembers(self._index_prefix(key) + self._encode(value))
+        except SharedStateError as e:
+            logger.error(f"Indeks pengaturan {key} tidak dapat dibaca dari state bersama: {e}")
+            return []
+        return sorted(int(chat_id) for chat_id in members)
+
+def migrate_json_to_sqlite(backend: SQLiteBackend, json_path: str = DB_FILE) -> bool:
+    """
+    Migrasi satu kali dari db_settings.json ke SQLite.
+    Hanya berjalan jika database masih kosong; file JSON lalu diganti nama
+    menjadi *.migrated agar tidak diimpor ulang.
+    """
+    if not os.path.exists(json_path) or not backend.is_empty():
+        return False
     try:
-        with open(DB_FILE, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, indent=4, ensure_ascii=False)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+        backend.import_settings(settings)
+        os.replace(json_path, json_path + ".migrated")
+        logger.info(f"Migrasi {len(settings)} grup dari {json_path} ke SQLite selesai.")
+        return True
     except Exception as e:
-        logger.error(f"Gagal menyimpan pengaturan ke {DB_FILE}: {e}")
+        logger.error(f"Gagal migrasi {json_path} ke SQLite: {e}")
+        return False
+
+# --- Backend Aktif ---
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+def init_store(backend: Optional[StorageBackend] = None) -> StorageBackend:
+    """
+    Menyiapkan backend penyimpanan. Dipanggil sekali saat bot dimulai;
+    jika `backend` diberikan, backend tersebut yang dipakai.
+    """
+    global _backend
+    with _backend_lock:
+        if backend is not None:
+            _backend = backend
+        elif _backend is None:
+            if DB_BACKEND == 'json':
+                _backend = JsonBackend()
+            elif DB_BACKEND == 'shared':
+                if shared_state is None:
+                    raise RuntimeError("DB_BACKEND=shared membutuhkan SHARED_STATE_URL.")
+                _backend = SharedStateBackend(shared_state)
+            else:
+                sqlite_backend = SQLiteBackend()
+                migrate_json_to_sqlite(sqlite_backend)
+                _backend = sqlite_backend
+        return _backend
+
+def _store() -> StorageBackend:
+    return _backend if _backend is not None else init_store()
+
+def flush_settings() -> None:
+    """Menulis perubahan yang tertunda ke disk. Aman dipanggil kapan saja."""
+    if _backend is not None:
+        _backend.flush()
+
+def close_store() -> None:
+    """Menutup backend penyimpanan saat bot berhenti."""
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+            _backend = None
+
+# Pastikan perubahan terakhir tidak hilang saat proses berhenti.
+atexit.register(flush_settings)
 
 def get_group_setting(chat_id: int, key: str, default: Any = None) -> Any:
     """Mengambil satu nilai pengaturan spesifik untuk sebuah grup."""
-    settings = load_settings()
-    return settings.get(str(chat_id), {}).get(key, default)
+    with DB_LATENCY.time(operation="get_setting"):
+        return _store().get_setting(chat_id, key, default)
+
+async def prefetch_group_settings(chat_id: int) -> None:
+    """
+    Memuat pengaturan grup ke cache lokal di thread terpisah (hanya backend
+    state bersama) agar `get_group_setting` di handler tidak menahan event loop.
+    """
+    store = _store()
+    if isinstance(store, SharedStateBackend) and not store.is_fresh(chat_id):
+        await asyncio.to_thread(store.refresh, chat_id)
 
 def set_group_setting(chat_id: int, key: str, value: Any) -> None:
     """Menyimpan satu nilai pengaturan spesifik untuk sebuah grup."""
-    settings = load_settings()
-    chat_id_str = str(chat_id)
-    
-    if chat_id_str not in settings:
-        settings[chat_id_str] = {}
-    
-    settings[chat_id_str][key] = value
-    save_settings(settings)
+    with DB_LATENCY.time(operation="set_setting"):
+        _store().set_setting(chat_id, key, value)
+
+def get_chats_with_setting(key: str, value: Any) -> List[int]:
+    """Mengambil semua grup yang pengaturan `key`-nya bernilai `value` (misal: pelanggan ayat harian)."""
+    with DB_LATENCY.time(operation="find_chats"):
+        return _store().find_chats(key, value)
 
 # --- FITUR BARU: Fungsi untuk Sistem Peringatan ---
 
 def add_user_warning(chat_id: int, user_id: int) -> int:
     """Menambahkan satu peringatan untuk pengguna dan mengembalikan jumlah totalnya."""
-    settings = load_settings()
-    chat_id_str = str(chat_id)
-    user_id_str = str(user_id)
-
-    if chat_id_str not in settings:
-        settings[chat_id_str] = {}
-    if 'warnings' not in settings[chat_id_str]:
-        settings[chat_id_str]['warnings'] = {}
-    
-    # Tambahkan peringatan, default ke 0 jika belum ada
-    current_warnings = settings[chat_id_str]['warnings'].get(user_id_str, 0)
-    new_warnings = current_warnings + 1
-    settings[chat_id_str]['warnings'][user_id_str] = new_warnings
-    
-    save_settings(settings)
-    return new_warnings
+    with DB_LATENCY.time(operation="add_warning"):
+        return _store().add_warning(chat_id, user_id)
 
 def get_user_warnings(chat_id: int, user_id: int) -> int:
     """Mengambil jumlah peringatan untuk seorang pengguna."""
-    settings = load_settings()
-    return settings.get(str(chat_id), {}).get('warnings', {}).get(str(user_id), 0)
+    with DB_LATENCY.time(operation="get_warnings"):
+        return _store().get_warnings(chat_id, user_id)
 
 def clear_user_warnings(chat_id: int, user_id: int) -> None:
     """Menghapus semua peringatan untuk seorang pengguna."""
-    settings = load_settings()
-    chat_id_str = str(chat_id)
-    user_id_str = str(user_id)
-
-    if chat_id_str in settings and 'warnings' in settings[chat_id_str] and user_id_str in settings[chat_id_str]['warnings']:
-        del settings[chat_id_str]['warnings'][user_id_str]
-        save_settings(settings)
-        logger.info(f"Peringatan untuk pengguna {user_id_str} di grup {chat_id_str} telah dihapus.")
+    with DB_LATENCY.time(operation="clear_warnings"):
+        cleared = _store().clear_warnings(chat_id, user_id)
+    if cleared:
+        logger.info(f"Peringatan untuk pengguna {user_id} di grup {chat_id} telah dihapus.")
 
 # --- Fungsi Default (Tetap Sama) ---
 
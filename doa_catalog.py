@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+Katalog doa harian dari doa-doa-api-ahmadramadhan.fly.dev.
+
+Daftar doa diunduh sekali, disimpan di memori, diperbarui berkala di latar
+belakang, dan disalin ke disk agar tetap tersedia saat API tidak bisa
+dihubungi. /doa cukup membaca dari memori tanpa panggilan jaringan.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+import http_client
+from search_index import tokenize
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+DOA_API_URL = "https://doa-doa-api-ahmadramadhan.fly.dev/api"
+DOA_CATALOG_FILE = os.environ.get('DOA_CATALOG_FILE', "doa_catalog.json")
+DOA_REFRESH_INTERVAL = float(os.environ.get('DOA_REFRESH_HOURS', '12')) * 3600
+REQUIRED_FIELDS = ("doa", "ayat", "latin", "artinya")
+
+def _title_terms(title: str) -> set:
+    # Kata "doa" ada di hampir semua judul sehingga tidak membedakan apa pun
+    return set(tokenize(title)) - {"doa"}
+
+class DoaCatalog:
+    """Daftar doa di memori dengan cadangan di disk dan pencarian berdasarkan judul."""
+
+    def __init__(self, path: str = DOA_CATALOG_FILE):
+        self.path = path
+        self.entries: List[Dict[str, Any]] = []
+        self._title_tokens: List[set] = []
+        self.updated_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._load()
+
+    def _set_entries(self, entries: List[Dict[str, Any]], updated_at: float) -> None:
+        self.entries = entries
+        self._title_tokens = [_title_terms(entry['doa']) for entry in entries]
+        self.updated_at = updated_at
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._set_entries(data['entries'], data.get('updated_at', 0.0))
+            logger.info(f"Katalog doa dimuat dari disk: {len(self.entries)} doa.")
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Katalog doa di {self.path} rusak dan diabaikan: {e}")
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"updated_at": self.updated_at, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() - self.updated_at > DOA_REFRESH_INTERVAL
+
+    async def refresh(self, force: bool = False) -> bool:
+        """
+        Mengunduh ulang daftar doa. Jika gagal, data lama (memori/disk) tetap dipakai.
+        Mengembalikan True jika katalog berhasil diperbarui.
+        """
+        async with self._refresh_lock:
+            # Permintaan lain mungkin sudah memperbarui katalog selama menunggu lock
+            if not force and self.entries and not self.is_stale:
+                return False
+            try:
+                data = await http_client.get_json(DOA_API_URL)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.error(f"Gagal memperbarui katalog doa ({len(self.entries)} doa lama tetap dipakai): {e}")
+                return False
+            entries = [
+                {field: str(item[field]).strip() for field in REQUIRED_FIELDS}
+                for item in data if isinstance(item, dict) and all(item.get(f) for f in REQUIRED_FIELDS)
+            ] if isinstance(data, list) else []
+            if not entries:
+                logger.error("API doa mengembalikan daftar kosong atau tidak valid; katalog tidak diubah.")
+                return False
+            self._set_entries(entries, time.time())
+            await asyncio.to_thread(self._save)
+            logger.info(f"Katalog doa diperbarui: {len(entries)} doa.")
+            return True
+
+    async def ensure_loaded(self) -> bool:
+        """Memastikan katalog berisi data (mengunduh sekali jika memori dan disk kosong)."""
+        if not self.entries:
+            await self.refresh()
+        return bool(self.entries)
+
+    def random(self) -> Optional[Dict[str, Any]]:
+        return random.choice(self.entries) if self.entries else None
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Doa yang judulnya paling cocok dengan `query` (judul persis didahulukan)."""
+        wanted = query.strip().lower()
+        terms = _title_terms(query)
+        scored = []
+        for entry, title_tokens in zip(self.entries, self._title_tokens):
+            title = entry['doa'].lower()
+            if title == wanted or title == f"doa {wanted}":
+                scored.append((2.0, -len(title), entry))
+            elif terms:
+                overlap = len(terms & title_tokens) / len(terms)
+                if overlap >= 0.5 or wanted in title:
+                    scored.append((max(overlap, 1.0 if wanted in title else 0.0), -len(title), entry))
+        scored.sort(key=lambda item: item[:2], reverse=True)
+        return [entry for _, _, entry in scored[:limit]]
+
+doa_catalog = DoaCatalog()
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+"""
+Penyimpanan lokal hadits dari api.hadith.gading.dev.
+
+Hadits disimpan di SQLite dengan kunci (kitab, nomor). Saat sebuah nomor
+belum tersedia, seluruh blok nomor di sekitarnya diambil sekaligus lewat
+parameter `?range=` API, sehingga hadits berdekatan yang biasanya diminta
+berikutnya langsung tersedia dari disk. Endpoint per hadits hanya dipakai
+sebagai cadangan jika pengambilan blok gagal.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple, Union
+
+import httpx
+
+import http_client
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+HADITH_API_BASE = "https://api.hadith.gading.dev"
+HADITH_DB_FILE = os.environ.get('HADITH_DB_FILE', "hadith_corpus.sqlite3")
+# Jumlah hadits per pengambilan range (API membatasi maksimal 300)
+BLOCK_SIZE = int(os.environ.get('HADITH_BLOCK_SIZE', '100'))
+# Daftar kitab diperbarui setelah batas ini (detik)
+BOOKS_REFRESH_AFTER = 7 * 86400
+BOOKS_RETRY_AFTER = 300  # Jeda sebelum mencoba lagi jika pengambilan daftar kitab gagal
+
+# Kitab yang didukung API: id -> nama tampilan (dipakai jika /books belum pernah berhasil diambil)
+KNOWN_BOOKS = {
+    "abu-daud": "Abu Daud", "ahmad": "Ahmad", "bukhari": "Bukhari", "darimi": "Darimi",
+    "ibnu-majah": "Ibnu Majah", "malik": "Malik", "muslim": "Muslim", "nasai": "Nasai",
+    "tirmidzi": "Tirmidzi",
+}
+# Ejaan lain yang sering dipakai pengguna
+BOOK_ALIASES = {
+    "abudaud": "abu-daud", "abu-dawud": "abu-daud", "abudawud": "abu-daud",
+    "ibnumajah": "ibnu-majah", "ibn-majah": "ibnu-majah", "tirmizi": "tirmidzi",
+    "tirmidhi": "tirmidzi", "nasa'i": "nasai", "an-nasai": "nasai", "ad-darimi": "darimi",
+}
+
+Fetcher = Callable[[str], Awaitable[Union[Dict[str, Any], str]]]
+
+async def fetch_hadith_api(endpoint: str) -> Union[Dict[str, Any], str]:
+    """
+    Mengambil data dari API hadits.
+
+    Returns:
+        Isi `data` dari respons JSON, atau string error ("not_found"/"api_error").
+    """
+    url = f"{HADITH_API_BASE}{endpoint}"
+    try:
+        json_data = await http_client.get_json(url)
+        if not isinstance(json_data, dict) or 'data' not in json_data:
+            logger.error(f"API hadits mengembalikan respons tanpa data untuk {url}")
+            return "api_error"
+        return json_data['data']
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return "not_found"
+        logger.error(f"HTTP Error saat mengambil {url}: {e}")
+        return "api_error"
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Error permintaan saat mengambil {url}: {e}")
+        return "api_error"
+
+def resolve_book(name: str) -> Optional[str]:
+    """Mengubah nama kitab dari pengguna menjadi id API, atau None jika tidak dikenal."""
+    key = name.strip().lower().replace(" ", "-").replace("_", "-")
+    key = BOOK_ALIASES.get(key, key)
+    return key if key in KNOWN_BOOKS else None
+
+class HadithStore:
+    """Korpus hadits lokal yang diisi lazy per blok nomor."""
+
+    def __init__(self, fetcher: Fetcher = fetch_hadith_api, path: str = HADITH_DB_FILE,
+                 block_size: int = BLOCK_SIZE):
+        self._fetch = fetcher
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS books (
+                id         TEXT PRIMARY KEY,
+                name       TEXT NOT NULL,
+                available  INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS hadith (
+                book      TEXT NOT NULL,
+                number    INTEGER NOT NULL,
+                arab      TEXT NOT NULL,
+                terjemah  TEXT NOT NULL,
+                PRIMARY KEY (book, number)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS blocks (
+                book  TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                PRIMARY KEY (book, start)
+            ) WITHOUT ROWID;
+        """)
+        # Metadata kecil disimpan di memori: id kitab -> (nama, jumlah hadits, waktu pembaruan)
+        self._books: Dict[str, Tuple[str, int, float]] = {
+            row[0]: row[1:] for row in self._conn.execute("SELECT id, name, available, updated_at FROM books")
+        }
+        # Blok yang sudah diambil lengkap: nomor yang tidak ada di dalamnya memang tidak ada
+        self._blocks = set(self._conn.execute("SELECT book, start FROM blocks"))
+        self._block_locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        self._books_lock = asyncio.Lock()
+        self._books_checked_at = float('-inf')
+        self.hits = 0
+        self.fetches = 0
+        logger.info(f"Korpus hadits lokal dibuka: {self.count()} hadits tersimpan.")
+
+    # --- Metadata Kitab ---
+
+    def book_name(self, book: str) -> str:
+        meta = self._books.get(book)
+        return meta[0] if meta else KNOWN_BOOKS.get(book, book)
+
+    def book_size(self, book: str) -> Optional[int]:
+        meta = self._books.get(book)
+        return meta[1] if meta else None
+
+    async def refresh_books(self, force: bool = False) -> None:
+        """Memperbarui daftar kitab (nama dan jumlah hadits) dari API."""
+        fresh = self._books and all(time.time() - meta[2] < BOOKS_REFRESH_AFTER for meta in self._books.values())
+        recently_tried = time.monotonic() - self._books_checked_at < BOOKS_RETRY_AFTER
+        if not force and (fresh or recently_tried):
+            return
+        async with self._books_lock:
+            self._books_checked_at = time.monotonic()
+            data = await self._fetch("/books")
+            if not isinstance(data, list):
+                logger.warning(f"Daftar kitab hadits gagal diambil ({data}).")
+                return
+            now = time.time()
+            rows = [(b['id'], b.get('name', KNOWN_BOOKS.get(b['id'], b['id'])), int(b.get('available', 0)), now)
+                    for b in data if isinstance(b, dict) and b.get('id')]
+            with self._lock:
+                self._conn.executemany("INSERT OR REPLACE INTO books (id, name, available, updated_at) "
+                                       "VALUES (?, ?, ?, ?)", rows)
+            self._books.update({row[0]: row[1:] for row in rows})
+
+    # --- Pencarian ---
+
+    def _block_start(self, number: int) -> int:
+        return (number - 1) // self.block_size * self.block_size + 1
+
+    def _read(self, book: str, number: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT arab, terjemah FROM hadith WHERE book = ? AND number = ?", (book, number)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"book": book, "book_name": self.book_name(book), "number": number,
+                "arabic": row[0], "translation": row[1]}
+
+    def get_local(self, book: str, number: int) -> Optional[Dict[str, Any]]:
+        """Mengambil hadits hanya dari disk (tanpa jaringan)."""
+        hadith = self._read(book, number)
+        if hadith is not None:
+            self.hits += 1
+        return hadith
+
+    async def get(self, book: str, number: int) -> Union[Dict[str, Any], str]:
+        """
+        Mengambil satu hadits. Mengembalikan dict, atau string error
+        ("not_found" jika nomor tidak ada, "api_error" jika API gagal).
+        """
+        hadith = self._read(book, number)
+        if hadith is not None:
+            self.hits += 1
+            return hadith
+        if book not in KNOWN_BOOKS or number < 1:
+            return "not_found"
+        await self.refresh_books()
+        size = self.book_size(book)
+        if size is not None and number > size:
+            return "not_found"
+
+        start = self._block_start(number)
+        if (book, start) not in self._blocks:
+            error = await self.prefetch(book, start)
+            hadith = self._read(book, number)
+            if hadith is not None:
+                return hadith
+            if error is None:
+                return "not_found"
+            # Cadangan: ambil hadits tunggal jika pengambilan blok gagal
+            return await self._fetch_single(book, number)
+        return "not_found"
+
+    async def prefetch(self, book: str, start: int) -> Optional[str]:
+        """
+        Mengambil satu blok hadits mulai dari nomor `start` dan menyimpannya.
+        Mengembalikan None jika berhasil, atau string error.
+        """
+        key = (book, start)
+        lock = self._block_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Periksa ulang: permintaan lain mungkin sudah mengambil blok ini
+            if key in self._blocks:
+                return None
+            end = start + self.block_size - 1
+            self.fetches += 1
+            data = await self._fetch(f"/books/{book}?range={start}-{end}")
+            if isinstance(data, str):
+                return data
+            rows = [(book, int(h['number']), h.get('arab', ''), h.get('id', ''))
+                    for h in data.get('hadiths', []) if isinstance(h, dict) and 'number' in h]
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany("INSERT OR REPLACE INTO hadith (book, number, arab, terjemah) "
+                                           "VALUES (?, ?, ?, ?)", rows)
+                    self._conn.execute("INSERT OR IGNORE INTO blocks (book, start) VALUES (?, ?)", key)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            self._blocks.add(key)
+            self._block_locks.pop(key, None)
+            logger.info(f"Hadits {self.book_name(book)} {start}-{end} tersimpan di korpus lokal ({len(rows)} hadits).")
+            return None
+
+    async def _fetch_single(self, book: str, number: int) -> Union[Dict[str, Any], str]:
+        data = await self._fetch(f"/books/{book}/{number}")
+        if isinstance(data, str):
+            return data
+        contents = data.get('contents') or {}
+        arab, terjemah = contents.get('arab', ''), contents.get('id', '')
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO hadith (book, number, arab, terjemah) VALUES (?, ?, ?, ?)",
+                               (book, number, arab, terjemah))
+        return {"book": book, "book_name": data.get('name') or self.book_name(book), "number": number,
+                "arabic": arab, "translation": terjemah}
+
+    def iter_hadiths(self) -> Iterator[Tuple[str, int, str]]:
+        """Semua hadits tersimpan sebagai (kitab, nomor, terjemah)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT book, number, terjemah FROM hadith").fetchall()
+        return iter(rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hadith").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"stored": self.count(), "blocks": len(self._blocks), "hits": self.hits, "fetches": self.fetches}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+hadith_store = HadithStore()
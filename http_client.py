@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+Klien HTTP asinkron bersama untuk semua API eksternal (equran.id, hadith, doa).
+
+Satu `httpx.AsyncClient` dipakai ulang oleh seluruh bot sehingga koneksi
+keep-alive ke tiap host bisa di-pool. Setiap host juga dibatasi jumlah
+permintaan paralelnya dan memiliki timeout sendiri, sehingga satu API yang
+lambat tidak menghabiskan koneksi atau memblokir update lain.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import Counter, Histogram
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+# Batas paralel default per host, dapat diubah lewat environment variable.
+PER_HOST_LIMIT = int(os.environ.get('HTTP_PER_HOST_LIMIT', '8'))
+DEFAULT_TIMEOUT = 15.0
+
+# Timeout khusus per host (detik).
+HOST_TIMEOUTS: Dict[str, float] = {
+    "equran.id": 15.0,
+    "api.hadith.gading.dev": 20.0,
+    "doa-doa-api-ahmadramadhan.fly.dev": 15.0,
+}
+
+HTTP_LATENCY = Histogram("bot_http_request_duration_seconds", "Latensi permintaan ke API eksternal.", ["host"])
+HTTP_REQUESTS = Counter("bot_http_requests_total", "Jumlah permintaan ke API eksternal per status.", ["host", "status"])
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def get_client() -> httpx.AsyncClient:
+    """Mengembalikan klien bersama, dibuat saat pertama kali dibutuhkan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=30.0),
+            headers={"User-Agent": "bot-telegram-islami/1.0"},
+            follow_redirects=True,
+            transport=_transport,
+        )
+    return _client
+
+def set_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """
+    Mengganti transport klien bersama, misalnya ke server tiruan saat benchmark.
+    Harus dipanggil sebelum permintaan pertama (klien dibuat ulang setelahnya).
+    """
+    global _client, _transport
+    _transport = transport
+    _client = None
+
+def _host_semaphore(host: str) -> asyncio.Semaphore:
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = _host_semaphores[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return semaphore
+
+async def get(url: str, timeout: Optional[float] = None, **kwargs: Any) -> httpx.Response:
+    """
+    Melakukan GET dengan batas paralel per host.
+
+    Raises:
+        httpx.HTTPStatusError: jika server membalas status 4xx/5xx.
+        httpx.HTTPError: untuk error koneksi, timeout, dll.
+    """
+    return await _request("GET", url, timeout, **kwargs)
+
+async def post(url: str, timeout: Optional[float] = None, **kwargs: Any) -> httpx.Response:
+    """Seperti `get`, tetapi dengan method POST (misal `json=...` untuk body JSON)."""
+    return await _request("POST", url, timeout, **kwargs)
+
+async def _request(method: str, url: str, timeout: Optional[float], **kwargs: Any) -> httpx.Response:
+    host = urlsplit(url).hostname or ""
+    if timeout is None:
+        timeout = HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT)
+    async with _host_semaphore(host):
+        start = time.perf_counter()
+        try:
+            response = await get_client().request(method, url, timeout=timeout, **kwargs)
+        except httpx.HTTPError:
+            HTTP_REQUESTS.inc(host=host, status="error")
+            raise
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - start, host=host)
+    HTTP_REQUESTS.inc(host=host, status=response.status_code)
+    response.raise_for_status()
+    return response
+
+async def get_json(url: str, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """Seperti `get`, tetapi langsung mengembalikan isi JSON (ValueError jika tidak valid)."""
+    response = await get(url, timeout=timeout, **kwargs)
+    return response.json()
+
+async def close() -> None:
+    """Menutup klien bersama. Dipanggil saat bot berhenti."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_semaphores.clear()
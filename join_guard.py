@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+Penanganan anggota baru: sapaan gabungan dan mode anti-raid.
+
+- Sapaan gabungan: anggota yang bergabung ke sebuah chat dikumpulkan selama
+  jeda singkat (debounce), lalu disapa dalam satu pesan yang menyebut
+  beberapa anggota sekaligus. Pesan sapaan sebelumnya dihapus agar chat
+  tidak dipenuhi sapaan, dan template dibaca dari database sekali per pesan.
+- Anti-raid: lonjakan jumlah anggota baru dalam jendela waktu tertentu
+  menyalakan mode raid untuk chat tersebut. Selama mode raid, sapaan dijeda
+  dan (jika diaktifkan di /settings dan bot punya hak 'Restrict Members')
+  anggota baru dibatasi sementara agar tidak bisa mengirim pesan.
+
+Konfigurasi:
+    JOIN_BATCH_WINDOW   jeda debounce sapaan dalam detik (default 5)
+    ANTIRAID_JOINS      jumlah anggota baru yang dianggap raid (default 20)
+    ANTIRAID_WINDOW     jendela hitungan anggota baru dalam detik (default 60)
+    ANTIRAID_MINUTES    lama mode raid dan pembatasan anggota (default 10)
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from telegram import Bot, ChatPermissions, Message, User
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import ContextTypes
+
+import db_handler
+from admin_cache import admin_roster
+from metrics import Counter
+from rate_limit import TokenBucket, retry_after_seconds
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+JOIN_BATCH_WINDOW = float(os.environ.get('JOIN_BATCH_WINDOW', '5'))
+JOIN_BATCH_MAX_WAIT = 30.0         # Batas tunda sapaan meski anggota terus berdatangan
+MAX_WELCOME_MENTIONS = 10          # Sisanya diringkas menjadi "dan N anggota lainnya"
+ANTIRAID_JOINS = int(os.environ.get('ANTIRAID_JOINS', '20'))
+ANTIRAID_WINDOW = float(os.environ.get('ANTIRAID_WINDOW', '60'))
+ANTIRAID_DURATION = float(os.environ.get('ANTIRAID_MINUTES', '10')) * 60
+ANTIRAID_SETTING = 'antiraid_enabled'
+RESTRICT_RATE = 5.0                # Panggilan restrictChatMember per detik
+
+JOINS_HANDLED = Counter("bot_member_joins_total", "Anggota baru per cara penanganan.", ["outcome"])
+RAIDS_DETECTED = Counter("bot_raids_detected_total", "Jumlah lonjakan anggota baru yang menyalakan mode raid.")
+
+# Anggota baru selama raid hanya boleh membaca
+MUTED_PERMISSIONS = ChatPermissions(
+    can_send_messages=False, can_send_audios=False, can_send_documents=False, can_send_photos=False,
+    can_send_videos=False, can_send_video_notes=False, can_send_voice_notes=False, can_send_polls=False,
+    can_send_other_messages=False, can_add_web_page_previews=False,
+)
+
+def format_mentions(members: List[User], limit: int = MAX_WELCOME_MENTIONS) -> str:
+    """Sebutan HTML untuk beberapa anggota: "A, B dan C" atau "A, B dan 5 anggota lainnya"."""
+    mentions = [member.mention_html() for member in members[:limit]]
+    rest = len(members) - len(mentions)
+    if rest > 0:
+        return f"{', '.join(mentions)} dan {rest} anggota lainnya"
+    if len(mentions) == 1:
+        return mentions[0]
+    return f"{', '.join(mentions[:-1])} dan {mentions[-1]}"
+
+class JoinAggregator:
+    """Mengumpulkan anggota baru per chat, menyapa mereka sekaligus, dan mendeteksi raid."""
+
+    def __init__(self, window: float = JOIN_BATCH_WINDOW, max_wait: float = JOIN_BATCH_MAX_WAIT,
+                 raid_joins: int = ANTIRAID_JOINS, raid_window: float = ANTIRAID_WINDOW,
+                 raid_duration: float = ANTIRAID_DURATION):
+        self.window = window
+        self.max_wait = max_wait
+        self.raid_joins = raid_joins
+        self.raid_window = raid_window
+        self.raid_duration = raid_duration
+        self._pending: Dict[int, List[User]] = {}
+        self._titles: Dict[int, str] = {}
+        self._first_join: Dict[int, float] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._last_welcome: Dict[int, int] = {}
+        # Waktu bergabung terakhir per chat; cukup `raid_joins` entri untuk mendeteksi lonjakan
+        self._recent: Dict[int, Deque[float]] = {}
+        self._raid_until: Dict[int, float] = {}
+        self._restrict_bucket = TokenBucket(RESTRICT_RATE)
+
+    def pending_count(self) -> int:
+        return sum(len(members) for members in self._pending.values())
+
+    def add(self, message: Message, context: ContextTypes.DEFAULT_TYPE) -> None:
+        chat_id = message.chat_id
+        members = [member for member in message.new_chat_members if not member.is_bot]
+        if not members:
+            return
+        now = time.monotonic()
+        raid, started = self._track_joins(chat_id, len(members), now)
+        if raid:
+            if started:
+                # Anggota yang belum sempat disapa termasuk bagian dari lonjakan ini
+                members = self._pop_pending(chat_id) + members
+            context.application.create_task(self._handle_raid(context.bot, chat_id, members, started),
+                                            name=f"antiraid:{chat_id}")
+            return
+
+        self._pending.setdefault(chat_id, []).extend(members)
+        self._titles[chat_id] = message.chat.title
+        # Debounce: setiap anggota baru menunda sapaan, tetapi tidak melewati max_wait
+        first = self._first_join.setdefault(chat_id, now)
+        delay = max(0.0, min(self.window, first + self.max_wait - now))
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timers[chat_id] = loop.call_later(delay, self._start_flush, chat_id, context)
+
+    def _track_joins(self, chat_id: int, count: int, now: float) -> Tuple[bool, bool]:
+        """Mencatat anggota baru; mengembalikan (mode raid aktif, raid baru saja dimulai)."""
+        until = self._raid_until.get(chat_id)
+        if until is not None:
+            if now < until:
+                return True, False
+            del self._raid_until[chat_id]
+            logger.info(f"Mode anti-raid di chat {chat_id} berakhir.")
+        recent = self._recent.setdefault(chat_id, deque(maxlen=self.raid_joins))
+        recent.extend([now] * count)
+        # Deque penuh dan entri tertua masih dalam jendela: ada raid_joins anggota dalam raid_window detik
+        if len(recent) == self.raid_joins and recent[0] > now - self.raid_window:
+            self._raid_until[chat_id] = now + self.raid_duration
+            del self._recent[chat_id]
+            return True, True
+        return False, False
+
+    def _pop_pending(self, chat_id: int) -> List[User]:
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._first_join.pop(chat_id, None)
+        self._titles.pop(chat_id, None)
+        return self._pending.pop(chat_id, [])
+
+    def _start_flush(self, chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+        title = self._titles.get(chat_id, "")
+        members = self._pop_pending(chat_id)
+        if members:
+            context.application.create_task(self._send_welcome(context.bot, chat_id, title, members),
+                                            name=f"welcome:{chat_id}")
+
+    async def _send_welcome(self, bot: Bot, chat_id: int, title: str, members: List[User]) -> None:
+        if not db_handler.get_group_setting(chat_id, 'welcome_enabled', True):
+            return
+        # Anggota yang keluar-masuk dalam satu jeda cukup disebut sekali
+        unique = list({member.id: member for member in members}.values())
+        template = db_handler.get_group_setting(chat_id, 'welcome_message', db_handler.get_default_welcome_message())
+        text = template.format(user_mention=format_mentions(unique), chat_title=title)
+        try:
+            sent = await bot.send_message(chat_id, text)
+        except TelegramError as e:
+            logger.error(f"Gagal mengirim sapaan ke chat {chat_id}: {e}")
+            return
+        JOINS_HANDLED.inc(len(unique), outcome="welcomed")
+        previous = self._last_welcome.get(chat_id)
+        self._last_welcome[chat_id] = sent.message_id
+        if previous is not None:
+            try:
+                await bot.delete_message(chat_id, previous)
+            except TelegramError as e:
+                # Pesan mungkin sudah dihapus admin atau terlalu lama untuk dihapus bot
+                logger.debug(f"Sapaan lama {previous} di chat {chat_id} tidak dapat dihapus: {e}")
+
+    async def _handle_raid(self, bot: Bot, chat_id: int, members: List[User], started: bool) -> None:
+        minutes = round(self.raid_duration / 60)
+        restrict = db_handler.get_group_setting(chat_id, ANTIRAID_SETTING, False) \
+            and await admin_roster.bot_can_restrict(bot, chat_id)
+        if started:
+            RAIDS_DETECTED.inc()
+            logger.warning(f"Lonjakan anggota baru di chat {chat_id}: mode anti-raid aktif selama {minutes} menit "
+                           f"(pembatasan {'aktif' if restrict else 'nonaktif'}).")
+            if restrict:
+                notice = (f"🚨 <b>Mode anti-raid aktif.</b> Terlalu banyak anggota baru dalam waktu singkat; "
+                          f"anggota baru tidak dapat mengirim pesan selama {minutes} menit.")
+            else:
+                notice = (f"🚨 <b>Lonjakan anggota baru terdeteksi.</b> Sapaan dijeda selama {minutes} menit. "
+                          "Admin dapat mengaktifkan Anti-Raid di /settings agar anggota baru dibatasi otomatis.")
+            try:
+                await bot.send_message(chat_id, notice)
+            except TelegramError as e:
+                logger.error(f"Gagal mengirim pemberitahuan anti-raid ke chat {chat_id}: {e}")
+        if not restrict:
+            JOINS_HANDLED.inc(len(members), outcome="raid")
+            return
+        until = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.raid_duration)
+        for member in members:
+            if await self._restrict(bot, chat_id, member.id, until):
+                JOINS_HANDLED.inc(outcome="restricted")
+
+    async def _restrict(self, bot: Bot, chat_id: int, user_id: int, until: datetime.datetime) -> bool:
+        # Pembatasan massal diberi laju agar tidak terkena flood limit Telegram
+        for _ in range(2):
+            await self._restrict_bucket.acquire()
+            try:
+                await bot.restrict_chat_member(chat_id, user_id, MUTED_PERMISSIONS, until_date=until)
+                return True
+            except RetryAfter as e:
+                self._restrict_bucket.pause(retry_after_seconds(e))
+            except TelegramError as e:
+                logger.warning(f"Gagal membatasi pengguna {user_id} di chat {chat_id}: {e}")
+                return False
+        return False
+
+join_aggregator = JoinAggregator()
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pemantau event loop dan profiler sampling.
+
+- `LoopWatchdog`: detak (heartbeat) di event loop mengukur lag secara terus
+  menerus. Thread pengawas terpisah memeriksa detak tersebut; jika event loop
+  tidak berdetak lebih lama dari ambang, stack thread event loop diambil dan
+  macetnya dikaitkan ke handler yang sedang berjalan (lihat
+  metrics.running_handler). Laporan terakhir disimpan untuk /profil.
+- `SamplingProfiler`: selama aktif, stack thread event loop diambil secara
+  berkala dan disimpan dalam format "folded" (stackcollapse) yang dapat
+  langsung dipakai flamegraph.pl, speedscope, atau inferno.
+
+Admin bot (DEVELOPER_CHAT_ID) mengendalikannya lewat /profil.
+"""
+
+import asyncio
+import collections
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import ContextTypes
+
+from metrics import Counter, Histogram, running_handler
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = float(os.environ.get('LOOP_HEARTBEAT_INTERVAL', '0.1'))
+STALL_THRESHOLD = float(os.environ.get('LOOP_STALL_THRESHOLD', '0.25'))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '600'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', "profiles")
+DEVELOPER_CHAT_ID = os.environ.get('DEVELOPER_CHAT_ID')
+MAX_STALL_REPORTS = 20
+STACK_LIMIT = 25
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOOP_LAG = Histogram("bot_event_loop_lag_seconds", "Keterlambatan detak event loop dari jadwalnya.",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_STALLS = Counter("bot_event_loop_stalls_total", "Jumlah event loop macet melebihi ambang, per penyebab.",
+                      ["handler"])
+
+class StallReport(NamedTuple):
+    started_at: float   # Waktu (epoch) detak terakhir sebelum macet
+    duration: float
+    culprit: str
+    stack: str
+
+def _culprit(frame) -> str:
+    """Handler yang sedang berjalan, atau fungsi terdalam milik proyek ini jika bukan handler."""
+    handler = running_handler(frame)
+    if handler is not None:
+        return handler
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(PROJECT_DIR):
+            return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        frame = frame.f_back
+    return "lainnya"
+
+class LoopWatchdog:
+    """Pengukur lag dan pendeteksi event loop yang terblokir."""
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL, threshold: float = STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.reports: Deque[StallReport] = collections.deque(maxlen=MAX_STALL_REPORTS)
+        self.max_lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = 0.0
+        self._expected = 0.0
+        # Macet yang sedang berlangsung: (culprit, stack), diisi oleh thread pengawas
+        self._stall: Optional[Tuple[str, str]] = None
+
+    @property
+    def loop_thread_id(self) -> Optional[int]:
+        return self._loop_thread_id
+
+    def start(self) -> None:
+        """Dipanggil dari dalam event loop yang akan dipantau."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = self._expected = time.monotonic()
+        self._stopped.clear()
+        self._handle = self._loop.call_soon(self._beat)
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Pemantau event loop aktif (ambang macet {self.threshold * 1000:.0f} ms).")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _beat(self) -> None:
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected)
+        LOOP_LAG.observe(lag)
+        self.max_lag = max(self.max_lag, lag)
+        with self._lock:
+            stall, self._stall = self._stall, None
+            last_beat, self._last_beat = self._last_beat, now
+        if stall is not None:
+            culprit, stack = stall
+            duration = now - last_beat
+            self.reports.append(StallReport(time.time() - duration, duration, culprit, stack))
+            LOOP_STALLS.inc(handler=culprit)
+            logger.warning(f"Event loop terblokir {duration * 1000:.0f} ms oleh {culprit}:\n{stack}")
+        self._expected = now + self.interval
+        self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self) -> None:
+        period = min(self.interval, self.threshold / 2)
+        while not self._stopped.wait(period):
+            with self._lock:
+                blocked = time.monotonic() - self._last_beat
+                if blocked < self.threshold or self._stall is not None:
+                    continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            culprit = _culprit(frame)
+            stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+            with self._lock:
+                # Loop mungkin sudah berdetak lagi selama stack diambil
+                if time.monotonic() - self._last_beat >= self.threshold:
+                    self._stall = (culprit, stack)
+
+    def lag_summary(self) -> Dict[str, float]:
+        count, total = LOOP_LAG.totals().get((), (0, 0.0))
+        return {"beats": count, "mean_ms": total / count * 1000 if count else 0.0, "max_ms": self.max_lag * 1000,
+                "stalls": len(self.reports)}
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Profiler sampling untuk thread event loop dengan keluaran format folded."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.idle_samples = 0
+        self.started_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values()) + self.idle_samples
+
+    def start(self, thread_id: int, max_seconds: Optional[float] = None) -> None:
+        if self.running:
+            return
+        self.stacks = collections.Counter()
+        self.idle_samples = 0
+        self.started_at = time.time()
+        self._stopped.clear()
+        limit = max_seconds or self.max_seconds
+        self._thread = threading.Thread(target=self._sample, args=(thread_id, limit),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _sample(self, thread_id: int, limit: float) -> None:
+        deadline = time.monotonic() + limit
+        while not self._stopped.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                return
+            code = frame.f_code
+            # Event loop yang sedang menunggu I/O cukup dihitung, tidak perlu stack-nya
+            if code.co_name in ("select", "poll", "control") and code.co_filename.endswith("selectors.py"):
+                self.idle_samples += 1
+                continue
+            names = []
+            handler = running_handler(frame)
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if handler is not None:
+                names.append(f"handler {handler}")
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def dump(self, directory: str = PROFILE_DIR) -> str:
+        """Menulis hasil sampling ke file .folded dan mengembalikan path-nya."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, time.strftime("profile-%Y%m%d-%H%M%S.folded", time.localtime(self.started_at)))
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def top_functions(self, limit: int = 8) -> List[Tuple[str, int]]:
+        """Fungsi dengan sampel "self" terbanyak (frame terdalam pada stack)."""
+        totals: Dict[str, int] = collections.Counter()
+        for stack, count in self.stacks.items():
+            totals[stack.rsplit(";", 1)[-1]] += count
+        return totals.most_common(limit)
+
+loop_watchdog = LoopWatchdog()
+profiler = SamplingProfiler()
+
+# --- Perintah Admin ---
+
+def is_operator(update: Update) -> bool:
+    """True jika pengirim (atau chat-nya) adalah admin bot (DEVELOPER_CHAT_ID)."""
+    if not DEVELOPER_CHAT_ID:
+        return False
+    ids = {str(update.effective_user.id) if update.effective_user else None,
+           str(update.effective_chat.id) if update.effective_chat else None}
+    return DEVELOPER_CHAT_ID in ids
+
+def _status_text() -> str:
+    lag = loop_watchdog.lag_summary()
+    lines = [
+        "🩺 <b>Pemantau Event Loop</b>\n",
+        f"Lag rata-rata: {lag['mean_ms']:.2f} ms | Maks: {lag['max_ms']:.0f} ms",
+        f"Macet (> {loop_watchdog.threshold * 1000:.0f} ms): {lag['stalls']} tercatat",
+    ]
+    for report in list(loop_watchdog.reports)[-5:]:
+        when = time.strftime("%H:%M:%S", time.localtime(report.started_at))
+        lines.append(f"• {when} — <b>{report.duration * 1000:.0f} ms</b> oleh <code>{html.escape(report.culprit)}</code>")
+    if profiler.running:
+        lines.append(f"\n⏺️ Profiler aktif: {profiler.samples} sampel sejak "
+                     f"{time.strftime('%H:%M:%S', time.localtime(profiler.started_at))}.")
+    return "\n".join(lines)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """(Admin Bot) /profil [mulai [detik] | berhenti | status]."""
+    if not update.message:
+        return
+    if not is_operator(update):
+        await update.message.reply_text("Perintah ini hanya untuk admin bot.")
+        return
+    action = context.args[0].lower() if context.args else "status"
+
+    if action == "mulai":
+        if loop_watchdog.loop_thread_id is None:
+            await update.message.reply_text("Pemantau event loop belum aktif.")
+            return
+        if profiler.running:
+            await update.message.reply_text("Profiler sudah berjalan. Gunakan /profil berhenti.")
+            return
+        try:
+            seconds = float(context.args[1]) if len(context.args) > 1 else None
+        except ValueError:
+            seconds = None
+        profiler.start(loop_watchdog.loop_thread_id, seconds)
+        limit = seconds or profiler.max_seconds
+        await update.message.reply_text(
+            f"⏺️ Profiler sampling dimulai (interval {profiler.interval * 1000:.0f} ms, "
+            f"berhenti otomatis setelah {limit:.0f} detik)."
+        )
+    elif action == "berhenti":
+        if not profiler.stacks and not profiler.running:
+            await update.message.reply_text("Profiler tidak sedang berjalan.")
+            return
+        profiler.stop()
+        path = await asyncio.to_thread(profiler.dump)
+        busy = sum(profiler.stacks.values())
+        top = "\n".join(f"{count:>6}  <code>{html.escape(name)}</code>" for name, count in profiler.top_functions())
+        summary = (
+            f"⏹️ Profiler berhenti: {profiler.samples} sampel, {busy} saat event loop sibuk.\n\n"
+            f"<b>Fungsi tersibuk (self):</b>\n{top or '-'}"
+        )
+        # Hasil sudah ditulis ke disk; sampel berikutnya dimulai dari kosong
+        profiler.stacks.clear()
+        profiler.idle_samples = 0
+        await update.message.reply_text(summary, parse_mode=ParseMode.HTML)
+        with open(path, 'rb') as f:
+            await update.message.reply_document(f, filename=os.path.basename(path),
+                                                caption="Format folded (flamegraph.pl / speedscope).")
+    else:
+        await update.message.reply_text(_status_text(), parse_mode=ParseMode.HTML)
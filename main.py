@@ -3,9 +3,20 @@
 """
 File utama untuk menjalankan bot Telegram Islami & Manajemen Grup.
 Versi ini berjalan 24/7 dan mendukung fitur moderasi dan /id.
+
+Bot dapat berjalan dalam mode polling atau webhook (BOT_MODE). Di kedua mode,
+server HTTP asinkron pada event loop yang sama menyediakan /metrics, /healthz dan /readyz;
+pada mode webhook server ini juga menerima update dari Telegram.
+
+Untuk menjalankan beberapa instance (lihat cluster.py dan shared_state.py),
+gunakan mode webhook dengan SHARED_STATE_URL, DB_BACKEND=shared, dan
+CLUSTER_WORKERS; update dipartisi antar-instance berdasarkan chat_id.
 """
 
+import asyncio
+import hmac
 import logging
+import signal
 import os
 import traceback
 import html
@@ -16,18 +27,18 @@ from typing import Optional
 from telegram import BotCommand, Update, LinkPreviewOptions
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, filters, ContextTypes,
-    Defaults, ConversationHandler, CallbackQueryHandler
+    Defaults, ConversationHandler, CallbackQueryHandler, ChatMemberHandler, TypeHandler
 )
 from telegram.constants import ParseMode
 
-# Import untuk server web agar bot tetap aktif.
-from threading import Thread
-from http.server import HTTPServer, BaseHTTPRequestHandler
+# Server web asinkron untuk webhook dan health check.
+from webserver import WebServer, Request, Response
+import metrics
 
 # Mengimpor semua fungsi dari modul fitur.
 from commands import (
     start, help_command, rules, statistic, doa_harian_command, mutiarakata_command, id_command,
-    tanya_ai_command, kisah_command, hadith_command, set_reminder, 
+    tanya_ai_command, kisah_command, hadith_command, set_reminder, list_reminders, cancel_reminder,
     greet_new_member,
     # Impor baru untuk moderasi
     warn_command, kick_command,
@@ -35,10 +46,28 @@ from commands import (
     settings_command, settings_button_callback, save_welcome_message, save_rules, cancel_settings,
     SELECTING_ACTION, AWAITING_WELCOME_MESSAGE, AWAITING_RULES,
     # Impor baru untuk tes
-    test_ayat_command
+    test_ayat_command, sync_quran_command, cache_stats_command, moderation_stats_command,
+    refresh_doa_catalog
+)
+from search_features import (
+    search_command, search_quran_command, search_hadith_command, search_page_callback, update_search_index
 )
-from quran_features import send_verse_command, send_tafsir_command, send_daily_verse
-from ai_features import moderate_chat, gemini_model
+from quran_features import send_verse_command, send_tafsir_command, send_daily_verse, sync_quran_corpus, resume_daily_verse_broadcast
+from ai_features import moderate_chat, ai_client, moderation_batcher, warm_answer_cache, save_answer_cache
+from answer_cache import answer_cache
+from admin_cache import track_admin_changes
+from reminders import reminder_scheduler
+from join_guard import join_aggregator
+from rate_limit import command_limiter
+from update_processor import ChatLaneUpdateProcessor
+from loop_monitor import loop_watchdog, profiler, profile_command
+from cluster import (
+    update_router, leader_lease, leader_only, renew_leader_lease, SharedStatePersistence,
+    INTERNAL_UPDATE_PATH, SECRET_HEADER, LEADER_RENEW_INTERVAL
+)
+from shared_state import shared_state
+import db_handler
+import http_client
 
 # --- Konfigurasi Logging ---
 logging.basicConfig(
@@ -55,23 +84,109 @@ except KeyError:
     exit()
 
 DEVELOPER_CHAT_ID = os.environ.get('DEVELOPER_CHAT_ID')
-TARGET_GROUP_ID = os.environ.get('TARGET_GROUP_ID')
-
-# --- Bagian Server Keep-Alive ---
-class KeepAliveHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b"Bot is running.")
-    def log_message(self, format, *args):
-        return
-
-def run_keep_alive_server():
-    server_address = ('0.0.0.0', 8080)
-    httpd = HTTPServer(server_address, KeepAliveHandler)
-    logger.info("Server Keep-Alive dimulai pada port 8080.")
-    httpd.serve_forever()
+
+# --- Konfigurasi Mode Deploy ---
+BOT_MODE = os.environ.get('BOT_MODE', 'polling').lower()   # "polling" atau "webhook"
+PORT = int(os.environ.get('PORT', '8080'))
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')                 # URL publik, misal https://bot.example.com
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+# Server Bot API alternatif (misal telegram-bot-api lokal atau server tiruan benchmark.py)
+BOT_API_BASE_URL = os.environ.get('BOT_API_BASE_URL')
+
+if BOT_MODE == 'webhook' and (not WEBHOOK_URL or not WEBHOOK_SECRET):
+    logger.critical("FATAL ERROR: Mode webhook membutuhkan WEBHOOK_URL dan WEBHOOK_SECRET.")
+    exit()
+
+if BOT_MODE != 'webhook' and update_router.enabled:
+    logger.critical("FATAL ERROR: Mode cluster (CLUSTER_WORKERS) hanya didukung pada mode webhook.")
+    exit()
+
+# --- Metrik Antrean ---
+# Nilai dibaca saat /metrics diakses; callback dipasang di build_application.
+QUEUE_DEPTH = metrics.Gauge("bot_queue_depth", "Jumlah item yang menunggu di setiap antrean.", ["queue"])
+UPDATES_ACTIVE = metrics.Gauge("bot_updates_active", "Jumlah update yang sedang diproses handler.")
+
+def _register_queue_metrics(application: Application) -> None:
+    processor = application.update_processor
+    QUEUE_DEPTH.callback = lambda: {
+        "update_queue": application.update_queue.qsize(),
+        "chat_lanes": processor.queued_updates() - processor.active,
+        "moderation": moderation_batcher.pending_count(),
+        "ai": ai_client.stats()['waiting'],
+        "reminders": reminder_scheduler.pending_count(),
+        "joins": join_aggregator.pending_count(),
+    }
+    UPDATES_ACTIVE.callback = lambda: processor.active
+
+# --- Bagian Server HTTP (Webhook, Metrik & Health Check) ---
+def build_web_server(application: Application) -> WebServer:
+    """Menyiapkan route HTTP untuk health check dan (pada mode webhook) penerima update."""
+    server = WebServer("0.0.0.0", PORT)
+
+    async def metrics_endpoint(request: Request) -> Response:
+        return Response(200, metrics.render().encode('utf-8'), metrics.CONTENT_TYPE)
+
+    async def healthz(request: Request) -> Response:
+        return Response.json({"status": "ok"})
+
+    async def readyz(request: Request) -> Response:
+        ready = application.running and (BOT_MODE == 'webhook' or application.updater.running)
+        return Response.json({"ready": ready, "mode": BOT_MODE}, 200 if ready else 503)
+
+    async def enqueue(payload: object) -> Response:
+        try:
+            update = Update.de_json(payload, application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Payload webhook tidak valid: {e}")
+            return Response.text("Bad Request", 400)
+        await application.update_queue.put(update)
+        return Response.text("OK")
+
+    async def telegram_webhook(request: Request) -> Response:
+        token = request.headers.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+            logger.warning("Permintaan webhook dengan secret token tidak valid ditolak.")
+            return Response.text("Forbidden", 403)
+        try:
+            payload = request.json()
+        except ValueError as e:
+            logger.warning(f"Payload webhook tidak valid: {e}")
+            return Response.text("Bad Request", 400)
+        # Mode cluster: update chat milik worker lain diteruskan ke worker tersebut
+        owner = update_router.route(payload) if isinstance(payload, dict) else None
+        if owner is not None and await update_router.forward(owner, payload):
+            return Response.text("OK")
+        return await enqueue(payload)
+
+    async def internal_update(request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), update_router.secret.encode()):
+            logger.warning("Update internal dengan secret tidak valid ditolak.")
+            return Response.text("Forbidden", 403)
+        try:
+            payload = request.json()
+        except ValueError as e:
+            logger.warning(f"Payload update internal tidak valid: {e}")
+            return Response.text("Bad Request", 400)
+        return await enqueue(payload)
+
+    # Pemantau keep-alive yang memanggil "/" juga menerima metrik
+    server.add_route("GET", "/", metrics_endpoint)
+    server.add_route("GET", "/metrics", metrics_endpoint)
+    server.add_route("GET", "/healthz", healthz)
+    server.add_route("GET", "/readyz", readyz)
+    if BOT_MODE == 'webhook':
+        server.add_route("POST", WEBHOOK_PATH, telegram_webhook)
+        if update_router.enabled:
+            server.add_route("POST", INTERNAL_UPDATE_PATH, internal_update)
+    return server
+
+# --- Pemuatan Pengaturan (mode state bersama) ---
+async def prefetch_chat_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Memuat pengaturan chat dari state bersama di thread terpisah sebelum handler lain berjalan."""
+    if update.effective_chat:
+        await db_handler.prefetch_group_settings(update.effective_chat.id)
 
 # --- Fungsi Penangan Error ---
 async def error_handler(update: Optional[object], context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -91,11 +206,16 @@ async def error_handler(update: Optional[object], context: ContextTypes.DEFAULT_
 
 # --- Fungsi Inisialisasi Bot ---
 async def post_init(application: Application) -> None:
-    try:
-        await application.bot.delete_webhook(drop_pending_updates=True)
-        logger.info("Webhook berhasil direset (mode polling aktif).")
-    except Exception as e:
-        logger.error(f"Gagal mereset webhook: {e}")
+    if BOT_MODE == 'webhook':
+        webhook_url = WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH
+        await application.bot.set_webhook(url=webhook_url, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES)
+        logger.info(f"Webhook diatur ke {webhook_url} (mode webhook aktif).")
+    else:
+        try:
+            await application.bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Webhook berhasil direset (mode polling aktif).")
+        except Exception as e:
+            logger.error(f"Gagal mereset webhook: {e}")
 
     commands = [
         BotCommand("start", "Memulai bot"),
@@ -106,38 +226,83 @@ async def post_init(application: Application) -> None:
         BotCommand("warn", "(Admin) Beri peringatan ke anggota"),
         BotCommand("kick", "(Admin) Keluarkan anggota"),
         BotCommand("testayat", "(Admin) Tes kirim ayat harian"),
+        BotCommand("syncquran", "(Admin) Sinkronkan data Al-Qur'an"),
+        BotCommand("cache", "(Admin) Statistik cache"),
+        BotCommand("modstats", "(Admin) Statistik moderasi"),
         BotCommand("statistic", "Statistik grup"),
-        BotCommand("doa", "Doa harian acak"),
+        BotCommand("doa", "Doa harian (acak atau cari judul)"),
         BotCommand("mutiarakata", "Mutiara kata dari para ulama"),
         BotCommand("ayat", "Cari ayat Al-Qur'an"),
         BotCommand("tafsir", "Cari tafsir ayat"),
         BotCommand("hadits", "Cari hadits"),
+        BotCommand("cari", "Cari kata di Al-Qur'an & hadits"),
+        BotCommand("cariayat", "Cari kata di terjemahan & tafsir"),
+        BotCommand("carihadits", "Cari kata di hadits"),
         BotCommand("tanya", "Tanya jawab Islami dengan AI"),
         BotCommand("kisah", "Kisah Nabi atau Sahabat dari AI"),
         BotCommand("ingatkan", "Buat pengingat"),
+        BotCommand("daftaringat", "Daftar pengingat Anda"),
+        BotCommand("batalingat", "Batalkan pengingat"),
     ]
     await application.bot.set_my_commands(commands)
     logger.info("Menu perintah bot berhasil diatur.")
 
-def main() -> None:
-    """Fungsi utama untuk mengatur dan menjalankan bot."""
-    keep_alive_thread = Thread(target=run_keep_alive_server, daemon=True)
-    keep_alive_thread.start()
+    # Ukur lag event loop dan laporkan handler yang memblokirnya
+    loop_watchdog.start()
+
+    # Muat pengingat yang tersimpan dan mulai loop penjadwal
+    await reminder_scheduler.start(application.bot)
+
+async def post_shutdown(application: Application) -> None:
+    profiler.stop()
+    loop_watchdog.stop()
+    await reminder_scheduler.stop()
+    await asyncio.to_thread(leader_lease.release)
+    await http_client.close()
+    answer_cache.save()
+    # Pastikan perubahan pengaturan yang masih tertunda ditulis ke disk.
+    db_handler.close_store()
+    logger.info("Pengaturan grup berhasil disimpan sebelum bot berhenti.")
+    if shared_state is not None:
+        shared_state.close()
+
+def build_application() -> Application:
+    """Membuat Application dan mendaftarkan semua handler serta jadwal."""
+    # Muat pengaturan grup ke memori sekali saja saat startup.
+    db_handler.init_store()
     
     defaults = Defaults(parse_mode="HTML", link_preview_options=LinkPreviewOptions(is_disabled=True))
-    application = Application.builder().token(BOT_TOKEN).defaults(defaults).post_init(post_init).build()
+    # Update diproses paralel antar-chat, tetapi tetap berurutan di dalam satu chat
+    builder = (
+        Application.builder().token(BOT_TOKEN).defaults(defaults)
+        .concurrent_updates(ChatLaneUpdateProcessor())
+    )
+    if BOT_API_BASE_URL:
+        base_url = BOT_API_BASE_URL.rstrip('/')
+        builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+    # Mode state bersama: state percakapan /settings disimpan di luar proses
+    if shared_state is not None:
+        builder = builder.persistence(SharedStatePersistence(shared_state))
+    application = builder.build()
 
     application.add_error_handler(error_handler)
 
+    # Backend state bersama: handler membaca pengaturan dari cache lokal yang sudah dimuat di sini
+    if db_handler.DB_BACKEND == 'shared':
+        application.add_handler(TypeHandler(Update, prefetch_chat_settings), group=-1)
+
     # --- Handler untuk /settings ---
     settings_handler = ConversationHandler(
         entry_points=[CommandHandler("settings", settings_command)],
         states={
-            SELECTING_ACTION: [CallbackQueryHandler(settings_button_callback)],
+            # Tombol halaman hasil /cari ditangani handler-nya sendiri
+            SELECTING_ACTION: [CallbackQueryHandler(settings_button_callback, pattern=r"^(?!cari\|)")],
             AWAITING_WELCOME_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_welcome_message)],
             AWAITING_RULES: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_rules)],
         },
         fallbacks=[CommandHandler("batal", cancel_settings)],
+        name="settings",
+        persistent=shared_state is not None,
     )
     application.add_handler(settings_handler)
 
@@ -150,32 +315,103 @@ def main() -> None:
     application.add_handler(CommandHandler("doa", doa_harian_command))
     application.add_handler(CommandHandler("mutiarakata", mutiarakata_command))
     application.add_handler(CommandHandler("ingatkan", set_reminder))
+    application.add_handler(CommandHandler("daftaringat", list_reminders))
+    application.add_handler(CommandHandler("batalingat", cancel_reminder))
     application.add_handler(CommandHandler("ayat", send_verse_command))
-    application.add_handler(CommandHandler("tafsir", send_tafsir_command))
-    application.add_handler(CommandHandler("hadits", hadith_command))
+    # Perintah yang memanggil AI/API eksternal dibatasi kuota per pengguna dan per chat
+    application.add_handler(CommandHandler("tafsir", command_limiter.limit("tafsir", send_tafsir_command)))
+    application.add_handler(CommandHandler("hadits", command_limiter.limit("hadits", hadith_command)))
+    application.add_handler(CommandHandler("cari", search_command))
+    application.add_handler(CommandHandler("cariayat", search_quran_command))
+    application.add_handler(CommandHandler("carihadits", search_hadith_command))
+    application.add_handler(CallbackQueryHandler(search_page_callback, pattern=r"^cari\|"))
     application.add_handler(CommandHandler("warn", warn_command))
     application.add_handler(CommandHandler("kick", kick_command))
     application.add_handler(CommandHandler("testayat", test_ayat_command)) # <-- Handler baru
+    application.add_handler(CommandHandler("syncquran", sync_quran_command))
+    application.add_handler(CommandHandler("cache", cache_stats_command))
+    application.add_handler(CommandHandler("modstats", moderation_stats_command))
+    application.add_handler(CommandHandler("profil", profile_command))
     
-    if gemini_model:
-        application.add_handler(CommandHandler("tanya", tanya_ai_command))
-        application.add_handler(CommandHandler("kisah", kisah_command))
+    if ai_client.available:
+        application.add_handler(CommandHandler("tanya", command_limiter.limit("tanya", tanya_ai_command)))
+        application.add_handler(CommandHandler("kisah", command_limiter.limit("kisah", kisah_command)))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, moderate_chat))
         logger.info("Handler untuk fitur AI telah aktif.")
 
     application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, greet_new_member))
+    # Batalkan cache admin setiap kali status admin (atau bot) berubah
+    application.add_handler(ChatMemberHandler(track_admin_changes, ChatMemberHandler.ANY_CHAT_MEMBER))
+
+    # Catat latensi dan error setiap handler yang terdaftar di atas
+    metrics.instrument_handlers(application.handlers)
+    _register_queue_metrics(application)
+
+    # Lengkapi korpus Al-Qur'an lokal di latar belakang dan periksa pembaruan setiap hari
+    if application.job_queue:
+        application.job_queue.run_repeating(sync_quran_corpus, interval=datetime.timedelta(days=1), first=30, name="quran_corpus_sync")
+        # Indeks pencarian diperbarui bertahap dari ayat/hadits yang sudah tersimpan
+        application.job_queue.run_repeating(update_search_index, interval=1800, first=90, name="search_index_update")
+
+    # Katalog doa dimuat sekali lalu diperbarui berkala; /doa tidak perlu jaringan
+    if application.job_queue:
+        application.job_queue.run_repeating(refresh_doa_catalog, interval=3600, first=10, name="doa_catalog_refresh")
 
-    # Atur jadwal pengiriman otomatis jika TARGET_GROUP_ID tersedia
-    if TARGET_GROUP_ID and application.job_queue:
+    # Mode state bersama: tugas yang tidak boleh berjalan ganda hanya dijalankan pemimpin cluster
+    if application.job_queue and shared_state is not None:
+        application.job_queue.run_repeating(renew_leader_lease, interval=LEADER_RENEW_INTERVAL, first=0, name="leader_lease")
+
+    # Cache jawaban AI: simpan berkala dan siapkan kisah tokoh yang sering diminta
+    if application.job_queue:
+        application.job_queue.run_repeating(save_answer_cache, interval=300, first=300, name="answer_cache_save")
+        application.job_queue.run_repeating(leader_only(warm_answer_cache), interval=datetime.timedelta(days=1), first=60, name="answer_cache_warmup")
+
+    # Atur jadwal pengiriman ayat harian ke semua grup yang berlangganan
+    if application.job_queue:
+        application.job_queue.run_once(leader_only(resume_daily_verse_broadcast), 5, name="daily_verse_resume")
         wib = datetime.timezone(datetime.timedelta(hours=7))
         time_morning = datetime.time(hour=5, minute=0, tzinfo=wib)
-        application.job_queue.run_daily(send_daily_verse, time_morning, name="daily_morning_verse")
+        application.job_queue.run_daily(leader_only(send_daily_verse), time_morning, name="daily_morning_verse")
         time_afternoon = datetime.time(hour=16, minute=0, tzinfo=wib)
-        application.job_queue.run_daily(send_daily_verse, time_afternoon, name="daily_afternoon_verse")
+        application.job_queue.run_daily(leader_only(send_daily_verse), time_afternoon, name="daily_afternoon_verse")
         logger.info(f"Jadwal pengiriman ayat harian telah diatur.")
-    
-    logger.info("Bot mulai berjalan...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+    return application
+
+async def run_bot(application: Application) -> None:
+    """Menjalankan bot dan server HTTP di event loop yang sama hingga menerima sinyal berhenti."""
+    server = build_web_server(application)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows tidak mendukung add_signal_handler
+
+    await application.initialize()
+    try:
+        await server.start()
+        await application.start()
+        await post_init(application)
+        if BOT_MODE != 'webhook':
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        logger.info(f"Bot mulai berjalan dalam mode {BOT_MODE}...")
+        await stop_event.wait()
+    finally:
+        logger.info("Menghentikan bot...")
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await server.stop()
+        await application.shutdown()
+        await post_shutdown(application)
+
+def main() -> None:
+    """Fungsi utama untuk mengatur dan menjalankan bot."""
+    application = build_application()
+    asyncio.run(run_bot(application))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+"""
+Metrik bergaya Prometheus tanpa dependensi tambahan.
+
+Counter, Gauge, dan Histogram didaftarkan ke satu registry global dan dirender
+dalam format teks Prometheus (version 0.0.4) oleh `render()`, yang disajikan
+di endpoint HTTP /metrics. Handler baru cukup diberi dekorator `@instrument`
+agar latensi dan jumlah error-nya tercatat.
+"""
+
+import asyncio
+import contextlib
+import functools
+import math
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: Dict[str, "_Metric"] = {}
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        if name in _registry:
+            raise ValueError(f"Metrik {name} sudah terdaftar.")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Label {self.name} harus {self.labelnames}, bukan {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """Nilai yang hanya bertambah (jumlah permintaan, error, dst.)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Gauge(_Metric):
+    """
+    Nilai yang bisa naik-turun. Jika `callback` diberikan, nilai dibaca saat scrape;
+    callback boleh mengembalikan angka atau dict {tuple nilai label: angka}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Any]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Iterator[str]:
+        values = dict(self._values)
+        if self.callback is not None:
+            current = self.callback()
+            if isinstance(current, dict):
+                values.update({tuple(str(v) for v in (k if isinstance(k, tuple) else (k,))): n
+                               for k, n in current.items()})
+            elif current is not None:
+                values[()] = current
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram(_Metric):
+    """Distribusi nilai (latensi) dalam bucket kumulatif, beserta jumlah dan totalnya."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label: [hitungan per bucket..., hitungan +Inf], total nilai
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        counts[index] += 1
+        self._sums[key] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Mengukur durasi blok `with` (detik), termasuk bila blok melempar exception."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: Any) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """Jumlah observasi dan total nilai per kombinasi label."""
+        return {key: (sum(counts), self._sums[key]) for key, counts in self._counts.items()}
+
+    def samples(self) -> Iterator[str]:
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), self._counts[key]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(self._sums[key])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+def render() -> str:
+    """Semua metrik terdaftar dalam format teks Prometheus."""
+    return "\n".join(metric.render() for metric in _registry.values()) + "\n"
+
+# --- Instrumentasi Handler ---
+
+HANDLER_LATENCY = Histogram("bot_handler_duration_seconds", "Latensi handler update.", ["handler"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Jumlah handler yang berakhir dengan exception.", ["handler"])
+
+# Pengamat tambahan untuk setiap eksekusi handler, dipanggil dengan (label, durasi, gagal).
+# Dipakai misalnya oleh benchmark.py untuk menghitung persentil dari sampel mentah.
+_handler_observers: List[Callable[[str, float, bool], None]] = []
+
+def add_handler_observer(observer: Callable[[str, float, bool], None]) -> None:
+    _handler_observers.append(observer)
+
+def remove_handler_observer(observer: Callable[[str, float, bool], None]) -> None:
+    if observer in _handler_observers:
+        _handler_observers.remove(observer)
+
+def instrument(func: Optional[Callable] = None, *, name: Optional[str] = None) -> Callable:
+    """
+    Dekorator untuk handler asinkron: mencatat latensi dan jumlah error per handler.
+    Dapat dipakai sebagai `@instrument` atau `@instrument(name="tanya")`.
+    """
+    def decorate(handler: Callable) -> Callable:
+        if getattr(handler, '__instrumented__', False):
+            return handler
+        label = name or handler.__name__
+
+        @functools.wraps(handler)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await handler(*args, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                failed = True
+                HANDLER_ERRORS.inc(handler=label)
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                HANDLER_LATENCY.observe(duration, handler=label)
+                for observer in _handler_observers:
+                    observer(label, duration, failed)
+
+        wrapper.__instrumented__ = True
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+def running_handler(frame: Any) -> Optional[str]:
+    """
+    Label handler ter-instrumentasi yang sedang dieksekusi di stack `frame`
+    (frame dari thread lain, misal hasil sys._current_frames()), atau None.
+    """
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "wrapper" and code.co_filename == __file__:
+            return frame.f_locals.get("label")
+        frame = frame.f_back
+    return None
+
+def instrument_handlers(handlers: Any) -> None:
+    """
+    Memasang `instrument` pada callback semua handler yang terdaftar (termasuk
+    handler di dalam ConversationHandler). `handlers` adalah `application.handlers`.
+    """
+    for group in handlers.values():
+        for handler in group:
+            _instrument_handler(handler)
+
+def _instrument_handler(handler: Any) -> None:
+    # ConversationHandler tidak punya callback sendiri; telusuri handler di dalamnya
+    nested = []
+    for attribute in ('entry_points', 'fallbacks'):
+        nested.extend(getattr(handler, attribute, None) or [])
+    for state_handlers in (getattr(handler, 'states', None) or {}).values():
+        nested.extend(state_handlers)
+    for child in nested:
+        _instrument_handler(child)
+    callback = getattr(handler, 'callback', None)
+    if callback is not None and asyncio.iscoroutinefunction(callback):
+        commands = getattr(handler, 'commands', None)
+        label = f"/{min(commands)}" if commands else callback.__name__
+        handler.callback = instrument(callback, name=label)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tier klasifikasi lokal yang dijalankan sebelum moderasi AI.
+
+Pesan yang jelas aman (salam, "aamiin", dsb.) atau jelas melanggar (kata kasar,
+email, tautan pemendek, spam berulang) diputuskan secara lokal. Pesan yang
+meragukan, termasuk kata yang bisa kasar atau wajar ("babi" dalam pertanyaan
+fikih) dan nomor telepon, diteruskan ke model AI.
+"""
+
+import hashlib
+import math
+import re
+import time
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+
+SAFE = "safe"
+VIOLATION = "violation"
+ESCALATE = "escalate"
+
+class FilterResult(NamedTuple):
+    decision: str               # SAFE, VIOLATION, atau ESCALATE
+    tier: str                   # Tier yang mengambil keputusan
+    reason: Optional[str] = None
+
+# --- Normalisasi ---
+_LEET = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'})
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+_REPEATED_CHARS = re.compile(r"(.)\1{2,}")
+
+def normalize(text: str) -> str:
+    """Huruf kecil, tanpa tanda baca, spasi tunggal, huruf berulang dipendekkan ("amiiin" -> "amiin")."""
+    text = _NON_WORD.sub(" ", text.lower())
+    text = _REPEATED_CHARS.sub(r"\1\1", text)
+    return _SPACES.sub(" ", text).strip()
+
+# --- Tier 1: Daftar kata terlarang ---
+BLOCKED_WORDS = {
+    "anjir", "bangsat", "bajingan", "kontol", "memek", "ngentot", "goblok",
+    "goblog", "tolol", "kampret", "jancok", "jancuk", "pepek", "lonte", "pelacur",
+}
+# Bisa makian, bisa juga istilah biasa ("daging babi", "najis anjing"): diputuskan AI
+ESCALATE_WORDS = {"anjing", "babi", "asu"}
+BLOCKED_PHRASES = [
+    re.compile(r"\bslot\s*gacor\b"),
+    re.compile(r"\bjudi\s*(online|bola)\b"),
+    re.compile(r"\btogel\b"),
+    re.compile(r"\bdeposit\s+(pulsa|dana|ovo|gopay)\b"),
+    re.compile(r"\bpinjol\b|\bpinjaman\s+online\s+cepat\b"),
+    re.compile(r"\bopen\s*(bo|vcs)\b"),
+]
+
+# --- Tier 2: Detektor pola (aturan 3 dan 4) ---
+URL_PATTERN = re.compile(r"(?:https?://|www\.)[^\s]+|\b[a-z0-9-]+\.(?:com|net|org|id|co|xyz|top|link|site|info|me|ly|io)(?:/[^\s]*)?\b", re.IGNORECASE)
+SHORTENER_DOMAINS = ("bit.ly", "tinyurl.com", "s.id", "cutt.ly", "shorturl.at", "t.ly", "is.gd", "rebrand.ly", "goo.gl")
+SUSPICIOUS_TLDS = (".xyz", ".top", ".click", ".zip", ".mov", ".icu", ".monster")
+IP_URL_PATTERN = re.compile(r"https?://\d{1,3}(?:\.\d{1,3}){3}")
+PHONE_PATTERN = re.compile(r"(?:\+?62|\b0)[\s.-]?8\d{1,2}(?:[\s.-]?\d{3,4}){2,3}\b")
+EMAIL_PATTERN = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.]+\b")
+
+# --- Tier 4: Heuristik pesan aman ---
+SAFE_PHRASES = {
+    "aamiin", "amiin", "amin", "aamin", "alhamdulillah", "masya allah", "masyaallah", "subhanallah",
+    "allahu akbar", "astaghfirullah", "insya allah", "insyaallah", "bismillah", "jazakallah",
+    "jazakallah khair", "barakallah", "barakallahu fiik", "assalamualaikum", "assalamu alaikum",
+    "waalaikumsalam", "wa alaikumsalam", "terima kasih", "makasih", "syukron", "ok", "oke", "siap",
+    "baik", "iya", "ya", "betul", "setuju", "hehe", "wkwk", "pagi", "selamat pagi", "selamat siang",
+    "selamat sore", "selamat malam", "sama sama", "afwan",
+}
+SAFE_WORDS = {word for phrase in SAFE_PHRASES for word in phrase.split()} | {
+    "kak", "bang", "pak", "bu", "min", "admin", "semua", "teman", "teman2", "ustadz", "ustadzah",
+    "wr", "wb", "warahmatullahi", "wabarakatuh", "yg", "ini", "itu", "juga", "saya", "kami",
+}
+ENTROPY_MIN_LENGTH = 30
+ENTROPY_THRESHOLD = 4.6
+
+# --- Tier 3: Sidik jari spam ---
+SPAM_WINDOW = 300          # Detik
+SPAM_REPEAT_LIMIT = 3      # Pesan identik dari satu pengguna dalam jendela waktu
+SPAM_CHAT_USER_LIMIT = 4   # Pesan identik dari pengguna berbeda dalam satu chat
+
+def _url_host(url: str) -> str:
+    lowered = url.lower()
+    if "://" in lowered:
+        lowered = lowered.split("://", 1)[1]
+    host = lowered.split("/", 1)[0].split(":", 1)[0]
+    return host[4:] if host.startswith("www.") else host
+
+def shannon_entropy(text: str) -> float:
+    if not text:
+        return 0.0
+    counts = Counter(text)
+    length = len(text)
+    return -sum((n / length) * math.log2(n / length) for n in counts.values())
+
+class LocalModerationFilter:
+    """Menjalankan tier-tier lokal secara berurutan dan mencatat jumlah keputusan per tier."""
+
+    def __init__(self):
+        self.decision_counts: Counter = Counter()
+        # (chat_id, user_id) -> deque[(waktu, sidik jari)]
+        self._user_history: Dict[Tuple[int, int], Deque[Tuple[float, str]]] = defaultdict(deque)
+        # (chat_id, sidik jari) -> {user_id: waktu terakhir}
+        self._chat_fingerprints: Dict[Tuple[int, str], Dict[int, float]] = defaultdict(dict)
+        self._last_prune = time.monotonic()
+
+    def classify(self, chat_id: int, user_id: int, text: str) -> FilterResult:
+        result = self._classify(chat_id, user_id, text)
+        self.decision_counts[(result.tier, result.decision)] += 1
+        return result
+
+    def _classify(self, chat_id: int, user_id: int, text: str) -> FilterResult:
+        normalized = normalize(text)
+        words = normalized.split()
+
+        # Tier 1: daftar kata/frasa terlarang (setelah normalisasi leetspeak)
+        deleet = normalize(text.lower().translate(_LEET))
+        if BLOCKED_WORDS.intersection(deleet.split()) or BLOCKED_WORDS.intersection(words):
+            return FilterResult(VIOLATION, "blocklist", "Pesan mengandung kata-kata kasar yang melanggar aturan grup.")
+        if any(pattern.search(deleet) for pattern in BLOCKED_PHRASES):
+            return FilterResult(VIOLATION, "blocklist", "Pesan mengandung promosi terlarang (judi/pinjol/konten dewasa).")
+        # Pesan dengan kata ambigu tidak boleh dianggap aman secara lokal
+        needs_ai = bool(ESCALATE_WORDS.intersection(deleet.split()) or ESCALATE_WORDS.intersection(words))
+
+        # Tier 2: informasi pribadi (aturan 3) dan tautan berbahaya (aturan 4)
+        if EMAIL_PATTERN.search(text):
+            return FilterResult(VIOLATION, "pattern", "Dilarang membagikan informasi pribadi seperti alamat email.")
+        # Nomor telepon bisa informasi pribadi atau nomor publik (masjid, panitia): diputuskan AI
+        needs_ai = needs_ai or bool(PHONE_PATTERN.search(text))
+        urls = URL_PATTERN.findall(text)
+        for url in urls:
+            host = _url_host(url)
+            if IP_URL_PATTERN.match(url.lower()) or host in SHORTENER_DOMAINS or host.endswith(SUSPICIOUS_TLDS):
+                return FilterResult(VIOLATION, "pattern", "Dilarang mengirim tautan yang mencurigakan atau disamarkan.")
+
+        # Tier 3: pesan identik berulang (spam)
+        if normalized and self._is_repeated(chat_id, user_id, normalized):
+            return FilterResult(VIOLATION, "spam", "Dilarang mengirim pesan yang sama berulang kali (spam).")
+
+        # Tier 4: heuristik panjang/entropi untuk pesan yang jelas aman
+        if urls or needs_ai:
+            return FilterResult(ESCALATE, "escalated")
+        # Hanya salam/ucapan yang dikenal yang dianggap aman; pesan pendek lain ("dasar bodoh") tetap ke AI
+        if not words or normalized in SAFE_PHRASES or all(word in SAFE_WORDS for word in words):
+            return FilterResult(SAFE, "heuristic")
+        compact = text.replace(" ", "")
+        if len(compact) >= ENTROPY_MIN_LENGTH and shannon_entropy(compact) >= ENTROPY_THRESHOLD and len(words) <= 2:
+            # Deretan karakter acak panjang tanpa spasi: kemungkinan besar sampah/kode promosi
+            return FilterResult(VIOLATION, "heuristic", "Pesan berisi deretan karakter acak yang dianggap spam.")
+
+        return FilterResult(ESCALATE, "escalated")
+
+    def _is_repeated(self, chat_id: int, user_id: int, normalized: str) -> bool:
+        now = time.monotonic()
+        self._maybe_prune(now)
+        fingerprint = hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).hexdigest()
+
+        history = self._user_history[(chat_id, user_id)]
+        while history and now - history[0][0] > SPAM_WINDOW:
+            history.popleft()
+        history.append((now, fingerprint))
+        repeats = sum(1 for _, fp in history if fp == fingerprint)
+
+        senders = self._chat_fingerprints[(chat_id, fingerprint)]
+        senders[user_id] = now
+        recent_senders = sum(1 for seen in senders.values() if now - seen <= SPAM_WINDOW)
+
+        # Pesan sangat pendek (mis. "aamiin") wajar diulang banyak orang
+        if len(normalized) < 15:
+            return False
+        return repeats >= SPAM_REPEAT_LIMIT or recent_senders >= SPAM_CHAT_USER_LIMIT
+
+    def _maybe_prune(self, now: float) -> None:
+        """Membersihkan riwayat lama secara berkala agar memori tidak terus bertambah."""
+        if now - self._last_prune < SPAM_WINDOW:
+            return
+        self._last_prune = now
+        for key in [k for k, h in self._user_history.items() if not h or now - h[-1][0] > SPAM_WINDOW]:
+            del self._user_history[key]
+        for key in list(self._chat_fingerprints):
+            senders = {uid: t for uid, t in self._chat_fingerprints[key].items() if now - t <= SPAM_WINDOW}
+            if senders:
+                self._chat_fingerprints[key] = senders
+            else:
+                del self._chat_fingerprints[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Jumlah keputusan per tier, dalam format "tier/keputusan"."""
+        return {f"{tier}/{decision}": count for (tier, decision), count in sorted(self.decision_counts.items())}
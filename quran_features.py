@@ -2,31 +2,81 @@
 
 """
 Modul ini berisi semua fungsionalitas terkait fitur Al-Qur'an dan Tafsir.
-Menggunakan API dari equran.id.
+Menggunakan API dari equran.id, dengan korpus lokal (quran_store) sebagai
+sumber utama sehingga sebagian besar permintaan tidak memerlukan jaringan.
 """
 
+import asyncio
 import logging
 import os
-import random
-import re
-from typing import Dict, Any, Union
+import time
+from typing import Dict, Any, Optional, Union
 
-import requests
+import httpx
 from telegram import Update
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
+import db_handler
+import http_client
+from broadcast import broadcaster
+from cache_utils import TTLCache, SingleFlight
+from quran_store import QuranStore
+from shared_state import SharedStateError
+
 # Inisialisasi logger untuk modul ini
 logger = logging.getLogger(__name__)
 
 # Konfigurasi dasar
 EQURAN_API_BASE = "https://equran.id/api/v2"
 TARGET_GROUP_ID = os.environ.get('TARGET_GROUP_ID')
+# Pengaturan grup untuk berlangganan ayat harian (diatur lewat /settings)
+DAILY_VERSE_SETTING = 'daily_verse_enabled'
+
+# --- Cache Respons API ---
+# TTL per awalan endpoint (detik). Data surah/tafsir praktis tidak pernah berubah.
+API_CACHE_TTL = {
+    "/surat/": 24 * 3600,
+    "/tafsir/": 24 * 3600,
+    "/surat": 3600,
+}
+NOT_FOUND_TTL = 300  # Hasil "not_found" di-cache sebentar; "api_error" tidak di-cache
+api_cache = TTLCache(
+    max_entries=int(os.environ.get('QURAN_API_CACHE_ENTRIES', '256')),
+    max_bytes=int(os.environ.get('QURAN_API_CACHE_MB', '32')) * 1024 * 1024,
+)
+_api_flight = SingleFlight()
+
+def _ttl_for(endpoint: str) -> float:
+    for prefix, ttl in API_CACHE_TTL.items():
+        if endpoint.startswith(prefix):
+            return ttl
+    return api_cache.default_ttl
+
+async def _fetch_api(endpoint: str) -> Union[Dict[str, Any], str]:
+    """
+    Mengambil data dari API equran.id melalui cache LRU+TTL.
+    Permintaan bersamaan untuk endpoint yang sama digabung menjadi satu panggilan API.
+    """
+    cached = api_cache.get(endpoint)
+    if cached is not None:
+        return cached
+
+    async def _load() -> Union[Dict[str, Any], str]:
+        result = await _fetch_api_uncached(endpoint)
+        if isinstance(result, dict):
+            api_cache.set(endpoint, result, ttl=_ttl_for(endpoint))
+        elif result == "not_found":
+            api_cache.set(endpoint, result, ttl=NOT_FOUND_TTL)
+        return result
 
-# Regex untuk membersihkan tag HTML dari teks tafsir, dikompilasi sekali untuk efisiensi
-HTML_CLEANER = re.compile('<.*?>')
+    return await _api_flight.do(endpoint, _load)
 
-def _fetch_api(endpoint: str) -> Union[Dict[str, Any], str]:
+def get_api_cache_stats() -> Dict[str, Any]:
+    """Statistik cache API (hit, miss, dst.) untuk keperluan tuning."""
+    return {**api_cache.stats(), "coalesced": _api_flight.coalesced}
+
+async def _fetch_api_uncached(endpoint: str) -> Union[Dict[str, Any], str]:
     """
     Fungsi pembantu untuk mengambil data dari API equran.id.
 
@@ -38,10 +88,8 @@ def _fetch_api(endpoint: str) -> Union[Dict[str, Any], str]:
     """
     url = f"{EQURAN_API_BASE}{endpoint}"
     try:
-        # Tambahkan timeout untuk mencegah bot hang jika API lambat
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()  # Akan raise error untuk status 4xx atau 5xx
-        json_data = response.json()
+        # Klien bersama: koneksi di-pool, timeout dan batas paralel per host
+        json_data = await http_client.get_json(url)
         
         # Validasi respons dari API
         if json_data.get('code') != 200 or 'data' not in json_data:
@@ -49,62 +97,50 @@ def _fetch_api(endpoint: str) -> Union[Dict[str, Any], str]:
             return "api_error"
         return json_data['data']
         
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         logger.error(f"HTTP Error saat mengambil {url}: {e}")
         return "not_found" if e.response.status_code == 404 else "api_error"
-    except requests.exceptions.RequestException as e:
-        # Menangkap error koneksi, timeout, dll.
+    except (httpx.HTTPError, ValueError) as e:
+        # Menangkap error koneksi, timeout, JSON tidak valid, dll.
         logger.error(f"Error permintaan saat mengambil {url}: {e}")
         return "api_error"
 
-def get_verse_and_translation(surah: int, ayat: int) -> Union[Dict[str, Any], str]:
-    """Mengambil detail ayat spesifik (teks Arab, terjemahan, nama surah) dari API."""
-    data = _fetch_api(f"/surat/{surah}")
-    if isinstance(data, str):
-        return data  # Mengembalikan string error jika terjadi kesalahan
-
-    # Validasi apakah ayat yang diminta ada dalam data
-    if not data.get('ayat') or not (0 < ayat <= len(data['ayat'])):
-        return "not_found"
+# Korpus lokal; surah yang belum tersedia diambil dari API lewat _fetch_api
+quran_store = QuranStore(_fetch_api)
 
-    # Ambil data ayat yang sesuai (ingat, list di Python berbasis 0)
-    verse_data = data['ayat'][ayat - 1]
+async def get_verse_and_translation(surah: int, ayat: int) -> Union[Dict[str, Any], str]:
+    """Mengambil detail ayat spesifik (teks Arab, terjemahan, nama surah) dari korpus lokal."""
+    verse = await quran_store.get_ayat(surah, ayat)
+    if isinstance(verse, str):
+        return verse  # Mengembalikan string error jika terjadi kesalahan
 
     return {
-        "surah_name": data.get('namaLatin', 'N/A'),
+        "surah_name": verse['surah_name'],
         "verse_key": f"{surah}:{ayat}",
-        "arabic": verse_data.get('teksArab', ''),
-        "translation": verse_data.get('teksIndonesia', '')
+        "arabic": verse['arabic'],
+        "translation": verse['translation']
     }
 
-def get_tafsir(surah: int, ayat: int) -> Union[Dict[str, Any], str]:
+async def get_tafsir(surah: int, ayat: int) -> Union[Dict[str, Any], str]:
     """Mengambil tafsir untuk ayat spesifik, beserta teks ayatnya."""
-    # Langkah 1: Dapatkan teks ayat dan nama surah
-    verse_details = get_verse_and_translation(surah, ayat)
-    if isinstance(verse_details, str):
-        return verse_details  # Mengembalikan string error
-
-    # Langkah 2: Dapatkan data tafsir untuk seluruh surah
-    tafsir_data = _fetch_api(f"/tafsir/{surah}")
-    if isinstance(tafsir_data, str):
-        return tafsir_data
+    verse = await quran_store.get_ayat(surah, ayat, with_tafsir=True)
+    if isinstance(verse, str):
+        return verse  # Mengembalikan string error
 
-    # Langkah 3: Cari tafsir untuk ayat yang spesifik
-    tafsir_for_ayat = next((t for t in tafsir_data.get('tafsir', []) if t.get('ayat') == ayat), None)
-
-    if not tafsir_for_ayat:
+    if not verse['tafsir']:
         return "not_found"
 
-    raw_tafsir = tafsir_for_ayat.get('teks', 'Tafsir tidak ditemukan.')
-    
-    # Gabungkan hasil
     return {
-        "surah_name": verse_details['surah_name'],
-        "verse_key": verse_details['verse_key'],
-        "verse_text": verse_details['arabic'],
-        "tafsir": re.sub(HTML_CLEANER, '', raw_tafsir)
+        "surah_name": verse['surah_name'],
+        "verse_key": f"{surah}:{ayat}",
+        "verse_text": verse['arabic'],
+        "tafsir": verse['tafsir']
     }
 
+async def sync_quran_corpus(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tugas terjadwal: melengkapi dan memperbarui korpus Al-Qur'an lokal."""
+    await quran_store.sync_all()
+
 async def send_verse_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handler untuk perintah /ayat."""
     if not update.message or not context.args:
@@ -121,7 +157,7 @@ async def send_verse_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     processing_msg = await update.message.reply_text("📖 Sedang mencari ayat...")
-    result = get_verse_and_translation(surah, ayat)
+    result = await get_verse_and_translation(surah, ayat)
     await context.bot.delete_message(chat_id=update.message.chat_id, message_id=processing_msg.message_id)
 
     if isinstance(result, dict):
@@ -150,7 +186,7 @@ async def send_tafsir_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     processing_msg = await update.message.reply_text("📜 Sedang mencari tafsir...")
-    result = get_tafsir(surah, ayat)
+    result = await get_tafsir(surah, ayat)
     await context.bot.delete_message(chat_id=update.message.chat_id, message_id=processing_msg.message_id)
     
     if isinstance(result, dict):
@@ -172,38 +208,51 @@ async def send_tafsir_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     else:
         await update.message.reply_text("Maaf, terjadi kesalahan pada server Tafsir. Coba lagi nanti.")
 
+async def build_daily_verse_message() -> Optional[str]:
+    """Memilih ayat acak dan merender pesan ayat harian (sekali per pengiriman)."""
+    # Ayat acak diambil dari korpus lokal (surah diisi lazy jika belum ada)
+    random_verse = await quran_store.random_ayat()
+    if isinstance(random_verse, str):
+        logger.error(f"Gagal mendapatkan data ayat harian. Respon: {random_verse}")
+        return None
+
+    surah_name = random_verse['surah_name']
+    verse_key = f"{random_verse['surah']}:{random_verse['ayat']}"
+    arabic_text = random_verse['arabic']
+    translation_text = random_verse['translation']
+
+    return (f"✨ **Ayat Harian** ✨\n\n"
+            f"📖 **{surah_name} ({verse_key})**\n\n"
+            f"<b dir='rtl'>{arabic_text}</b>\n\n"
+            f"<i>Artinya: \"{translation_text}\"</i>\n\n#AyatHarian")
+
+def _unsubscribe(chat_id: int) -> None:
+    """Berhenti mengirim ayat harian ke grup yang sudah memblokir/mengeluarkan bot (dijalankan di thread)."""
+    try:
+        db_handler.set_group_setting(chat_id, DAILY_VERSE_SETTING, False)
+    except SharedStateError as e:
+        logger.error(f"Grup {chat_id} gagal dihapus dari daftar pelanggan ayat harian: {e}")
+        return
+    logger.info(f"Grup {chat_id} dihapus dari daftar pelanggan ayat harian.")
+
+broadcaster.on_unreachable = _unsubscribe
+
 async def send_daily_verse(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Fungsi yang dijalankan oleh scheduler untuk mengirim ayat acak."""
-    if not TARGET_GROUP_ID:
-        logger.warning("TARGET_GROUP_ID tidak diatur, membatalkan tugas terjadwal.")
+    """Fungsi yang dijalankan oleh scheduler untuk mengirim ayat acak ke semua grup pelanggan."""
+    chat_ids = await asyncio.to_thread(db_handler.get_chats_with_setting, DAILY_VERSE_SETTING, True)
+    if TARGET_GROUP_ID:
+        chat_ids.append(int(TARGET_GROUP_ID))
+    if not chat_ids:
+        logger.info("Tidak ada grup yang berlangganan ayat harian, membatalkan tugas terjadwal.")
         return
-        
-    logger.info("Menjalankan tugas terjadwal: mengirim ayat harian...")
-    random_surah_num = random.randint(1, 114)
-    
-    # Hanya satu panggilan API untuk mendapatkan semua data surah
-    surah_data = _fetch_api(f"/surat/{random_surah_num}")
-    if isinstance(surah_data, str) or not surah_data.get('ayat'):
-        logger.error(f"Gagal mendapatkan data ayat harian untuk Surah {random_surah_num}. Respon API: {surah_data}")
+
+    logger.info(f"Menjalankan tugas terjadwal: mengirim ayat harian ke {len(chat_ids)} grup...")
+    message = await build_daily_verse_message()
+    if message is None:
         return
 
-    # Pilih ayat acak dari daftar ayat yang diterima
-    ayat_list = surah_data['ayat']
-    random_verse = random.choice(ayat_list)
-    
-    surah_name = surah_data.get('namaLatin', 'N/A')
-    verse_num = random_verse.get('nomorAyat', 'N/A')
-    verse_key = f"{random_surah_num}:{verse_num}"
-    arabic_text = random_verse.get('teksArab', '')
-    translation_text = random_verse.get('teksIndonesia', '')
-
-    message = (f"✨ **Ayat Harian** ✨\n\n"
-               f"📖 **{surah_name} ({verse_key})**\n\n"
-               f"<b dir='rtl'>{arabic_text}</b>\n\n"
-               f"<i>Artinya: \"{translation_text}\"</i>\n\n#AyatHarian")
-               
-    try:
-        await context.bot.send_message(chat_id=TARGET_GROUP_ID, text=message, parse_mode=ParseMode.HTML)
-        logger.info(f"Berhasil mengirim ayat harian {verse_key} ke grup {TARGET_GROUP_ID}")
-    except Exception as e:
-        logger.error(f"Gagal mengirim ayat harian ke grup {TARGET_GROUP_ID}: {e}")
+    await broadcaster.broadcast(context.bot, f"ayat-harian-{int(time.time())}", message, chat_ids)
+
+async def resume_daily_verse_broadcast(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Melanjutkan broadcast ayat harian yang terputus saat bot berhenti."""
+    await broadcaster.resume_pending(context.bot)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+Penyimpanan lokal korpus Al-Qur'an (teks Arab, terjemahan, dan tafsir Kemenag).
+
+Data per surah diambil dari equran.id satu kali (lewat sinkronisasi penuh atau
+secara lazy saat surah pertama kali diminta), lalu disimpan di SQLite dengan
+indeks (surah, ayat). Permintaan /ayat, /tafsir, dan ayat harian selanjutnya
+dijawab langsung dari disk tanpa panggilan jaringan.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple, Union
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+QURAN_DB_FILE = os.environ.get('QURAN_DB_FILE', "quran_corpus.sqlite3")
+TOTAL_SURAH = 114
+# Naikkan nilai ini jika format penyimpanan berubah; surah lama akan disinkronkan ulang.
+CORPUS_VERSION = 1
+# Surah yang lebih tua dari batas ini akan diperbarui saat sinkronisasi berikutnya.
+REFRESH_AFTER = float(os.environ.get('QURAN_REFRESH_DAYS', '30')) * 86400
+
+# Regex untuk membersihkan tag HTML dari teks tafsir
+HTML_CLEANER = re.compile('<.*?>')
+
+Fetcher = Callable[[str], Awaitable[Union[Dict[str, Any], str]]]
+
+class QuranStore:
+    """Korpus Al-Qur'an lokal dengan pengisian lazy per surah."""
+
+    def __init__(self, fetcher: Fetcher, path: str = QURAN_DB_FILE):
+        self._fetch = fetcher
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS surah (
+                nomor       INTEGER PRIMARY KEY,
+                nama_latin  TEXT NOT NULL,
+                jumlah_ayat INTEGER NOT NULL,
+                version     INTEGER NOT NULL,
+                synced_at   REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ayat (
+                surah     INTEGER NOT NULL,
+                ayat      INTEGER NOT NULL,
+                arab      TEXT NOT NULL,
+                indonesia TEXT NOT NULL,
+                tafsir    TEXT,
+                PRIMARY KEY (surah, ayat)
+            ) WITHOUT ROWID;
+        """)
+        # Metadata surah kecil, cukup disimpan di memori: nomor -> (nama, jumlah ayat, versi, waktu sinkron)
+        self._surah_meta: Dict[int, tuple] = {
+            row[0]: row[1:] for row in self._conn.execute(
+                "SELECT nomor, nama_latin, jumlah_ayat, version, synced_at FROM surah"
+            )
+        }
+        self._surah_locks: Dict[int, asyncio.Lock] = {}
+        logger.info(f"Korpus Al-Qur'an lokal dibuka: {len(self._surah_meta)}/{TOTAL_SURAH} surah tersedia.")
+
+    # --- Status ---
+
+    def has_surah(self, surah: int) -> bool:
+        meta = self._surah_meta.get(surah)
+        return meta is not None and meta[2] == CORPUS_VERSION
+
+    def is_stale(self, surah: int) -> bool:
+        meta = self._surah_meta.get(surah)
+        return meta is None or meta[2] != CORPUS_VERSION or time.time() - meta[3] > REFRESH_AFTER
+
+    def surah_count(self) -> int:
+        return sum(1 for nomor in self._surah_meta if self.has_surah(nomor))
+
+    # --- Pengisian Data ---
+
+    async def ensure_surah(self, surah: int, force: bool = False) -> Optional[str]:
+        """
+        Memastikan surah tersedia secara lokal.
+        Mengembalikan None jika berhasil, atau string error ("not_found"/"api_error").
+        """
+        if not force and self.has_surah(surah):
+            return None
+        lock = self._surah_locks.setdefault(surah, asyncio.Lock())
+        async with lock:
+            # Periksa ulang: permintaan lain mungkin sudah mengisinya selama menunggu lock
+            if not force and self.has_surah(surah):
+                return None
+            surah_data, tafsir_data = await asyncio.gather(
+                self._fetch(f"/surat/{surah}"), self._fetch(f"/tafsir/{surah}")
+            )
+            if isinstance(surah_data, str):
+                return surah_data
+            if not surah_data.get('ayat'):
+                return "not_found"
+            # Tafsir yang gagal diambil tidak membatalkan penyimpanan ayat
+            tafsir_map = {}
+            if isinstance(tafsir_data, dict):
+                tafsir_map = {t.get('ayat'): re.sub(HTML_CLEANER, '', t.get('teks', ''))
+                              for t in tafsir_data.get('tafsir', [])}
+            else:
+                logger.warning(f"Tafsir Surah {surah} gagal diambil ({tafsir_data}); hanya ayat yang disimpan.")
+            self._store_surah(surah, surah_data, tafsir_map)
+            return None
+
+    def _store_surah(self, surah: int, surah_data: Dict[str, Any], tafsir_map: Dict[int, str]) -> None:
+        rows = [
+            (surah, verse.get('nomorAyat', index), verse.get('teksArab', ''),
+             verse.get('teksIndonesia', ''), tafsir_map.get(verse.get('nomorAyat', index)))
+            for index, verse in enumerate(surah_data['ayat'], start=1)
+        ]
+        name = surah_data.get('namaLatin', 'N/A')
+        # Versi ditandai lengkap hanya jika tafsir juga berhasil disimpan
+        version = CORPUS_VERSION if tafsir_map else 0
+        synced_at = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM ayat WHERE surah = ?", (surah,))
+                self._conn.executemany(
+                    "INSERT INTO ayat (surah, ayat, arab, indonesia, tafsir) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO surah (nomor, nama_latin, jumlah_ayat, version, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (surah, name, len(rows), version, synced_at),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._surah_meta[surah] = (name, len(rows), version, synced_at)
+        logger.info(f"Surah {surah} ({name}) tersimpan di korpus lokal ({len(rows)} ayat).")
+
+    async def sync_all(self, force: bool = False, concurrency: int = 4) -> Dict[str, int]:
+        """
+        Mengunduh semua surah yang belum ada atau sudah kedaluwarsa.
+        Mengembalikan ringkasan jumlah surah yang diperbarui, dilewati, dan gagal.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        summary = {"updated": 0, "skipped": 0, "failed": 0}
+
+        async def _sync(surah: int) -> None:
+            if not force and not self.is_stale(surah):
+                summary["skipped"] += 1
+                return
+            async with semaphore:
+                error = await self.ensure_surah(surah, force=True)
+            summary["failed" if error else "updated"] += 1
+
+        await asyncio.gather(*(_sync(n) for n in range(1, TOTAL_SURAH + 1)))
+        logger.info(f"Sinkronisasi korpus Al-Qur'an selesai: {summary}")
+        return summary
+
+    # --- Pencarian ---
+
+    def surah_info(self, surah: int) -> Optional[Dict[str, Any]]:
+        meta = self._surah_meta.get(surah)
+        if meta is None:
+            return None
+        return {"nomor": surah, "nama_latin": meta[0], "jumlah_ayat": meta[1]}
+
+    async def get_ayat(self, surah: int, ayat: int, with_tafsir: bool = False) -> Union[Dict[str, Any], str]:
+        """Mengambil satu ayat beserta terjemahan dan tafsirnya."""
+        available = self.has_surah(surah) if with_tafsir else surah in self._surah_meta
+        if not available:
+            error = await self.ensure_surah(surah)
+            if error:
+                return error
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT arab, indonesia, tafsir FROM ayat WHERE surah = ? AND ayat = ?", (surah, ayat)
+            ).fetchone()
+        if row is None:
+            return "not_found"
+        return {
+            "surah": surah,
+            "ayat": ayat,
+            "surah_name": self._surah_meta[surah][0],
+            "arabic": row[0],
+            "translation": row[1],
+            "tafsir": row[2],
+        }
+
+    async def random_ayat(self) -> Union[Dict[str, Any], str]:
+        """Mengambil ayat acak; surah acak diisi secara lazy jika belum tersedia."""
+        surah = random.randint(1, TOTAL_SURAH)
+        if self._surah_meta.get(surah) is None:
+            error = await self.ensure_surah(surah)
+            if error:
+                return error
+        return await self.get_ayat(surah, random.randint(1, self._surah_meta[surah][1]))
+
+    def iter_ayat(self) -> Iterator[Tuple[int, int, str, Optional[str]]]:
+        """Semua ayat tersimpan sebagai (surah, ayat, terjemahan, tafsir)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT surah, ayat, indonesia, tafsir FROM ayat").fetchall()
+        return iter(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
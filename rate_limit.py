@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pembatas laju (rate limiter) berbasis token bucket.
+
+- `TokenBucket`: bucket asinkron untuk memberi laju panggilan keluar (API Telegram, AI).
+- `KeyedTokenBuckets` dan `CommandRateLimiter`: kuota perintah mahal per
+  (pengguna, perintah) dan per chat. Permintaan yang melebihi kuota langsung
+  dijawab dengan pesan tunggu, bukan diantrekan.
+
+Konfigurasi:
+    COMMAND_COSTS        biaya token per perintah, misal "tanya=3,kisah=3,tafsir=1,hadits=1"
+    USER_COMMAND_BURST   kapasitas bucket per (pengguna, perintah) (default 6)
+    USER_COMMAND_RATE    token per menit untuk bucket pengguna (default 6)
+    CHAT_COMMAND_BURST   kapasitas bucket per chat (default 30)
+    CHAT_COMMAND_RATE    token per menit untuk bucket chat (default 20)
+"""
+
+import asyncio
+import functools
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+from telegram import Update
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import ContextTypes
+
+from cache_utils import TTLCache
+from metrics import Counter
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+def _parse_costs(spec: str) -> Dict[str, float]:
+    costs = {}
+    for item in spec.split(','):
+        name, _, cost = item.partition('=')
+        if name.strip() and cost.strip():
+            costs[name.strip().lstrip('/')] = float(cost)
+    return costs
+
+COMMAND_COSTS = _parse_costs(os.environ.get('COMMAND_COSTS', 'tanya=3,kisah=3,tafsir=1,hadits=1'))
+USER_COMMAND_BURST = float(os.environ.get('USER_COMMAND_BURST', '6'))
+USER_COMMAND_RATE = float(os.environ.get('USER_COMMAND_RATE', '6')) / 60.0
+CHAT_COMMAND_BURST = float(os.environ.get('CHAT_COMMAND_BURST', '30'))
+CHAT_COMMAND_RATE = float(os.environ.get('CHAT_COMMAND_RATE', '20')) / 60.0
+
+COMMANDS_THROTTLED = Counter("bot_commands_throttled_total", "Perintah yang ditolak pembatas laju.", ["command", "scope"])
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Nilai RetryAfter dalam detik (PTB dapat mengembalikan int atau timedelta)."""
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+class TokenBucket:
+    """
+    Token bucket asinkron: `rate` token per detik dengan kapasitas `capacity`.
+    `acquire` menunggu hingga token tersedia; `pause` menahan seluruh bucket
+    (misalnya setelah Telegram membalas RetryAfter).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Mengambil token tanpa menunggu; False jika tidak cukup."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        # Lock menjaga urutan FIFO antar penunggu
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+class KeyedTokenBuckets:
+    """
+    Token bucket sinkron per kunci dengan laju dan kapasitas yang sama.
+
+    Bucket yang tidak disentuh selama `capacity / rate` detik pasti sudah penuh
+    kembali, sehingga bisa dibuang tanpa mengubah hasil. Entri disimpan dalam
+    OrderedDict berurutan menurut waktu terakhir disentuh, jadi pembuangan
+    cukup memeriksa entri terdepan (O(1) teramortisasi per panggilan).
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.idle_ttl = capacity / rate
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self.idle_ttl and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.capacity
+        tokens, updated = entry
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def wait_time(self, key: Hashable, cost: float) -> float:
+        """Detik hingga `cost` token tersedia untuk `key` (0 jika sudah cukup)."""
+        now = time.monotonic()
+        self._expire(now)
+        missing = min(cost, self.capacity) - self._tokens(key, now)
+        return max(0.0, missing / self.rate)
+
+    def take(self, key: Hashable, cost: float) -> None:
+        """Mengurangi `cost` token dari bucket `key` (panggil setelah `wait_time` bernilai 0)."""
+        now = time.monotonic()
+        tokens = self._tokens(key, now)
+        self._buckets.pop(key, None)
+        self._buckets[key] = (max(0.0, tokens - cost), now)
+
+class CommandRateLimiter:
+    """
+    Kuota perintah mahal: satu bucket per (pengguna, perintah) dan satu bucket
+    bersama per chat. Token hanya diambil jika kedua bucket mencukupi.
+
+    Pesan tunggu dikirim sekali per masa tunggu; percobaan berikutnya dalam
+    masa yang sama diabaikan tanpa balasan agar pembatas tidak ikut membanjiri chat.
+    Bucket disimpan di memori instance; dalam mode cluster setiap chat selalu
+    diproses worker yang sama sehingga kuota per chat tetap konsisten.
+    """
+
+    def __init__(self, costs: Dict[str, float] = COMMAND_COSTS,
+                 user_rate: float = USER_COMMAND_RATE, user_burst: float = USER_COMMAND_BURST,
+                 chat_rate: float = CHAT_COMMAND_RATE, chat_burst: float = CHAT_COMMAND_BURST):
+        self.costs = costs
+        self.user_buckets = KeyedTokenBuckets(user_rate, user_burst)
+        self.chat_buckets = KeyedTokenBuckets(chat_rate, chat_burst)
+        # Kunci yang sudah diberi pesan tunggu; entri kedaluwarsa bersama masa tunggunya
+        self._notified = TTLCache(max_entries=10_000)
+
+    def check(self, command: str, chat_id: int, user_id: int) -> Tuple[str, float]:
+        """
+        Mengambil token untuk satu pemanggilan perintah.
+        Mengembalikan ("", 0) jika diizinkan, atau (cakupan, detik tunggu) jika ditolak.
+        """
+        cost = self.costs.get(command, 1.0)
+        user_key = (user_id, command)
+        wait = self.user_buckets.wait_time(user_key, cost)
+        if wait > 0:
+            return "user", wait
+        wait = self.chat_buckets.wait_time(chat_id, cost)
+        if wait > 0:
+            return "chat", wait
+        self.user_buckets.take(user_key, cost)
+        self.chat_buckets.take(chat_id, cost)
+        return "", 0.0
+
+    def should_notify(self, key: Hashable, wait: float) -> bool:
+        """True jika pesan tunggu untuk `key` belum dikirim dalam masa tunggu ini."""
+        if self._notified.get(key) is not None:
+            return False
+        self._notified.set(key, True, ttl=wait)
+        return True
+
+    def limit(self, command: str, callback: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+              ) -> Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]:
+        """Membungkus callback perintah dengan pemeriksaan kuota."""
+        @functools.wraps(callback)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            if not update.effective_chat or not update.effective_user or not update.message:
+                return await callback(update, context)
+            chat_id = update.effective_chat.id
+            scope, wait = self.check(command, chat_id, update.effective_user.id)
+            if not scope:
+                return await callback(update, context)
+            COMMANDS_THROTTLED.inc(command=command, scope=scope)
+            key = (scope, chat_id if scope == "chat" else update.effective_user.id, command)
+            if not self.should_notify(key, wait):
+                return
+            seconds = math.ceil(wait)
+            if scope == "user":
+                text = f"⏳ Mohon tunggu {seconds} detik sebelum memakai /{command} lagi."
+            else:
+                text = f"⏳ Perintah di chat ini sedang ramai dipakai. Silakan coba /{command} lagi dalam {seconds} detik."
+            try:
+                await update.message.reply_text(text)
+            except TelegramError as e:
+                logger.warning(f"Gagal mengirim pesan tunggu /{command} ke chat {chat_id}: {e}")
+        return wrapper
+
+command_limiter = CommandRateLimiter()
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+
+"""
+Mesin pengingat yang persisten untuk perintah /ingatkan.
+
+Pengingat disimpan di SQLite (diindeks berdasarkan waktu jatuh tempo) sehingga
+tidak hilang saat bot dimulai ulang. Satu task asyncio dengan min-heap hanya
+bangun untuk pengingat terdekat, bukan satu job scheduler per pengingat.
+Pengingat yang terlewat selama bot mati dikirim segera setelah startup.
+
+Dalam mode state bersama (SHARED_STATE_URL), `SharedReminderScheduler`
+menyimpan pengingat di sorted set bersama sehingga setiap instance dapat
+mengirimnya; klaim ber-TTL memastikan satu pengingat dikirim satu instance.
+"""
+
+import asyncio
+import heapq
+import html
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+
+from rate_limit import retry_after_seconds
+from shared_state import SharedState, SharedStateError, shared_state
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+REMINDER_DB_FILE = os.environ.get('REMINDER_DB_FILE', "reminders.sqlite3")
+MAX_REMINDERS_PER_USER = int(os.environ.get('MAX_REMINDERS_PER_USER', '20'))
+RETRY_DELAY = 60  # Detik sebelum mencoba ulang pengingat yang gagal karena error jaringan
+SHARED_POLL_INTERVAL = 1.0  # Jeda pemeriksaan pengingat jatuh tempo di state bersama
+# Lama klaim sebuah pengingat; jika instance pengirim mati, pengingat dikirim ulang setelahnya
+SHARED_CLAIM_TIMEOUT = 120
+
+async def _deliver(bot: Bot, reminder_id: int, chat_id: int, text: str, due_at: float) -> Optional[float]:
+    """
+    Mengirim satu pengingat. Mengembalikan jeda (detik) sebelum dicoba lagi,
+    atau None jika pengingat selesai (terkirim atau memang tidak dapat dikirim).
+    """
+    late = time.time() - due_at
+    formatted, plain = f"⏰ <b>Pengingat:</b>\n\n<i>{html.escape(text)}</i>", f"⏰ Pengingat:\n\n{text}"
+    if late > 300:
+        note = f"(Terlambat {int(late // 60)} menit karena bot sempat tidak aktif.)"
+        formatted += f"\n\n<i>{note}</i>"
+        plain += f"\n\n{note}"
+    attempts = ((formatted, ParseMode.HTML), (plain, None))
+    for message, parse_mode in attempts:
+        try:
+            await bot.send_message(chat_id=chat_id, text=message, parse_mode=parse_mode)
+        except RetryAfter as e:
+            # Kena batas kirim Telegram: jadwalkan ulang tanpa menghapus dari penyimpanan
+            return retry_after_seconds(e)
+        except BadRequest as e:
+            if parse_mode is not None and "parse entities" in str(e).lower():
+                # Format HTML ditolak: kirim ulang sebagai teks biasa daripada membuang pengingat
+                logger.warning(f"Pengingat {reminder_id} dikirim tanpa format HTML: {e}")
+                continue
+            logger.warning(f"Pengingat {reminder_id} tidak dapat dikirim ke chat {chat_id}: {e}")
+        except Forbidden as e:
+            logger.warning(f"Pengingat {reminder_id} tidak dapat dikirim ke chat {chat_id}: {e}")
+        except TelegramError as e:
+            logger.error(f"Error jaringan saat mengirim pengingat {reminder_id}, dicoba lagi nanti: {e}")
+            return RETRY_DELAY
+        return None
+    return None
+
+class ReminderScheduler:
+    """Penjadwal pengingat berbasis min-heap dengan penyimpanan SQLite."""
+
+    def __init__(self, path: str = REMINDER_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reminders (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id    INTEGER NOT NULL,
+                user_id    INTEGER NOT NULL,
+                due_at     REAL NOT NULL,
+                text       TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders (due_at);
+            CREATE INDEX IF NOT EXISTS idx_reminders_owner ON reminders (chat_id, user_id);
+        """)
+        self._heap: List[Tuple[float, int]] = []
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # --- Siklus Hidup ---
+
+    async def start(self, bot: Bot) -> None:
+        """Memuat semua pengingat tertunda dan memulai loop timer."""
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        with self._lock:
+            rows = self._conn.execute("SELECT due_at, id FROM reminders").fetchall()
+        self._heap = [(due_at, reminder_id) for due_at, reminder_id in rows]
+        heapq.heapify(self._heap)
+        overdue = sum(1 for due_at, _ in self._heap if due_at <= time.time())
+        logger.info(f"{len(self._heap)} pengingat dimuat dari disk ({overdue} terlewat, akan segera dikirim).")
+        self._task = asyncio.create_task(self._run(), name="reminder_scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        with self._lock:
+            self._conn.close()
+
+    # --- Operasi Pengingat ---
+
+    async def add(self, chat_id: int, user_id: int, delay: float, text: str) -> int:
+        """Menyimpan pengingat baru dan mengembalikan ID-nya."""
+        now = time.time()
+        due_at = now + delay
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO reminders (chat_id, user_id, due_at, text, created_at) VALUES (?, ?, ?, ?, ?)",
+                (chat_id, user_id, due_at, text, now),
+            )
+            reminder_id = cursor.lastrowid
+        heapq.heappush(self._heap, (due_at, reminder_id))
+        # Bangunkan loop jika pengingat baru lebih awal dari yang sedang ditunggu
+        if self._wakeup is not None and self._heap[0][1] == reminder_id:
+            self._wakeup.set()
+        return reminder_id
+
+    async def count_for(self, chat_id: int, user_id: int) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM reminders WHERE chat_id = ? AND user_id = ?", (chat_id, user_id)
+            ).fetchone()[0]
+
+    async def list_for(self, chat_id: int, user_id: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, due_at, text FROM reminders WHERE chat_id = ? AND user_id = ? ORDER BY due_at",
+                (chat_id, user_id),
+            ).fetchall()
+        return [{"id": r[0], "due_at": r[1], "text": r[2]} for r in rows]
+
+    async def cancel(self, chat_id: int, user_id: int, reminder_id: int) -> bool:
+        """Membatalkan pengingat milik pengguna. Entri heap dibuang secara lazy saat jatuh tempo."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM reminders WHERE id = ? AND chat_id = ? AND user_id = ?",
+                (reminder_id, chat_id, user_id),
+            )
+            return cursor.rowcount > 0
+
+    def pending_count(self) -> int:
+        return len(self._heap)
+
+    # --- Loop Timer ---
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - time.time())
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    continue  # Ada pengingat baru yang lebih awal; hitung ulang
+                except asyncio.TimeoutError:
+                    pass
+            while self._heap and self._heap[0][0] <= time.time():
+                _, reminder_id = heapq.heappop(self._heap)
+                try:
+                    await self._fire(reminder_id)
+                except Exception as e:
+                    logger.error(f"Gagal memproses pengingat {reminder_id}: {e}")
+
+    async def _fire(self, reminder_id: int) -> None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chat_id, text, due_at FROM reminders WHERE id = ?", (reminder_id,)
+            ).fetchone()
+        if row is None:
+            return  # Sudah dibatalkan
+        chat_id, text, due_at = row
+        retry_in = await _deliver(self._bot, reminder_id, chat_id, text, due_at)
+        if retry_in is not None:
+            heapq.heappush(self._heap, (time.time() + retry_in, reminder_id))
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
+
+class SharedReminderScheduler:
+    """
+    Penjadwal pengingat di state bersama, dengan antarmuka yang sama seperti
+    `ReminderScheduler`. Operasi pengingat dijalankan di thread terpisah agar
+    round trip ke state bersama tidak menahan event loop; SharedStateError
+    diteruskan ke pemanggil.
+
+    - `reminders:due`: sorted set id -> waktu jatuh tempo.
+    - `reminder:<id>`: hash berisi chat_id, user_id, due_at, dan text.
+    - `reminders:owner:<chat_id>:<user_id>`: set id milik seorang pengguna.
+
+    Setiap instance memeriksa pengingat jatuh tempo secara berkala. Sebelum
+    mengirim, instance mengklaimnya (SET NX ber-TTL) dan memundurkan jadwalnya
+    sejauh `SHARED_CLAIM_TIMEOUT`, sehingga pengingat tidak dikirim dua kali
+    dan tetap terkirim jika instance pengklaim mati di tengah jalan.
+    """
+
+    def __init__(self, state: SharedState):
+        self.state = state
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _owner_key(chat_id: int, user_id: int) -> str:
+        return f"reminders:owner:{chat_id}:{user_id}"
+
+    # --- Siklus Hidup ---
+
+    async def start(self, bot: Bot) -> None:
+        self._bot = bot
+        pending = await asyncio.to_thread(self.pending_count)
+        logger.info(f"{pending} pengingat tertunda di state bersama.")
+        self._task = asyncio.create_task(self._run(), name="shared_reminder_scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- Operasi Pengingat ---
+
+    async def add(self, chat_id: int, user_id: int, delay: float, text: str) -> int:
+        return await asyncio.to_thread(self._add, chat_id, user_id, delay, text)
+
+    async def count_for(self, chat_id: int, user_id: int) -> int:
+        return await asyncio.to_thread(self._count_for, chat_id, user_id)
+
+    async def list_for(self, chat_id: int, user_id: int) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._list_for, chat_id, user_id)
+
+    async def cancel(self, chat_id: int, user_id: int, reminder_id: int) -> bool:
+        return await asyncio.to_thread(self._cancel, chat_id, user_id, reminder_id)
+
+    def _add(self, chat_id: int, user_id: int, delay: float, text: str) -> int:
+        now = time.time()
+        reminder_id = self.state.incr("reminders:next_id")
+        self.state.hset(f"reminder:{reminder_id}", {
+            "chat_id": str(chat_id), "user_id": str(user_id), "due_at": repr(now + delay),
+            "text": text, "created_at": repr(now),
+        })
+        self.state.sadd(self._owner_key(chat_id, user_id), str(reminder_id))
+        self.state.zadd("reminders:due", {str(reminder_id): now + delay})
+        return reminder_id
+
+    def _count_for(self, chat_id: int, user_id: int) -> int:
+        return len(self.state.smembers(self._owner_key(chat_id, user_id)))
+
+    def _list_for(self, chat_id: int, user_id: int) -> List[Dict[str, Any]]:
+        reminder_ids = list(self.state.smembers(self._owner_key(chat_id, user_id)))
+        # Semua hash pengingat diambil dalam satu round trip
+        rows = self.state.hgetall_many([f"reminder:{reminder_id}" for reminder_id in reminder_ids])
+        reminders = [
+            {"id": int(reminder_id), "due_at": float(data['due_at']), "text": data['text']}
+            for reminder_id, data in zip(reminder_ids, rows) if data
+        ]
+        return sorted(reminders, key=lambda r: r['due_at'])
+
+    def _cancel(self, chat_id: int, user_id: int, reminder_id: int) -> bool:
+        if self.state.srem(self._owner_key(chat_id, user_id), str(reminder_id)) == 0:
+            return False  # Bukan milik pengguna ini atau sudah terkirim
+        self._remove(reminder_id, chat_id, user_id)
+        return True
+
+    def pending_count(self) -> int:
+        return self.state.zcard("reminders:due")
+
+    def _remove(self, reminder_id: int, chat_id: int, user_id: int) -> None:
+        self.state.zrem("reminders:due", str(reminder_id))
+        self.state.srem(self._owner_key(chat_id, user_id), str(reminder_id))
+        self.state.delete(f"reminder:{reminder_id}")
+
+    # --- Loop Pemeriksaan ---
+
+    def _claim_due(self) -> List[Tuple[int, Dict[str, str]]]:
+        """Mengklaim pengingat yang sudah jatuh tempo (dijalankan di thread terpisah)."""
+        now = time.time()
+        claimed = []
+        for reminder_id in self.state.zrangebyscore("reminders:due", float('-inf'), now, limit=100):
+            if not self.state.set(f"reminder:claim:{reminder_id}", "1", ttl=SHARED_CLAIM_TIMEOUT, nx=True):
+                continue  # Sedang dikirim instance lain
+            self.state.zadd("reminders:due", {reminder_id: now + SHARED_CLAIM_TIMEOUT})
+            data = self.state.hgetall(f"reminder:{reminder_id}")
+            if not data:
+                self.state.zrem("reminders:due", reminder_id)  # Dibatalkan di antara pemeriksaan
+                continue
+            claimed.append((int(reminder_id), data))
+        return claimed
+
+    def _finish(self, reminder_id: int, data: Dict[str, str], retry_in: Optional[float]) -> None:
+        if retry_in is not None:
+            self.state.zadd("reminders:due", {str(reminder_id): time.time() + retry_in})
+        else:
+            self._remove(reminder_id, int(data['chat_id']), int(data['user_id']))
+        self.state.delete(f"reminder:claim:{reminder_id}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self._claim_due)
+            except SharedStateError as e:
+                logger.error(f"Gagal memeriksa pengingat di state bersama: {e}")
+                claimed = []
+            for reminder_id, data in claimed:
+                try:
+                    retry_in = await _deliver(self._bot, reminder_id, int(data['chat_id']), data['text'],
+                                              float(data['due_at']))
+                    await asyncio.to_thread(self._finish, reminder_id, data, retry_in)
+                except Exception as e:
+                    logger.error(f"Gagal memproses pengingat {reminder_id}: {e}")
+            await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+reminder_scheduler = SharedReminderScheduler(shared_state) if shared_state is not None else ReminderScheduler()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fitur pencarian teks (/cari, /cariayat, /carihadits) atas terjemahan dan
+tafsir Al-Qur'an serta terjemahan hadits yang sudah tersimpan di korpus lokal.
+Hasil ditampilkan per halaman dengan tombol navigasi inline.
+"""
+
+import asyncio
+import html
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from hadith_store import hadith_store
+from quran_features import quran_store
+from search_index import (
+    SearchIndex, KIND_HADITH, KIND_TAFSIR, KIND_TRANSLATION, stem, tokenize,
+)
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 5
+MAX_RESULTS = 50
+SNIPPET_WIDTH = 180
+# Kecocokan di tafsir menambah skor ayat, tetapi tidak sebesar kecocokan di terjemahannya
+TAFSIR_WEIGHT = 0.5
+# callback_data Telegram maksimal 64 byte: "cari|<cakupan>|<halaman>|<query>"
+MAX_QUERY_BYTES = 50
+
+# Cakupan pencarian: kode -> (jenis dokumen, label)
+SCOPES = {
+    "a": ((KIND_TRANSLATION, KIND_TAFSIR, KIND_HADITH), "Al-Qur'an & Hadits"),
+    "q": ((KIND_TRANSLATION, KIND_TAFSIR), "Al-Qur'an"),
+    "h": ((KIND_HADITH,), "Hadits"),
+}
+
+search_index = SearchIndex()
+
+def _collect_documents() -> List[Tuple[str, str]]:
+    """Dokumen dari korpus lokal yang belum terindeks (dijalankan di thread terpisah)."""
+    documents = []
+    for surah, ayat, translation, tafsir in quran_store.iter_ayat():
+        for kind, text in ((KIND_TRANSLATION, translation), (KIND_TAFSIR, tafsir)):
+            key = f"{kind}:{surah}:{ayat}"
+            if text and not search_index.contains(key):
+                documents.append((key, text))
+    for book, number, text in hadith_store.iter_hadiths():
+        key = f"{KIND_HADITH}:{book}:{number}"
+        if text and not search_index.contains(key):
+            documents.append((key, text))
+    return documents
+
+async def update_search_index(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tugas terjadwal: mengindeks ayat, tafsir, dan hadits yang baru tersimpan."""
+    added = await asyncio.to_thread(lambda: search_index.add_documents(_collect_documents()))
+    if added:
+        logger.info(f"{added} dokumen baru ditambahkan ke indeks pencarian: {search_index.stats()}")
+
+def search(query: str, scope: str) -> List[str]:
+    """Kunci hasil ("q:<surah>:<ayat>" atau "h:<kitab>:<nomor>") urut berdasarkan relevansi."""
+    kinds, _ = SCOPES[scope]
+    scores: Dict[str, float] = {}
+    for hit in search_index.search(query, kinds, limit=MAX_RESULTS * 2):
+        kind, ref = hit.key.split(":", 1)
+        if kind == KIND_HADITH:
+            key, score = hit.key, hit.score
+        else:
+            key = f"{KIND_TRANSLATION}:{ref}"
+            score = hit.score * (TAFSIR_WEIGHT if kind == KIND_TAFSIR else 1.0)
+        scores[key] = scores.get(key, 0.0) + score
+    return sorted(scores, key=scores.get, reverse=True)[:MAX_RESULTS]
+
+def _snippet(text: str, terms: set) -> str:
+    """Potongan teks di sekitar kata pertama yang cocok, dengan kata yang cocok ditebalkan."""
+    words = list(re.finditer(r"[\w']+", text))
+    matches = [m for m in words if stem(m.group().lower().replace("'", "")) in terms]
+    center = matches[0].start() if matches else 0
+    start = max(0, center - SNIPPET_WIDTH // 3)
+    end = min(len(text), start + SNIPPET_WIDTH)
+    if start > 0:
+        start = text.find(" ", start) + 1 or start
+    parts, cursor = [], start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        parts.append(html.escape(text[cursor:match.start()]))
+        parts.append(f"<b>{html.escape(match.group())}</b>")
+        cursor = match.end()
+    parts.append(html.escape(text[cursor:end]))
+    return ("…" if start > 0 else "") + "".join(parts).strip() + ("…" if end < len(text) else "")
+
+async def _render_result(number: int, key: str, terms: set) -> str:
+    kind, ref = key.split(":", 1)
+    if kind == KIND_HADITH:
+        book, nomor = ref.rsplit(":", 1)
+        hadith = hadith_store.get_local(book, int(nomor))
+        if hadith is None:
+            return f"{number}. 📜 Hadits {book} No. {nomor}"
+        return (f"{number}. 📜 <b>Hadits {html.escape(hadith['book_name'])} No. {nomor}</b>\n"
+                f"<i>{_snippet(hadith['translation'], terms)}</i>\n/hadits {book} {nomor}")
+    surah, ayat = (int(n) for n in ref.split(":"))
+    verse = await quran_store.get_ayat(surah, ayat, with_tafsir=True)
+    if isinstance(verse, str):
+        return f"{number}. 📖 QS {surah}:{ayat}"
+    # Tampilkan terjemahan; jika yang cocok hanya tafsirnya, tampilkan potongan tafsir
+    text = verse['translation']
+    if not terms.intersection(tokenize(text)) and verse['tafsir']:
+        text = verse['tafsir']
+    return (f"{number}. 📖 <b>QS {html.escape(verse['surah_name'])} ({surah}:{ayat})</b>\n"
+            f"<i>{_snippet(text, terms)}</i>\n/ayat {surah}:{ayat}")
+
+async def _render_page(query: str, scope: str, page: int) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    results = search(query, scope)
+    _, label = SCOPES[scope]
+    if not results:
+        return f"🔎 Tidak ada hasil untuk \"{html.escape(query)}\" di {label}.", None
+    pages = (len(results) + PAGE_SIZE - 1) // PAGE_SIZE
+    page = max(0, min(page, pages - 1))
+    terms = set(tokenize(query))
+    offset = page * PAGE_SIZE
+    entries = await asyncio.gather(*(
+        _render_result(offset + i + 1, key, terms) for i, key in enumerate(results[offset:offset + PAGE_SIZE])
+    ))
+    header = (f"🔎 <b>Hasil pencarian \"{html.escape(query)}\"</b> di {label}\n"
+              f"{len(results)} hasil — halaman {page + 1}/{pages}\n\n")
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀️ Sebelumnya", callback_data=f"cari|{scope}|{page - 1}|{query}"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton("Berikutnya ▶️", callback_data=f"cari|{scope}|{page + 1}|{query}"))
+    return header + "\n\n".join(entries), InlineKeyboardMarkup([buttons]) if buttons else None
+
+def _clip_query(query: str) -> str:
+    """Memotong query (di batas kata) agar muat di callback_data tombol halaman."""
+    while len(query.encode('utf-8')) > MAX_QUERY_BYTES and " " in query:
+        query = query.rsplit(" ", 1)[0]
+    return query.encode('utf-8')[:MAX_QUERY_BYTES].decode('utf-8', 'ignore')
+
+async def _search_command(update: Update, context: ContextTypes.DEFAULT_TYPE, scope: str, command: str) -> None:
+    if not update.message:
+        return
+    if not context.args:
+        await update.message.reply_text(f"Gunakan format: /{command} <code>[kata kunci]</code>\nContoh: /{command} sabar",
+                                        parse_mode=ParseMode.HTML)
+        return
+    if not search_index.stats()['documents']:
+        await update.message.reply_text("Indeks pencarian sedang disiapkan. Silakan coba lagi beberapa saat lagi.")
+        return
+    query = _clip_query(" ".join(context.args).replace("|", " ").strip())
+    if not tokenize(query):
+        await update.message.reply_text("Kata kunci terlalu umum. Coba gunakan kata yang lebih spesifik.")
+        return
+    text, keyboard = await _render_page(query, scope, 0)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler untuk /cari (Al-Qur'an dan hadits)."""
+    await _search_command(update, context, "a", "cari")
+
+async def search_quran_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler untuk /cariayat (terjemahan dan tafsir Al-Qur'an)."""
+    await _search_command(update, context, "q", "cariayat")
+
+async def search_hadith_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler untuk /carihadits."""
+    await _search_command(update, context, "h", "carihadits")
+
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tombol navigasi halaman hasil pencarian."""
+    query = update.callback_query
+    try:
+        _, scope, page, text = query.data.split("|", 3)
+        page = int(page)
+        if scope not in SCOPES:
+            raise ValueError
+    except ValueError:
+        await query.answer()
+        return
+    await query.answer()
+    message, keyboard = await _render_page(text, scope, page)
+    try:
+        await query.edit_message_text(message, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
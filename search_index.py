@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+
+"""
+Indeks terbalik (inverted index) dengan peringkat BM25 untuk teks berbahasa
+Indonesia: terjemahan Al-Qur'an, tafsir, dan terjemahan hadits.
+
+Indeks terdiri dari beberapa segmen yang tidak pernah diubah setelah ditulis.
+Dokumen baru (misalnya surah yang baru diunduh) ditambahkan sebagai segmen
+baru, dan segmen-segmen kecil digabung bila jumlahnya terlalu banyak. Posting
+setiap segmen disimpan sebagai array NumPy yang dibuka dengan memory-map,
+sehingga startup cepat dan hanya bagian yang dipakai query yang dibaca dari disk.
+"""
+
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR', "search_index")
+MAX_SEGMENTS = 8
+INDEX_FORMAT = 2  # Naikkan jika tokenisasi/format berubah; indeks lama dibangun ulang
+
+# Parameter BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Jenis dokumen (awalan kunci dokumen)
+KIND_TRANSLATION = "q"   # q:<surah>:<ayat>
+KIND_TAFSIR = "t"        # t:<surah>:<ayat>
+KIND_HADITH = "h"        # h:<kitab>:<nomor>
+KINDS = (KIND_TRANSLATION, KIND_TAFSIR, KIND_HADITH)
+
+# --- Normalisasi & Stemming Bahasa Indonesia ---
+
+STOPWORDS = frozenset("""
+    yang dan di ke dari itu ini dengan untuk pada adalah dalam atau juga akan oleh
+    sebagai bagi kepada karena agar supaya maka jika apabila bila ketika saat telah sudah
+    tersebut ia dia mereka kami kita kamu engkau aku saya nya pun lah kah an se para
+    tentang antara bahwa hingga sampai sehingga namun tetapi serta lalu kemudian pula
+""".split())
+
+# Ejaan berbeda untuk kata yang sama
+SYNONYMS = {
+    "sholat": "salat", "shalat": "salat", "solat": "salat", "sembahyang": "salat",
+    "alloh": "allah", "puasa": "shaum", "saum": "shaum", "shiyam": "shaum",
+    "zakat": "zakat", "sodaqoh": "sedekah", "sedekah": "sedekah", "shadaqah": "sedekah", "sadaqah": "sedekah",
+    "quran": "quran", "alquran": "quran", "nabi": "nabi", "rasul": "rasul", "rasulullah": "rasul",
+    "sholeh": "saleh", "shalih": "saleh", "soleh": "saleh",
+}
+
+_CANONICAL = frozenset(SYNONYMS.values())  # Bentuk baku tidak di-stem lagi
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_VOWELS = frozenset("aiueo")
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+MIN_STEM = 4  # Pemotongan yang menyisakan kurang dari ini dianggap salah dan dibatalkan
+
+def _strip_prefix(word: str) -> str:
+    """
+    Membuang satu awalan (me-, pe-, ber-, ter-, di-, ke-, se-, per-) beserta peluluhannya.
+    Tanpa kamus, "mem-"/"men-" + vokal hanya dibuang "me"-nya (memakan -> makan,
+    menikah -> nikah) alih-alih menebak huruf yang luluh (p/t).
+    """
+    for prefix in ("meng", "peng"):
+        if word.startswith(prefix):
+            return word[4:]
+    for prefix in ("meny", "peny"):
+        if word.startswith(prefix) and len(word) > 5 and word[4] in _VOWELS:
+            return "s" + word[4:]
+    for prefix in ("mem", "pem", "men", "pen"):
+        if word.startswith(prefix) and len(word) > 3:
+            return word[2:] if word[3] in _VOWELS else word[3:]
+    for prefix in ("ber", "ter", "per"):
+        if word.startswith(prefix):
+            return word[3:]
+    if word.startswith(("bel", "pel")) and word[3:].startswith("ajar"):
+        return word[3:]
+    for prefix in ("me", "pe", "be"):
+        if word.startswith(prefix) and len(word) > 2 and word[2] in "lrwy":
+            return word[2:]
+    for prefix in ("di", "ke", "se"):
+        if word.startswith(prefix):
+            return word[2:]
+    return word
+
+def _strip_prefixes(word: str) -> Optional[str]:
+    """Membuang awalan (termasuk awalan ganda "diper-", "memper-"); None jika sisanya terlalu pendek."""
+    stripped = _strip_prefix(word)
+    if len(stripped) < MIN_STEM:
+        return None
+    if stripped != word and stripped.startswith(("per", "ber")):
+        # Awalan kedua hanya dibuang jika sisanya masih cukup panjang ("memberi" -> "beri")
+        second = _strip_prefix(stripped)
+        if len(second) >= MIN_STEM:
+            return second
+    return stripped
+
+def _strip_suffix(word: str, suffixes: Tuple[str, ...]) -> str:
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+@functools.lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    """
+    Stemmer ringan bergaya Nazief-Adriani tanpa kamus: membuang partikel,
+    kata ganti kepemilikan, dan akhiran turunan lebih dulu, baru kemudian
+    awalan. Jika awalan tidak bisa dibuang tanpa menyisakan kurang dari
+    MIN_STEM huruf, akhiran yang terakhir dibuang dikembalikan (dimakan ->
+    "dimak" -> "mak" ditolak -> makan). Hasilnya tidak selalu kata dasar yang
+    benar, tetapi konsisten untuk dokumen maupun query.
+    """
+    word = SYNONYMS.get(word, word)
+    if len(word) <= MIN_STEM or word.isdigit() or word in _CANONICAL:
+        return word
+    # Kandidat dari yang paling banyak dipotong hingga kata utuh
+    candidates = [word]
+    for suffixes in (("lah", "kah", "pun"), ("nya", "ku", "mu"), ("kan", "an", "i")):
+        stripped = _strip_suffix(candidates[0], suffixes)
+        if stripped != candidates[0]:
+            candidates.insert(0, stripped)
+    bases = [_strip_prefixes(candidate) for candidate in candidates]
+    # Bentuk baku yang dikenal didahulukan (bersedekah -> sedekah, bukan "sede")
+    for base in bases:
+        if base is not None and SYNONYMS.get(base, base) in _CANONICAL:
+            return SYNONYMS.get(base, base)
+    for base in bases:
+        if base is not None:
+            return SYNONYMS.get(base, base)
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Teks -> daftar stem (huruf kecil, tanpa diakritik, tanpa stopword)."""
+    text = _strip_accents(text.lower()).replace("'", "").replace("`", "")
+    return [stem(token) for token in _TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+# --- Segmen ---
+
+class Segment:
+    """Satu segmen indeks yang tidak berubah: kamus term, tabel dokumen, dan posting (memory-map)."""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        base = os.path.join(directory, name)
+        with open(base + ".terms.json", 'r', encoding='utf-8') as f:
+            self.terms: Dict[str, Tuple[int, int]] = {t: tuple(v) for t, v in json.load(f).items()}
+        with open(base + ".docs.json", 'r', encoding='utf-8') as f:
+            docs = json.load(f)
+        self.keys: List[str] = [doc[0] for doc in docs]
+        self.lengths = np.array([doc[1] for doc in docs], dtype=np.float32)
+        self.kinds = np.array([KINDS.index(key[0]) for key in self.keys], dtype=np.int8)
+        # Kolom 0: indeks dokumen di segmen ini, kolom 1: frekuensi term
+        self.postings = np.load(base + ".post.npy", mmap_mode='r')
+
+    @staticmethod
+    def write(directory: str, name: str, docs: Sequence[Tuple[str, int]],
+              postings: Dict[str, List[Tuple[int, int]]]) -> None:
+        """Menulis segmen baru. `postings`: term -> [(indeks dokumen, tf), ...] urut per dokumen."""
+        terms: Dict[str, Tuple[int, int]] = {}
+        rows: List[Tuple[int, int]] = []
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = (len(rows), len(entries))
+            rows.extend(entries)
+        base = os.path.join(directory, name)
+        np.save(base + ".post.npy", np.array(rows, dtype=np.int32).reshape(-1, 2))
+        with open(base + ".docs.json", 'w', encoding='utf-8') as f:
+            json.dump([list(doc) for doc in docs], f, ensure_ascii=False)
+        with open(base + ".terms.json", 'w', encoding='utf-8') as f:
+            json.dump(terms, f, ensure_ascii=False)
+
+    def files(self, directory: str) -> List[str]:
+        base = os.path.join(directory, self.name)
+        return [base + suffix for suffix in (".post.npy", ".docs.json", ".terms.json")]
+
+    def term_postings(self, term: str) -> Optional[np.ndarray]:
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        start, count = entry
+        return self.postings[start:start + count]
+
+class SearchHit(NamedTuple):
+    key: str
+    score: float
+
+class SearchIndex:
+    """Indeks BM25 bersegmen. `add_documents` aman dipanggil dari thread lain selama query berjalan."""
+
+    def __init__(self, directory: str = SEARCH_INDEX_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self.segments: List[Segment] = []
+        self._keys: Set[str] = set()
+        self._next_segment = 0
+        self._load()
+
+    # --- Manifest ---
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def _load(self) -> None:
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            logger.error(f"Manifest indeks pencarian rusak, indeks dibangun ulang: {e}")
+            return
+        if manifest.get('format') != INDEX_FORMAT:
+            logger.info("Format indeks pencarian berubah, indeks dibangun ulang.")
+            return
+        try:
+            self.segments = [Segment(self.directory, name) for name in manifest['segments']]
+        except (OSError, ValueError) as e:
+            logger.error(f"Segmen indeks pencarian tidak dapat dibuka, indeks dibangun ulang: {e}")
+            self.segments = []
+            return
+        self._next_segment = manifest.get('next_segment', len(self.segments))
+        for segment in self.segments:
+            self._keys.update(segment.keys)
+        logger.info(f"Indeks pencarian dimuat: {len(self._keys)} dokumen dalam {len(self.segments)} segmen.")
+
+    def _save_manifest(self, segments: List[Segment]) -> None:
+        manifest = {"format": INDEX_FORMAT, "segments": [s.name for s in segments],
+                    "next_segment": self._next_segment}
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _new_segment_name(self) -> str:
+        name = f"seg-{self._next_segment:05d}"
+        self._next_segment += 1
+        return name
+
+    # --- Penulisan ---
+
+    def contains(self, key: str) -> bool:
+        return key in self._keys
+
+    def add_documents(self, documents: Iterable[Tuple[str, str]]) -> int:
+        """
+        Menambahkan dokumen (kunci, teks) yang belum terindeks sebagai segmen baru.
+        Mengembalikan jumlah dokumen yang ditambahkan.
+        """
+        with self._write_lock:
+            docs: List[Tuple[str, int]] = []
+            postings: Dict[str, List[Tuple[int, int]]] = {}
+            for key, text in documents:
+                if key in self._keys or not text:
+                    continue
+                tokens = tokenize(text)
+                if not tokens:
+                    continue
+                index = len(docs)
+                docs.append((key, len(tokens)))
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).append((index, tf))
+            if not docs:
+                return 0
+            name = self._new_segment_name()
+            Segment.write(self.directory, name, docs, postings)
+            segments = self.segments + [Segment(self.directory, name)]
+            if len(segments) > MAX_SEGMENTS:
+                segments = self._merge(segments)
+            self._save_manifest(segments)
+            obsolete = [s for s in self.segments if s not in segments]
+            # Daftar baru dipasang sekaligus; query yang sedang berjalan tetap memakai daftar lama
+            self.segments = segments
+            self._keys.update(key for key, _ in docs)
+            for segment in obsolete:
+                for path in segment.files(self.directory):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            return len(docs)
+
+    def _merge(self, segments: List[Segment]) -> List[Segment]:
+        """Menggabungkan semua segmen menjadi satu."""
+        docs: List[Tuple[str, int]] = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for segment in segments:
+            offset = len(docs)
+            docs.extend(zip(segment.keys, (int(n) for n in segment.lengths)))
+            for term, (start, count) in segment.terms.items():
+                rows = segment.postings[start:start + count]
+                postings.setdefault(term, []).extend((int(d) + offset, int(tf)) for d, tf in rows)
+        name = self._new_segment_name()
+        Segment.write(self.directory, name, docs, postings)
+        logger.info(f"{len(segments)} segmen indeks pencarian digabung ({len(docs)} dokumen).")
+        return [Segment(self.directory, name)]
+
+    # --- Pencarian ---
+
+    def search(self, query: str, kinds: Sequence[str] = KINDS, limit: int = 50) -> List[SearchHit]:
+        """Dokumen dengan skor BM25 tertinggi untuk `query`, dibatasi pada jenis `kinds`."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        segments = self.segments
+        if not terms or not segments:
+            return []
+        kind_mask = np.array([kind in kinds for kind in KINDS])
+
+        # Statistik global per jenis dokumen: jumlah dokumen dan panjang rata-rata
+        total_docs = np.zeros(len(KINDS))
+        total_length = np.zeros(len(KINDS))
+        for segment in segments:
+            total_docs += np.bincount(segment.kinds, minlength=len(KINDS))
+            total_length += np.bincount(segment.kinds, weights=segment.lengths, minlength=len(KINDS))
+        avgdl = np.divide(total_length, total_docs, out=np.ones(len(KINDS)), where=total_docs > 0)
+        n_docs = total_docs.sum()
+
+        doc_freq = {term: sum(s.terms[term][1] for s in segments if term in s.terms) for term in terms}
+        hits: List[SearchHit] = []
+        for segment in segments:
+            scores = np.zeros(len(segment.keys), dtype=np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths / avgdl[segment.kinds])
+            for term in terms:
+                rows = segment.term_postings(term)
+                if rows is None:
+                    continue
+                df = doc_freq[term]
+                idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                doc_ids, tf = rows[:, 0], rows[:, 1].astype(np.float32)
+                scores[doc_ids] += idf * tf * (BM25_K1 + 1) / (tf + norm[doc_ids])
+            scores[~kind_mask[segment.kinds]] = 0
+            candidates = np.nonzero(scores)[0]
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(scores[candidates], -limit)[-limit:]]
+            hits.extend(SearchHit(segment.keys[i], float(scores[i])) for i in candidates)
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        return hits[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        counts = {kind: 0 for kind in KINDS}
+        for key in self._keys:
+            counts[key[0]] += 1
+        return {"documents": len(self._keys), "segments": len(self.segments),
+                "ayat": counts[KIND_TRANSLATION], "tafsir": counts[KIND_TAFSIR], "hadith": counts[KIND_HADITH]}
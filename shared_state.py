@@ -0,0 +1,676 @@
+# -*- coding: utf-8 -*-
+
+"""
+Antarmuka state bersama untuk menjalankan beberapa instance bot sekaligus.
+
+`SharedState` menyediakan subset perintah bergaya Redis (string, hash, set,
+sorted set, TTL) yang dipakai oleh pengaturan grup, peringatan, pengingat,
+state percakapan, dan cache. Implementasi yang tersedia:
+
+- `MemoryState`: di dalam proses (untuk satu instance atau pengujian).
+- `RedisState`: klien protokol RESP minimal ke server Redis (atau yang kompatibel).
+- `LocalRespServer`: server RESP lokal berbasis `MemoryState`, pengganti Redis
+  untuk pengujian dan benchmark tanpa perlu memasang Redis.
+
+Mode state bersama aktif jika SHARED_STATE_URL diisi, misalnya
+"redis://localhost:6379/0" atau "memory://".
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_URL = os.environ.get('SHARED_STATE_URL', '')
+SOCKET_TIMEOUT = float(os.environ.get('SHARED_STATE_TIMEOUT', '1'))
+# Setelah server gagal dihubungi, perintah berikutnya langsung gagal selama jeda ini
+RECONNECT_BACKOFF = float(os.environ.get('SHARED_STATE_BACKOFF', '5'))
+
+class SharedStateError(Exception):
+    """Error dari server state bersama (balasan error RESP atau koneksi gagal)."""
+
+class SharedState:
+    """Antarmuka state bersama. Semua nilai berupa string; TTL dalam detik."""
+
+    def ping(self) -> bool:
+        raise NotImplementedError
+
+    # --- String ---
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        """Menyimpan nilai; dengan `nx=True` hanya jika kunci belum ada. True jika tersimpan."""
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> int:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def expire(self, key: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    # --- Hash ---
+    def hget(self, key: str, field: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def hset(self, key: str, mapping: Dict[str, str]) -> None:
+        raise NotImplementedError
+
+    def hdel(self, key: str, *fields: str) -> int:
+        raise NotImplementedError
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def hgetall_many(self, keys: List[str]) -> List[Dict[str, str]]:
+        """HGETALL untuk banyak kunci sekaligus (satu round trip pada RedisState)."""
+        return [self.hgetall(key) for key in keys]
+
+    def hset_indexed(self, key: str, field: str, value: str, index_prefix: str, member: str) -> Optional[str]:
+        """
+        Mengisi satu field hash dan memindahkan `member` dari set indeks nilai
+        lama (`index_prefix` + nilai lama) ke set indeks nilai baru sebagai
+        satu operasi atomik. Mengembalikan nilai lama (None jika belum ada).
+        """
+        raise NotImplementedError
+
+    # --- Set ---
+    def sadd(self, key: str, *members: str) -> int:
+        raise NotImplementedError
+
+    def srem(self, key: str, *members: str) -> int:
+        raise NotImplementedError
+
+    def smembers(self, key: str) -> Set[str]:
+        raise NotImplementedError
+
+    # --- Sorted Set ---
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        raise NotImplementedError
+
+    def zrem(self, key: str, *members: str) -> int:
+        raise NotImplementedError
+
+    def zrangebyscore(self, key: str, minimum: float, maximum: float, limit: Optional[int] = None) -> List[str]:
+        raise NotImplementedError
+
+    def zcard(self, key: str) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+# --- Implementasi di Memori ---
+
+class MemoryState(SharedState):
+    """State bersama di dalam proses, aman dipakai dari banyak thread."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _container(self, key: str, kind: type) -> Any:
+        if not self._alive(key):
+            self._data[key] = kind()
+        value = self._data[key]
+        if not isinstance(value, kind):
+            raise SharedStateError(f"WRONGTYPE kunci {key} bukan {kind.__name__}")
+        return value
+
+    def _drop_if_empty(self, key: str) -> None:
+        if not self._data.get(key):
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def ping(self) -> bool:
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._data[key] if self._alive(key) and isinstance(self._data[key], str) else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and self._alive(key):
+                return False
+            self._data[key] = str(value)
+            if ttl is not None:
+                self._expires[key] = time.time() + ttl
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._data[key]) + 1 if self._alive(key) else 1
+            self._data[key] = str(value)
+            return value
+
+    def expire(self, key: str, ttl: float) -> bool:
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.time() + ttl
+            return True
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        with self._lock:
+            return self._container(key, dict).get(field) if self._alive(key) else None
+
+    def hset(self, key: str, mapping: Dict[str, str]) -> None:
+        with self._lock:
+            self._container(key, dict).update({f: str(v) for f, v in mapping.items()})
+
+    def hdel(self, key: str, *fields: str) -> int:
+        with self._lock:
+            if not self._alive(key):
+                return 0
+            container = self._container(key, dict)
+            removed = sum(1 for f in fields if container.pop(f, None) is not None)
+            self._drop_if_empty(key)
+            return removed
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._container(key, dict)) if self._alive(key) else {}
+
+    def hset_indexed(self, key: str, field: str, value: str, index_prefix: str, member: str) -> Optional[str]:
+        with self._lock:
+            previous = self.hget(key, field)
+            self.hset(key, {field: value})
+            if previous is not None:
+                self.srem(index_prefix + previous, member)
+            self.sadd(index_prefix + value, member)
+            return previous
+
+    def sadd(self, key: str, *members: str) -> int:
+        with self._lock:
+            container = self._container(key, set)
+            before = len(container)
+            container.update(str(m) for m in members)
+            return len(container) - before
+
+    def srem(self, key: str, *members: str) -> int:
+        with self._lock:
+            if not self._alive(key):
+                return 0
+            container = self._container(key, set)
+            removed = sum(1 for m in members if str(m) in container)
+            container.difference_update(str(m) for m in members)
+            self._drop_if_empty(key)
+            return removed
+
+    def smembers(self, key: str) -> Set[str]:
+        with self._lock:
+            return set(self._container(key, set)) if self._alive(key) else set()
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            container = self._container(key, ZSet)
+            added = sum(1 for m in mapping if str(m) not in container)
+            container.update({str(m): float(s) for m, s in mapping.items()})
+            return added
+
+    def zrem(self, key: str, *members: str) -> int:
+        with self._lock:
+            if not self._alive(key):
+                return 0
+            container = self._container(key, ZSet)
+            removed = sum(1 for m in members if container.pop(str(m), None) is not None)
+            self._drop_if_empty(key)
+            return removed
+
+    def zrangebyscore(self, key: str, minimum: float, maximum: float, limit: Optional[int] = None) -> List[str]:
+        with self._lock:
+            if not self._alive(key):
+                return []
+            items = sorted((score, member) for member, score in self._container(key, ZSet).items()
+                           if minimum <= score <= maximum)
+            members = [member for _, member in items]
+            return members[:limit] if limit is not None else members
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            return len(self._container(key, ZSet)) if self._alive(key) else 0
+
+class ZSet(dict):
+    """Sorted set sederhana untuk MemoryState: anggota -> skor."""
+
+# --- Klien Protokol Redis (RESP2) ---
+
+def _encode_command(args: Iterable[Any]) -> bytes:
+    parts = [str(arg).encode('utf-8') if not isinstance(arg, bytes) else arg for arg in args]
+    out = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        out.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(out)
+
+def _read_reply(stream) -> Any:
+    line = stream.readline()
+    if not line:
+        raise SharedStateError("Koneksi ke server state bersama terputus.")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode('utf-8')
+    if prefix == b"-":
+        raise SharedStateError(payload.decode('utf-8'))
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2].decode('utf-8')
+    if prefix == b"*":
+        count = int(payload)
+        return None if count == -1 else [_read_reply(stream) for _ in range(count)]
+    raise SharedStateError(f"Balasan RESP tidak dikenal: {line!r}")
+
+# Skrip Lua untuk `hset_indexed`: HGET, HSET, SREM indeks lama, dan SADD indeks baru dalam satu EVAL
+HSET_INDEXED_SCRIPT = """
+local previous = redis.call('HGET', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+if previous then redis.call('SREM', ARGV[3] .. previous, ARGV[4]) end
+redis.call('SADD', ARGV[3] .. ARGV[2], ARGV[4])
+return previous
+"""
+
+def _format_score(value: float) -> str:
+    if value == float('inf'):
+        return "+inf"
+    if value == float('-inf'):
+        return "-inf"
+    return repr(float(value))
+
+class RedisState(SharedState):
+    """Klien Redis minimal (RESP2) dengan pool koneksi sinkron sederhana."""
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = SOCKET_TIMEOUT):
+        self.host, self.port, self.db = host, port, db
+        self.password = password
+        self.timeout = timeout
+        self._pool: List[Tuple[socket.socket, Any]] = []
+        self._pool_lock = threading.Lock()
+        self._down_until = 0.0
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisState":
+        parts = urlsplit(url)
+        db = int(parts.path.lstrip('/') or 0)
+        return cls(parts.hostname or "localhost", parts.port or 6379, db, parts.password)
+
+    def _connect(self) -> Tuple[socket.socket, Any]:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        if self.password:
+            self._roundtrip(conn, ("AUTH", self.password))
+        if self.db:
+            self._roundtrip(conn, ("SELECT", self.db))
+        return conn
+
+    @staticmethod
+    def _roundtrip(conn: Tuple[socket.socket, Any], args: Iterable[Any]) -> Any:
+        sock, stream = conn
+        sock.sendall(_encode_command(args))
+        return _read_reply(stream)
+
+    @staticmethod
+    def _pipeline(conn: Tuple[socket.socket, Any], commands: List[Iterable[Any]]) -> List[Any]:
+        sock, stream = conn
+        sock.sendall(b"".join(_encode_command(args) for args in commands))
+        replies, error = [], None
+        for _ in commands:
+            try:
+                replies.append(_read_reply(stream))
+            except SharedStateError as e:
+                if "terputus" in str(e):
+                    raise
+                # Balasan lain tetap dibaca agar koneksi bisa dipakai lagi
+                error = error or e
+                replies.append(None)
+        if error is not None:
+            raise error
+        return replies
+
+    def execute(self, *args: Any) -> Any:
+        """
+        Menjalankan satu perintah. Koneksi lama dari pool yang ternyata sudah
+        putus diganti sekali dengan koneksi baru; timeout atau koneksi baru yang
+        gagal tidak diulang. Setelah server gagal dihubungi, perintah langsung
+        gagal selama RECONNECT_BACKOFF detik agar pemanggil tidak ikut tertahan.
+        """
+        return self._with_connection(lambda conn: self._roundtrip(conn, args))
+
+    def execute_many(self, commands: List[Iterable[Any]]) -> List[Any]:
+        """Menjalankan beberapa perintah dalam satu round trip (pipelining), dengan aturan ulang yang sama."""
+        return self._with_connection(lambda conn: self._pipeline(conn, commands)) if commands else []
+
+    def _with_connection(self, call: Callable[[Tuple[socket.socket, Any]], Any]) -> Any:
+        if time.monotonic() < self._down_until:
+            raise SharedStateError(f"{self.host}:{self.port} sedang tidak dapat dihubungi.")
+        for attempt in range(2):
+            with self._pool_lock:
+                conn = self._pool.pop() if self._pool else None
+            pooled = conn is not None
+            try:
+                if conn is None:
+                    conn = self._connect()
+                reply = call(conn)
+            except SharedStateError as e:
+                if conn is not None and "terputus" not in str(e):
+                    with self._pool_lock:
+                        self._pool.append(conn)  # Balasan error biasa: koneksi masih sehat
+                    raise
+                if conn is not None:
+                    conn[0].close()
+                if attempt or not pooled:
+                    self._mark_down()
+                    raise
+            except OSError as e:
+                if conn is not None:
+                    conn[0].close()
+                if attempt or not pooled or isinstance(e, socket.timeout):
+                    self._mark_down()
+                    raise SharedStateError(f"Gagal menghubungi {self.host}:{self.port}: {e}") from e
+            else:
+                with self._pool_lock:
+                    self._pool.append(conn)
+                return reply
+
+    def _mark_down(self) -> None:
+        self._down_until = time.monotonic() + RECONNECT_BACKOFF
+        # Koneksi lain di pool kemungkinan juga sudah putus
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for sock, _ in pool:
+            sock.close()
+
+    def ping(self) -> bool:
+        return self.execute("PING") == "PONG"
+
+    def get(self, key: str) -> Optional[str]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        args: List[Any] = ["SET", key, value]
+        if ttl is not None:
+            args += ["PX", max(1, int(ttl * 1000))]
+        if nx:
+            args.append("NX")
+        return self.execute(*args) == "OK"
+
+    def delete(self, *keys: str) -> int:
+        return self.execute("DEL", *keys) if keys else 0
+
+    def incr(self, key: str) -> int:
+        return self.execute("INCR", key)
+
+    def expire(self, key: str, ttl: float) -> bool:
+        return self.execute("PEXPIRE", key, max(1, int(ttl * 1000))) == 1
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        return self.execute("HGET", key, field)
+
+    def hset(self, key: str, mapping: Dict[str, str]) -> None:
+        if mapping:
+            self.execute("HSET", key, *[item for pair in mapping.items() for item in pair])
+
+    def hdel(self, key: str, *fields: str) -> int:
+        return self.execute("HDEL", key, *fields) if fields else 0
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        flat = self.execute("HGETALL", key) or []
+        return dict(zip(flat[::2], flat[1::2]))
+
+    def hgetall_many(self, keys: List[str]) -> List[Dict[str, str]]:
+        replies = self.execute_many([("HGETALL", key) for key in keys])
+        return [dict(zip(flat[::2], flat[1::2])) for flat in (reply or [] for reply in replies)]
+
+    def hset_indexed(self, key: str, field: str, value: str, index_prefix: str, member: str) -> Optional[str]:
+        return self.execute("EVAL", HSET_INDEXED_SCRIPT, 1, key, field, value, index_prefix, member)
+
+    def sadd(self, key: str, *members: str) -> int:
+        return self.execute("SADD", key, *members) if members else 0
+
+    def srem(self, key: str, *members: str) -> int:
+        return self.execute("SREM", key, *members) if members else 0
+
+    def smembers(self, key: str) -> Set[str]:
+        return set(self.execute("SMEMBERS", key) or [])
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        if not mapping:
+            return 0
+        return self.execute("ZADD", key, *[item for m, s in mapping.items() for item in (_format_score(s), m)])
+
+    def zrem(self, key: str, *members: str) -> int:
+        return self.execute("ZREM", key, *members) if members else 0
+
+    def zrangebyscore(self, key: str, minimum: float, maximum: float, limit: Optional[int] = None) -> List[str]:
+        args: List[Any] = ["ZRANGEBYSCORE", key, _format_score(minimum), _format_score(maximum)]
+        if limit is not None:
+            args += ["LIMIT", 0, limit]
+        return self.execute(*args) or []
+
+    def zcard(self, key: str) -> int:
+        return self.execute("ZCARD", key)
+
+    def close(self) -> None:
+        with self._pool_lock:
+            for sock, stream in self._pool:
+                stream.close()
+                sock.close()
+            self._pool.clear()
+
+# --- Server RESP Lokal (pengganti Redis untuk pengujian) ---
+
+def _parse_score(value: str) -> float:
+    value = value.lower()
+    if value in ("+inf", "inf"):
+        return float('inf')
+    if value == "-inf":
+        return float('-inf')
+    return float(value)
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        state: MemoryState = self.server.state
+        while True:
+            try:
+                command = _read_reply(self.rfile)
+            except (SharedStateError, OSError):
+                return
+            if not isinstance(command, list) or not command:
+                return
+            try:
+                reply = self._dispatch(state, command[0].upper(), command[1:])
+            except SharedStateError as e:
+                self.wfile.write(f"-ERR {e}\r\n".encode('utf-8'))
+                continue
+            except (ValueError, IndexError, KeyError) as e:
+                self.wfile.write(f"-ERR {e}\r\n".encode('utf-8'))
+                continue
+            self.wfile.write(self._encode(reply))
+
+    @staticmethod
+    def _encode(reply: Any) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, bool):
+            return b":%d\r\n" % int(reply)
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, _Status):
+            return b"+%s\r\n" % reply.encode('utf-8')
+        if isinstance(reply, str):
+            data = reply.encode('utf-8')
+            return b"$%d\r\n%s\r\n" % (len(data), data)
+        if isinstance(reply, (list, tuple)):
+            return b"*%d\r\n" % len(reply) + b"".join(_RespHandler._encode(item) for item in reply)
+        raise SharedStateError(f"Tipe balasan tidak didukung: {type(reply)}")
+
+    @staticmethod
+    def _dispatch(state: MemoryState, name: str, args: List[str]) -> Any:
+        if name == "PING":
+            return _Status("PONG")
+        if name in ("SELECT", "AUTH"):
+            return _Status("OK")
+        if name == "GET":
+            return state.get(args[0])
+        if name == "SET":
+            options = [a.upper() for a in args[2:]]
+            ttl = None
+            if "PX" in options:
+                ttl = int(args[2 + options.index("PX") + 1]) / 1000
+            elif "EX" in options:
+                ttl = int(args[2 + options.index("EX") + 1])
+            stored = state.set(args[0], args[1], ttl=ttl, nx="NX" in options)
+            return _Status("OK") if stored else None
+        if name == "DEL":
+            return state.delete(*args)
+        if name == "INCR":
+            return state.incr(args[0])
+        if name in ("EXPIRE", "PEXPIRE"):
+            ttl = int(args[1]) / (1000 if name == "PEXPIRE" else 1)
+            return state.expire(args[0], ttl)
+        if name == "HGET":
+            return state.hget(args[0], args[1])
+        if name == "HSET":
+            fields = dict(zip(args[1::2], args[2::2]))
+            before = len(state.hgetall(args[0]))
+            state.hset(args[0], fields)
+            return len(state.hgetall(args[0])) - before
+        if name == "HDEL":
+            return state.hdel(args[0], *args[1:])
+        if name == "HGETALL":
+            return [item for pair in state.hgetall(args[0]).items() for item in pair]
+        if name == "EVAL":
+            # Hanya skrip yang dipakai bot ini yang dikenali; tidak ada interpreter Lua
+            if args[0] != HSET_INDEXED_SCRIPT or args[1] != "1":
+                raise SharedStateError("skrip EVAL tidak didukung")
+            return state.hset_indexed(*args[2:7])
+        if name == "SADD":
+            return state.sadd(args[0], *args[1:])
+        if name == "SREM":
+            return state.srem(args[0], *args[1:])
+        if name == "SMEMBERS":
+            return sorted(state.smembers(args[0]))
+        if name == "ZADD":
+            return state.zadd(args[0], {m: _parse_score(s) for s, m in zip(args[1::2], args[2::2])})
+        if name == "ZREM":
+            return state.zrem(args[0], *args[1:])
+        if name == "ZRANGEBYSCORE":
+            limit = int(args[5]) if len(args) >= 6 and args[3].upper() == "LIMIT" else None
+            return state.zrangebyscore(args[0], _parse_score(args[1]), _parse_score(args[2]), limit)
+        if name == "ZCARD":
+            return state.zcard(args[0])
+        raise SharedStateError(f"perintah tidak dikenal '{name}'")
+
+class _Status(str):
+    """Balasan status RESP (+OK, +PONG), dibedakan dari bulk string."""
+
+class LocalRespServer:
+    """Server RESP di thread terpisah yang meniru Redis dengan `MemoryState`."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = socketserver.ThreadingTCPServer((host, port), _RespHandler, bind_and_activate=True)
+        self._server.daemon_threads = True
+        self._server.state = MemoryState()
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def start(self) -> "LocalRespServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-resp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+# --- Kunci-Nilai JSON ---
+
+class SharedJsonStore:
+    """Penyimpanan nilai JSON dengan awalan kunci dan TTL (misal untuk cache bersama)."""
+
+    def __init__(self, state: SharedState, prefix: str):
+        self.state = state
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self.state.get(self.prefix + key)
+        except SharedStateError as e:
+            logger.warning(f"State bersama tidak dapat dibaca ({self.prefix}): {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            self.state.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ttl=ttl)
+        except SharedStateError as e:
+            logger.warning(f"State bersama tidak dapat ditulis ({self.prefix}): {e}")
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """`get` di thread terpisah agar round trip jaringan tidak menahan event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    def set_nowait(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """`set` di thread pool tanpa menunggu hasilnya (langsung jika tidak ada event loop)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.set(key, value, ttl)
+            return
+        loop.run_in_executor(None, self.set, key, value, ttl)
+
+def create_shared_state(url: str) -> Optional[SharedState]:
+    """Membuat implementasi state bersama dari URL ("redis://..." atau "memory://")."""
+    if not url:
+        return None
+    scheme = urlsplit(url).scheme
+    if scheme == "memory":
+        return MemoryState()
+    if scheme in ("redis", "resp"):
+        return RedisState.from_url(url)
+    raise ValueError(f"Skema SHARED_STATE_URL tidak dikenal: {scheme}")
+
+# State bersama untuk seluruh bot; None berarti mode satu proses (tanpa state bersama)
+shared_state = create_shared_state(SHARED_STATE_URL)
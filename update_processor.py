@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pemroses update konkuren dengan jaminan urutan per chat.
+
+Update dari chat yang berbeda diproses secara paralel (dibatasi oleh batas
+global), sedangkan update dalam satu chat tetap diproses satu per satu sesuai
+urutan kedatangan. Dengan begitu, /tanya yang lambat di satu grup tidak
+menahan moderasi di grup lain, tetapi peringatan, kick, dan state
+ConversationHandler dalam satu chat tetap konsisten.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import Counter, Histogram
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+UPDATES_PROCESSED = Counter("bot_updates_processed_total", "Jumlah update yang selesai diproses.")
+UPDATE_LATENCY = Histogram("bot_update_duration_seconds", "Waktu proses satu update (tanpa waktu antre).")
+
+UPDATE_CONCURRENCY = int(os.environ.get('UPDATE_CONCURRENCY', '32'))
+# Batas update yang boleh menunggu (antre di lajur chat masing-masing) sekaligus.
+MAX_PENDING_UPDATES = int(os.environ.get('MAX_PENDING_UPDATES', '4096'))
+
+class _Lane:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class ChatLaneUpdateProcessor(BaseUpdateProcessor):
+    """
+    Setiap chat memiliki "lajur" serial (asyncio.Lock yang FIFO). Slot global
+    hanya diambil oleh update yang sudah berada di depan lajurnya, sehingga
+    antrean panjang di satu chat tidak menghabiskan slot untuk chat lain.
+    """
+
+    def __init__(self, max_concurrent_updates: int = UPDATE_CONCURRENCY,
+                 max_pending_updates: int = MAX_PENDING_UPDATES):
+        # Semaphore bawaan BaseUpdateProcessor membatasi total update yang sedang menunggu/diproses
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.concurrency = max_concurrent_updates
+        self._global: Optional[asyncio.Semaphore] = None
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self.active = 0
+
+    async def initialize(self) -> None:
+        self._global = asyncio.Semaphore(self.concurrency)
+
+    async def shutdown(self) -> None:
+        self._lanes.clear()
+
+    @staticmethod
+    def lane_key(update: object) -> Optional[Hashable]:
+        """Kunci lajur: chat untuk update biasa, pengguna untuk update tanpa chat (misal inline query)."""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return ("chat", update.effective_chat.id)
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        return None
+
+    def queued_updates(self) -> int:
+        """Jumlah update yang sedang menunggu giliran atau sedang diproses."""
+        return self.current_concurrent_updates
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if self._global is None:
+            await self.initialize()
+        key = self.lane_key(update)
+        if key is None:
+            async with self._global:
+                await self._run(coroutine)
+            return
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        lane.users += 1
+        try:
+            async with lane.lock:
+                async with self._global:
+                    await self._run(coroutine)
+        finally:
+            lane.users -= 1
+            if lane.users == 0:
+                # Lajur kosong dihapus agar memori tidak tumbuh seiring jumlah chat
+                self._lanes.pop(key, None)
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self.active += 1
+        try:
+            with UPDATE_LATENCY.time():
+                await coroutine
+        finally:
+            self.active -= 1
+            UPDATES_PROCESSED.inc()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache putusan moderasi untuk pesan yang berulang atau hampir identik.
+
+Setiap pesan diberi sidik jari SimHash 64-bit dari n-gram karakter teks yang
+sudah dinormalisasi. Pesan dengan jarak Hamming kecil terhadap pesan yang sudah
+pernah dinilai langsung memakai putusan (aman/melanggar + alasan) yang sama,
+tanpa panggilan AI. Pencarian tetangga dekat memakai indeks per-band: dengan
+4 band 16-bit, dua sidik jari yang berbeda <= 3 bit pasti sama di salah satu band.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, NamedTuple, Optional, Protocol, Set
+
+from cache_utils import TTLCache
+from moderation_filters import normalize
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+MAX_HAMMING_DISTANCE = 3
+SHINGLE_SIZE = 4
+# Teks yang lebih pendek dari ini hanya dicocokkan secara persis.
+MIN_FUZZY_LENGTH = 24
+
+VERDICT_TTL = float(os.environ.get('VERDICT_CACHE_TTL', '21600'))
+VERDICT_CACHE_SIZE = int(os.environ.get('VERDICT_CACHE_SIZE', '20000'))
+
+class Verdict(NamedTuple):
+    violation: bool
+    reason: Optional[str] = None
+
+class SharedVerdictStore(Protocol):
+    """Penyimpanan bersama antar-proses (opsional) untuk putusan yang dicocokkan persis."""
+
+    async def get_async(self, key: str) -> Optional[Dict[str, Any]]: ...
+
+    def set_nowait(self, key: str, value: Dict[str, Any], ttl: float) -> None: ...
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def simhash(text: str) -> int:
+    """SimHash 64-bit dari shingle karakter teks yang sudah dinormalisasi."""
+    if len(text) <= SHINGLE_SIZE:
+        return _hash64(text)
+    weights = [0] * SIMHASH_BITS
+    for i in range(len(text) - SHINGLE_SIZE + 1):
+        h = _hash64(text[i:i + SHINGLE_SIZE])
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def _bands(fingerprint: int):
+    mask = (1 << BAND_BITS) - 1
+    for band in range(BANDS):
+        yield band, (fingerprint >> (band * BAND_BITS)) & mask
+
+class VerdictCache:
+    """Cache putusan dengan TTL dan eviction LRU, mendukung pencocokan hampir-identik."""
+
+    def __init__(self, max_entries: int = VERDICT_CACHE_SIZE, ttl: float = VERDICT_TTL,
+                 shared: Optional[SharedVerdictStore] = None):
+        self.ttl = ttl
+        self.shared = shared
+        self._cache = TTLCache(max_entries=max_entries, default_ttl=ttl, on_remove=self._unindex)
+        self._band_index: Dict[tuple, Set[int]] = {}
+        self.near_hits = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def _key(text: str) -> tuple:
+        normalized = normalize(text)
+        return normalized, simhash(normalized)
+
+    def get(self, text: str) -> Optional[Verdict]:
+        """Putusan dari cache lokal (persis atau hampir identik), tanpa menyentuh jaringan."""
+        normalized, fingerprint = self._key(text)
+        verdict = self._cache.get(fingerprint)
+        if verdict is not None:
+            return verdict
+
+        if len(normalized) >= MIN_FUZZY_LENGTH:
+            for candidate in self._candidates(fingerprint):
+                if hamming_distance(candidate, fingerprint) <= MAX_HAMMING_DISTANCE:
+                    verdict = self._cache.get(candidate)
+                    if verdict is not None:
+                        self.near_hits += 1
+                        return verdict
+        return None
+
+    async def get_shared(self, text: str) -> Optional[Verdict]:
+        """Putusan yang dicocokkan persis dari state bersama (dibaca di thread terpisah)."""
+        if self.shared is None:
+            return None
+        _, fingerprint = self._key(text)
+        stored = await self.shared.get_async(f"{fingerprint:016x}")
+        if not stored:
+            return None
+        verdict = Verdict(bool(stored.get('violation')), stored.get('reason'))
+        self._put(fingerprint, verdict)
+        self.shared_hits += 1
+        return verdict
+
+    def set(self, text: str, verdict: Verdict) -> None:
+        _, fingerprint = self._key(text)
+        self._put(fingerprint, verdict)
+        if self.shared is not None:
+            self.shared.set_nowait(f"{fingerprint:016x}", verdict._asdict(), self.ttl)
+
+    def _put(self, fingerprint: int, verdict: Verdict) -> None:
+        self._cache.set(fingerprint, verdict)
+        for band in _bands(fingerprint):
+            self._band_index.setdefault(band, set()).add(fingerprint)
+
+    def _candidates(self, fingerprint: int) -> Set[int]:
+        candidates: Set[int] = set()
+        for band in _bands(fingerprint):
+            candidates |= self._band_index.get(band, set())
+        candidates.discard(fingerprint)
+        return candidates
+
+    def _unindex(self, fingerprint: int, _verdict: Verdict) -> None:
+        for band in _bands(fingerprint):
+            bucket = self._band_index.get(band)
+            if bucket is not None:
+                bucket.discard(fingerprint)
+                if not bucket:
+                    del self._band_index[band]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "near_hits": self.near_hits, "shared_hits": self.shared_hits}
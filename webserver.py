@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Server HTTP asinkron minimal yang berjalan di event loop yang sama dengan bot.
+
+Dipakai untuk menerima webhook Telegram serta endpoint /healthz dan /readyz,
+menggantikan thread keep-alive berbasis http.server. Hanya mendukung fitur
+HTTP/1.1 yang dibutuhkan bot: satu permintaan per koneksi, body dengan
+Content-Length, dan respons dengan panjang tetap.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Inisialisasi logger
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 2 * 1024 * 1024
+READ_TIMEOUT = 15.0
+
+STATUS_TEXT = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    query: Dict[str, list]
+    headers: Dict[str, str]   # Nama header dalam huruf kecil
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode('utf-8'))
+
+class Response(NamedTuple):
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+
+    @classmethod
+    def text(cls, text: str, status: int = 200) -> "Response":
+        return cls(status, text.encode('utf-8'))
+
+    @classmethod
+    def json(cls, data: Any, status: int = 200) -> "Response":
+        return cls(status, json.dumps(data).encode('utf-8'), "application/json")
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+class WebServer:
+    """Router sederhana (method, path) -> handler asinkron di atas asyncio.start_server."""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 8080):
+        self.host = host
+        self.port = port
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def add_route(self, method: str, path: str, handler: Handler) -> None:
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Port 0 berarti port acak; simpan port yang sebenarnya dipakai
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Server HTTP dimulai pada {self.host}:{self.port}.")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), timeout=READ_TIMEOUT)
+            if isinstance(request, Response):
+                response = request
+            else:
+                response = await self._dispatch(request)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except asyncio.LimitOverrunError:
+            response = Response.text("Header terlalu besar.", 400)
+        except ValueError:
+            # Request rusak lainnya (misal header tidak bisa diurai); jangan biarkan koneksi menggantung
+            response = Response.text("Request tidak valid.", 400)
+
+        try:
+            writer.write(self._encode(response))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        if len(head) > MAX_HEADER_SIZE:
+            return Response.text("Header terlalu besar.", 400)
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return Response.text("Request line tidak valid.", 400)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            return Response.text("Content-Length tidak valid.", 400)
+        if length < 0:
+            return Response.text("Content-Length tidak valid.", 400)
+        if length > MAX_BODY_SIZE:
+            return Response.text("Body terlalu besar.", 413)
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+
+    async def _dispatch(self, request: Request) -> Response:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            allowed = any(path == request.path for _, path in self._routes)
+            return Response.text("Method tidak diizinkan." if allowed else "Tidak ditemukan.", 405 if allowed else 404)
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(f"Error saat menangani {request.method} {request.path}: {e}", exc_info=True)
+            return Response.text("Terjadi kesalahan internal.", 500)
+
+    @staticmethod
+    def _encode(response: Response) -> bytes:
+        reason = STATUS_TEXT.get(response.status, "")
+        head = (
+            f"HTTP/1.1 {response.status} {reason}\r\n"
+            f"Content-Type: {response.content_type}\r\n"
+            f"Content-Length: {len(response.body)}\r\n"
+            f"Connection: close\r\n\r\n"
+        )
+        return head.encode('latin-1') + response.body